@@ -1,9 +1,13 @@
-from langchain_groq import ChatGroq
-from langchain.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
+from llm.provider import get_chat_model
+from utils.tokens import record_usage
+from utils.tracing import span
+
+FALLBACK_NOTICE = "⚠️ A step-by-step explanation isn't available right now"
 
 class ExplainerAgent:
     def __init__(self):
-        self.llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.3)
+        self.llm = get_chat_model(temperature=0.3)
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a friendly math tutor. Explain the solution in a clear, student-friendly way.
@@ -22,9 +26,36 @@ Use simple language, avoid jargon, and be encouraging."""),
     def explain(self, problem, solution):
         """Generate student-friendly explanation"""
         chain = self.prompt | self.llm
-        response = chain.invoke({
-            "problem": problem,
-            "solution": solution
-        })
+        try:
+            with span("llm.explain"):
+                response = chain.invoke({
+                    "problem": problem,
+                    "solution": solution
+                })
+                record_usage("explain", response)
+        except Exception as e:
+            print(f"⚠️ Explainer unavailable: {e}")
+            return fallback_explanation(solution, e)
         
         return response.content
+    
+    async def aexplain(self, problem, solution):
+        """Async explain()"""
+        chain = self.prompt | self.llm
+        try:
+            with span("llm.explain"):
+                response = await chain.ainvoke({
+                    "problem": problem,
+                    "solution": solution
+                })
+                record_usage("explain", response)
+        except Exception as e:
+            print(f"⚠️ Explainer unavailable: {e}")
+            return fallback_explanation(solution, e)
+        
+        return response.content
+
+
+def fallback_explanation(solution, error):
+    """Shown instead of an explanation when the LLM can't be reached"""
+    return f"{FALLBACK_NOTICE} ({error}).\n\n{solution}"
@@ -0,0 +1,172 @@
+import asyncio
+from langchain_core.prompts import ChatPromptTemplate
+from llm.provider import get_chat_model
+from agents.explainer_agent import fallback_explanation
+from agents.parser_agent import normalize_parsed
+from rag.context import ContextAssembler
+from utils.llm_output import extract_json
+from utils.tokens import record_usage
+from utils.tracing import span
+
+class FusedAgent:
+    """Parse + solve (and optionally verify + explain) in single structured calls"""
+
+    def __init__(self, rag_pipeline, context_assembler=None):
+        # JSON mode guarantees a parseable object back from Groq
+        self.llm = get_chat_model(temperature=0).bind(response_format={"type": "json_object"})
+        self.rag = rag_pipeline
+        self.context_assembler = context_assembler or ContextAssembler()
+
+        self.solve_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are an expert math parser and solver. In ONE pass:
+1. Clean and structure the input problem
+2. Identify the math topic (algebra, calculus, probability, linear_algebra)
+3. Extract variables and constraints
+4. Solve the problem step-by-step using the context below
+
+Context from knowledge base:
+{context}
+
+Return ONLY a valid JSON object with this exact structure:
+{{
+  "problem_text": "cleaned problem statement",
+  "topic": "algebra",
+  "variables": ["x", "y"],
+  "constraints": ["x > 0"],
+  "needs_clarification": false,
+  "clarification_reason": "",
+  "solution": "markdown: solution approach, step-by-step solution, final answer"
+}}
+
+Topic must be one of: algebra, calculus, probability, linear_algebra"""),
+            ("user", "Problem: {input}")
+        ])
+
+        self.review_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are a math solution verifier and a friendly tutor. In ONE pass:
+1. Check the solution for mathematical correctness, unit consistency, domain validity and edge cases
+2. Explain the solution for a student: problem understanding, approach, step-by-step reasoning, final answer, key concepts
+
+Return ONLY a valid JSON object with this exact structure:
+{{
+  "is_correct": true,
+  "confidence": 0.9,
+  "issues": ["list of issues if any"],
+  "needs_human_review": false,
+  "explanation": "markdown explanation for the student"
+}}"""),
+            ("user", "Problem: {problem}\n\nSolution: {solution}")
+        ])
+
+    def parse_and_solve(self, raw_input):
+        """Retrieve on the raw input, then parse and solve in one call"""
+        context_text, context, context_stats = self.retrieve(raw_input)
+
+        try:
+            chain = self.solve_prompt | self.llm
+            with span("llm.parse_solve"):
+                response = chain.invoke({"input": raw_input, "context": context_text})
+                record_usage("parse_solve", response)
+            result = extract_json(response.content)
+        except Exception as e:
+            print(f"❌ Error in fused parse/solve: {e}")
+            return self._split_solution(None, raw_input, context, context_stats, error=e)
+
+        return self._split_solution(result, raw_input, context, context_stats)
+
+    async def aparse_and_solve(self, raw_input):
+        """Async parse_and_solve() - retrieval on a worker thread, the LLM call awaited"""
+        context_text, context, context_stats = await asyncio.to_thread(self.retrieve, raw_input)
+
+        try:
+            chain = self.solve_prompt | self.llm
+            with span("llm.parse_solve"):
+                response = await chain.ainvoke({"input": raw_input, "context": context_text})
+                record_usage("parse_solve", response)
+            result = extract_json(response.content)
+        except Exception as e:
+            print(f"❌ Error in fused parse/solve: {e}")
+            return self._split_solution(None, raw_input, context, context_stats, error=e)
+
+        return self._split_solution(result, raw_input, context, context_stats)
+
+    def retrieve(self, raw_input):
+        """(context_text, selected chunks, stats) for the raw input"""
+        context_stats = {}
+        try:
+            with span("retrieval"):
+                candidates = self.rag.retrieve_context(raw_input, k=self.context_assembler.max_k)
+                context_text, context, context_stats = self.context_assembler.assemble(candidates)
+            if not context_text:
+                context_text = "No relevant context found."
+        except Exception as e:
+            print(f"⚠️ Error retrieving context: {e}")
+            context = []
+            context_text = "No context available."
+        return context_text, context, context_stats
+
+    def _split_solution(self, result, raw_input, context, context_stats, error=None):
+        """(parsed, solution) from the fused response"""
+        if error is not None:
+            return normalize_parsed({}, raw_input), {
+                "llm_solution": f"Error: {str(error)}",
+                "retrieved_context": context,
+                "context_stats": context_stats,
+                "confidence": 0.0,
+                "solved_by": "llm"
+            }
+
+        solution_text = result.pop("solution", "") or "No solution generated"
+        parsed = normalize_parsed(result, raw_input)
+        return parsed, {
+            "llm_solution": solution_text,
+            "retrieved_context": context,
+            "context_stats": context_stats,
+            "confidence": 0.85,
+            "solved_by": "llm"
+        }
+
+    def verify_and_explain(self, problem, solution):
+        """Verification verdict and student explanation in one call"""
+        chain = self.review_prompt | self.llm
+        try:
+            with span("llm.verify_explain"):
+                response = chain.invoke({"problem": problem, "solution": solution})
+                record_usage("verify_explain", response)
+        except Exception as e:
+            print(f"⚠️ Fused review unavailable: {e}")
+            return self._unreviewed(f"Verifier unavailable: {e}"), fallback_explanation(solution, e)
+        return self._split_review(response.content)
+
+    async def averify_and_explain(self, problem, solution):
+        """Async verify_and_explain()"""
+        chain = self.review_prompt | self.llm
+        try:
+            with span("llm.verify_explain"):
+                response = await chain.ainvoke({"problem": problem, "solution": solution})
+                record_usage("verify_explain", response)
+        except Exception as e:
+            print(f"⚠️ Fused review unavailable: {e}")
+            return self._unreviewed(f"Verifier unavailable: {e}"), fallback_explanation(solution, e)
+        return self._split_review(response.content)
+
+    def _split_review(self, content):
+        """(verdict, explanation) from the fused review response"""
+        try:
+            result = extract_json(content)
+        except Exception as e:
+            print(f"⚠️ Fused review parse error: {e}")
+            return self._unreviewed("Verifier response could not be parsed"), content
+
+        explanation = result.pop("explanation", "")
+        result["method"] = "llm"
+        return result, explanation
+
+    def _unreviewed(self, issue):
+        return {
+            "is_correct": False,
+            "confidence": 0.0,
+            "issues": [issue],
+            "needs_human_review": True,
+            "method": "llm"
+        }
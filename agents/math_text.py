@@ -0,0 +1,44 @@
+import re
+
+SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁻", "0123456789-")
+
+UNICODE_REPLACEMENTS = {
+    "×": "*",
+    "·": "*",
+    "÷": "/",
+    "−": "-",
+    "–": "-",
+    "π": "pi",
+    "∞": "oo",
+    "→": "->",
+    "√": "sqrt",
+    "≠": "!=",
+}
+
+
+def normalize_math_text(text):
+    """Rewrite unicode math notation into SymPy-parsable ASCII"""
+    for symbol, replacement in UNICODE_REPLACEMENTS.items():
+        text = text.replace(symbol, replacement)
+    # x² -> x**2, aⁿ⁻¹ keeps its letters, so only digit runs are converted
+    text = re.sub(
+        r"[⁰¹²³⁴⁵⁶⁷⁸⁹⁻]+",
+        lambda m: "**(" + m.group(0).translate(SUPERSCRIPTS) + ")",
+        text
+    )
+    text = re.sub(r"sqrt\s*(\d+|[a-z])", r"sqrt(\1)", text)
+    return text.replace("^", "**")
+
+
+def format_symbolic_solution(result):
+    """Render a solver result as the markdown answer shown to students"""
+    lines = [f"**Solution approach:** Solved exactly with SymPy ({result['method'].replace('_', ' ')})", ""]
+    lines.append("**Steps:**")
+    for i, step in enumerate(result.get("steps", []), 1):
+        lines.append(f"{i}. {step}")
+    lines.append("")
+    answer = result["solution"]
+    if result.get("decimal"):
+        answer += f" ≈ {result['decimal']}"
+    lines.append(f"**Final answer:** {answer}")
+    return "\n".join(lines)
@@ -0,0 +1,446 @@
+import asyncio
+import os
+import time
+from contextlib import nullcontext
+from agents.parser_agent import ParserAgent
+from agents.solver_agent import SolverAgent
+from agents.verifier_agent import VerifierAgent
+from agents.explainer_agent import FALLBACK_NOTICE, ExplainerAgent
+from agents.fused_agent import FusedAgent
+from memory.store import MemoryStore, retention_from_env
+from rag.vectorstore.vectorstore import RAGPipeline
+from utils.deadline import deadline, remaining, resolve_budget, stage_deadline
+from utils.profiling import Profiler
+from utils.result_cache import ResultCache
+from utils.sandbox import SympySandbox
+from utils.single_flight import SingleFlight, problem_key
+from utils.tokens import track_usage
+from utils.tracing import tracer
+
+# "staged": parse -> solve -> verify -> explain, four LLM calls
+# "fused":  parse+solve in one call, verify+explain in a second
+PIPELINE_MODES = ("staged", "fused")
+
+# Share of the remaining latency budget each stage may use, so later stages keep some
+STAGE_SHARES = {
+    "parse": 0.3, "solve": 0.7, "parse_solve": 0.7, "symbolic": 0.3,
+    "memory": 0.1, "verify": 0.5, "explain": 1.0, "verify_explain": 1.0
+}
+# Assumed latency (seconds) of the optional stages until the tracer has measured them
+OPTIONAL_STAGE_ESTIMATES = {"memory": 0.05, "verify": 2.0, "explain": 3.0, "verify_explain": 3.0}
+
+
+def build_components(include_multimodal=True, sandbox=True):
+    """Construct the shared models and agents used by the pipeline"""
+    # hybrid: BM25 answers confident keyword lookups alone, otherwise fused with dense search
+    rag = RAGPipeline(retrieval_mode=os.getenv("MATH_MENTOR_RETRIEVAL", "hybrid"))
+    rag.load_vectorstore()
+    sympy_sandbox = SympySandbox() if sandbox else None
+
+    components = {
+        "rag": rag,
+        "parser": ParserAgent(),
+        "solver": SolverAgent(rag, sandbox=sympy_sandbox),
+        "verifier": VerifierAgent(sandbox=sympy_sandbox),
+        "explainer": ExplainerAgent(),
+        "fused": FusedAgent(rag),
+        # Older history is moved to compressed archive segments (MATH_MENTOR_MEMORY_* caps)
+        "memory": MemoryStore(**retention_from_env()),
+        # Identical problems submitted at the same time share one pipeline run;
+        # set MATH_MENTOR_SINGLEFLIGHT_DIR to share across processes too
+        "single_flight": SingleFlight(lock_dir=os.getenv("MATH_MENTOR_SINGLEFLIGHT_DIR"))
+    }
+
+    # Completed results kept on disk and reused for the same problem (filled ahead of time by warm_cache.py)
+    cache_dir = os.getenv("MATH_MENTOR_RESULT_CACHE_DIR")
+    if cache_dir:
+        ttl_hours = os.getenv("MATH_MENTOR_RESULT_CACHE_TTL_HOURS")
+        components["result_cache"] = ResultCache(cache_dir, ttl=float(ttl_hours) * 3600 if ttl_hours else None)
+
+    # Sampling profiler for this percentage of runs (100 = every run), written to MATH_MENTOR_PROFILE_DIR
+    profile_percent = float(os.getenv("MATH_MENTOR_PROFILE", "0"))
+    if profile_percent > 0:
+        components["profiler"] = Profiler(
+            os.getenv("MATH_MENTOR_PROFILE_DIR", "profiles"),
+            percent=profile_percent,
+            interval=float(os.getenv("MATH_MENTOR_PROFILE_INTERVAL_MS", "5")) / 1000,
+            memory=os.getenv("MATH_MENTOR_PROFILE_MEMORY", "1") != "0"
+        )
+
+    if include_multimodal:
+        workers = int(os.getenv("MATH_MENTOR_INFERENCE_WORKERS", "1"))
+        if workers > 0:
+            # OCR/ASR run in pinned worker processes; "ocr"/"audio" keep the processor interface
+            from multimodal.workers import InferencePool, PooledAudio, PooledOCR
+            pool = InferencePool(
+                ocr_workers=workers,
+                asr_workers=workers,
+                threads_per_worker=int(os.getenv("MATH_MENTOR_INFERENCE_THREADS", "2")),
+                max_queue=int(os.getenv("MATH_MENTOR_INFERENCE_QUEUE", "8"))
+            )
+            components["inference"] = pool
+            components["ocr"] = PooledOCR(pool)
+            components["audio"] = PooledAudio(pool)
+        else:
+            from multimodal.ocr_processor import OCRProcessor
+            from multimodal.audio_processor import AudioProcessor
+            components["ocr"] = OCRProcessor()
+            components["audio"] = AudioProcessor()
+
+    return components
+
+
+class MathPipeline:
+    """Runs a problem through the agents and collects everything the UI shows"""
+
+    def __init__(self, components):
+        self.components = components
+
+    def run(self, raw_input, mode="staged", fused_review=True, budget=None):
+        """Solve one problem
+
+        In "fused" mode, fused_review=False keeps verification and explanation
+        as separate calls (three LLM calls instead of two).
+
+        `budget` is an overall latency budget in seconds or a name from
+        utils.deadline.BUDGETS ("fast", "thorough"). Each stage gets a share
+        of what is left; optional stages (memory lookup, verification,
+        explanation) are skipped or degraded when they wouldn't fit, and
+        result["skipped"] records which and why.
+        """
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        cached = self._cached(raw_input, mode, fused_review)
+        if cached is not None:
+            return cached
+
+        single_flight = self.components.get("single_flight")
+        if single_flight is None:
+            result, shared = self._execute(raw_input, mode, fused_review, budget), False
+        else:
+            result, shared = single_flight.do(
+                problem_key(raw_input, mode, fused_review, budget),
+                lambda: self._execute(raw_input, mode, fused_review, budget)
+            )
+        if shared:
+            return self._mark_shared(result, raw_input)
+        self._store(raw_input, mode, fused_review, result)
+        return result
+
+    def _execute(self, raw_input, mode, fused_review, budget):
+        seconds = resolve_budget(budget)
+        result = {"raw_input": raw_input, "mode": mode, "budget": seconds, "timings": {}, "skipped": []}
+        start = time.perf_counter()
+
+        with deadline(seconds), track_usage() as usage, tracer.trace("pipeline", mode=mode) as root, \
+                self._profile(root, mode) as profile:
+            result["trace_id"] = root.trace_id
+            if mode == "fused":
+                self._run_fused(raw_input, result, fused_review)
+            else:
+                self._run_staged(raw_input, result)
+
+        if profile is not None:
+            result["profile"] = profile.paths
+        result["usage"] = usage
+        result["latency"] = time.perf_counter() - start
+        return result
+
+    async def arun(self, raw_input, mode="staged", fused_review=True, budget=None):
+        """Async run(): LLM calls are awaited, SymPy/retrieval/memory run on worker threads"""
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        cached = await asyncio.to_thread(self._cached, raw_input, mode, fused_review)
+        if cached is not None:
+            return cached
+
+        single_flight = self.components.get("single_flight")
+        if single_flight is None:
+            result, shared = await self._aexecute(raw_input, mode, fused_review, budget), False
+        else:
+            result, shared = await single_flight.ado(
+                problem_key(raw_input, mode, fused_review, budget),
+                lambda: self._aexecute(raw_input, mode, fused_review, budget)
+            )
+        if shared:
+            return self._mark_shared(result, raw_input)
+        await asyncio.to_thread(self._store, raw_input, mode, fused_review, result)
+        return result
+
+    async def _aexecute(self, raw_input, mode, fused_review, budget):
+        seconds = resolve_budget(budget)
+        result = {"raw_input": raw_input, "mode": mode, "budget": seconds, "timings": {}, "skipped": []}
+        start = time.perf_counter()
+
+        with deadline(seconds), track_usage() as usage, tracer.trace("pipeline", mode=mode) as root, \
+                self._profile(root, mode) as profile:
+            result["trace_id"] = root.trace_id
+            if mode == "fused":
+                await self._arun_fused(raw_input, result, fused_review)
+            else:
+                await self._arun_staged(raw_input, result)
+
+        if profile is not None:
+            result["profile"] = profile.paths
+        result["usage"] = usage
+        result["latency"] = time.perf_counter() - start
+        return result
+
+    def _profile(self, root, mode):
+        """A profile of this run when profiling is on and the run is picked, else a no-op"""
+        profiler = self.components.get("profiler")
+        if profiler is None or not profiler.sampled():
+            return nullcontext()
+        return profiler.profile(root.trace_id, trace_id=root.trace_id, label="pipeline", mode=mode)
+
+    def _cached(self, raw_input, mode, fused_review):
+        """A cached complete result for this problem, whatever budget the caller has, or None"""
+        cache = self.components.get("result_cache")
+        if cache is None:
+            return None
+        start = time.perf_counter()
+        result = cache.get(cache_key(raw_input, mode, fused_review))
+        if result is None:
+            return None
+        result["raw_input"] = raw_input
+        result["cached"] = True
+        result.pop("profile", None)
+        # The cached run's history lookup is stale; this one is cheap (hot tier only)
+        problem = (result.get("parsed") or {}).get("problem_text", raw_input)
+        result["similar_problems"] = self.components["memory"].get_similar_problems(problem)
+        result["latency"] = time.perf_counter() - start
+        return result
+
+    def _store(self, raw_input, mode, fused_review, result):
+        cache = self.components.get("result_cache")
+        if cache is not None and cacheable(result):
+            cache.put(cache_key(raw_input, mode, fused_review), result)
+
+    def _mark_shared(self, result, raw_input):
+        """A copy of another caller's run: flag it and report the caller's own input"""
+        result["raw_input"] = raw_input
+        result["shared"] = True
+        return result
+
+    def _skip_reason(self, stage):
+        """Why an optional stage won't fit in the remaining budget, or None"""
+        left = remaining()
+        if left is None:
+            return None
+        estimate = tracer.estimate(stage, 0.5, OPTIONAL_STAGE_ESTIMATES[stage])
+        if left < estimate:
+            return f"budget: {left:.1f}s left, {stage} usually takes {estimate:.1f}s"
+        return None
+
+    def _skip(self, result, stage, reason):
+        result["skipped"].append({"stage": stage, "reason": reason})
+        tracer.count(f"skipped.{stage}")
+
+    def _skip_memory(self, result):
+        reason = self._skip_reason("memory")
+        if reason:
+            self._skip(result, "memory", reason)
+            result["similar_problems"] = []
+        return bool(reason)
+
+    def _skip_verify(self, result, solution):
+        """Skip LLM verification that won't fit; symbolic checks are cheap and always run"""
+        if solution.get("solved_by") == "sympy":
+            return False
+        reason = self._skip_reason("verify")
+        if reason:
+            self._skip(result, "verify", reason)
+            result["verification"] = unverified(reason)
+        return bool(reason)
+
+    def _skip_explain(self, result, solution):
+        """Fall back to the solution text when explaining won't fit
+
+        A passing symbolic verdict is no reason to skip: it only checks SymPy's
+        answer against SymPy's own reading of the problem, and the explainer is
+        the one stage where a model still reads the problem itself.
+        """
+        reason = self._skip_reason("explain")
+        if reason:
+            self._skip(result, "explain", reason)
+            result["explanation"] = solution.get("llm_solution", "No solution available")
+        return bool(reason)
+
+    def _skip_review(self, result, solution):
+        reason = self._skip_reason("verify_explain")
+        if reason:
+            self._skip(result, "verify_explain", reason)
+            result["verification"] = unverified(reason)
+            result["explanation"] = solution.get("llm_solution", "No solution available")
+        return bool(reason)
+
+    def _timed(self, result, stage, func, *args, **kwargs):
+        with stage_deadline(STAGE_SHARES.get(stage)), tracer.span(stage):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                result["timings"][stage] = time.perf_counter() - start
+
+    def _run_staged(self, raw_input, result):
+        c = self.components
+        parsed = self._timed(result, "parse", c["parser"].parse, raw_input)
+        problem = parsed.get("problem_text", raw_input)
+
+        result["parsed"] = parsed
+        if not self._skip_memory(result):
+            result["similar_problems"] = self._timed(result, "memory", c["memory"].get_similar_problems, problem)
+
+        solution = self._timed(result, "solve", c["solver"].solve, parsed)
+        result["solution"] = solution
+        self._review_separately(result, problem, solution)
+
+    def _run_fused(self, raw_input, result, fused_review):
+        c = self.components
+        parsed, solution = self._timed(result, "parse_solve", c["fused"].parse_and_solve, raw_input)
+        problem = parsed.get("problem_text", raw_input)
+
+        # SymPy is still consulted so the exact answer can be shown alongside
+        solution["sympy_result"] = self._timed(
+            result, "symbolic", c["solver"].try_sympy_solve,
+            problem, parsed.get("variables", []), parsed.get("topic", "algebra")
+        )
+
+        result["parsed"] = parsed
+        if not self._skip_memory(result):
+            result["similar_problems"] = self._timed(result, "memory", c["memory"].get_similar_problems, problem)
+        result["solution"] = solution
+
+        if not fused_review:
+            self._review_separately(result, problem, solution)
+            return
+        if self._skip_review(result, solution):
+            return
+
+        verification, explanation = self._timed(
+            result, "verify_explain", c["fused"].verify_and_explain,
+            problem, solution.get("llm_solution", "No solution generated")
+        )
+        result["verification"] = verification
+        result["explanation"] = explanation
+
+    def _review_separately(self, result, problem, solution):
+        c = self.components
+        if not self._skip_verify(result, solution):
+            result["verification"] = self._timed(
+                result, "verify", c["verifier"].verify,
+                problem,
+                solution.get("llm_solution", "No solution generated"),
+                # Only a SymPy-produced answer can be checked symbolically
+                solution.get("sympy_result") if solution.get("solved_by") == "sympy" else None
+            )
+        if not self._skip_explain(result, solution):
+            result["explanation"] = self._timed(
+                result, "explain", c["explainer"].explain,
+                problem,
+                solution.get("llm_solution", "No solution available")
+            )
+
+    async def _atimed(self, result, stage, coro):
+        with stage_deadline(STAGE_SHARES.get(stage)), tracer.span(stage):
+            start = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                result["timings"][stage] = time.perf_counter() - start
+
+    async def _arun_staged(self, raw_input, result):
+        c = self.components
+        parsed = await self._atimed(result, "parse", c["parser"].aparse(raw_input))
+        problem = parsed.get("problem_text", raw_input)
+
+        result["parsed"] = parsed
+        if not self._skip_memory(result):
+            result["similar_problems"] = await self._atimed(
+                result, "memory", asyncio.to_thread(c["memory"].get_similar_problems, problem)
+            )
+
+        solution = await self._atimed(result, "solve", c["solver"].asolve(parsed))
+        result["solution"] = solution
+        await self._areview_separately(result, problem, solution)
+
+    async def _arun_fused(self, raw_input, result, fused_review):
+        c = self.components
+        parsed, solution = await self._atimed(result, "parse_solve", c["fused"].aparse_and_solve(raw_input))
+        problem = parsed.get("problem_text", raw_input)
+
+        solution["sympy_result"] = await self._atimed(
+            result, "symbolic", asyncio.to_thread(
+                c["solver"].try_sympy_solve,
+                problem, parsed.get("variables", []), parsed.get("topic", "algebra")
+            )
+        )
+
+        result["parsed"] = parsed
+        if not self._skip_memory(result):
+            result["similar_problems"] = await self._atimed(
+                result, "memory", asyncio.to_thread(c["memory"].get_similar_problems, problem)
+            )
+        result["solution"] = solution
+
+        if not fused_review:
+            await self._areview_separately(result, problem, solution)
+            return
+        if self._skip_review(result, solution):
+            return
+
+        verification, explanation = await self._atimed(
+            result, "verify_explain",
+            c["fused"].averify_and_explain(problem, solution.get("llm_solution", "No solution generated"))
+        )
+        result["verification"] = verification
+        result["explanation"] = explanation
+
+    async def _areview_separately(self, result, problem, solution):
+        c = self.components
+        if not self._skip_verify(result, solution):
+            result["verification"] = await self._atimed(
+                result, "verify", c["verifier"].averify(
+                    problem,
+                    solution.get("llm_solution", "No solution generated"),
+                    solution.get("sympy_result") if solution.get("solved_by") == "sympy" else None
+                )
+            )
+        if not self._skip_explain(result, solution):
+            result["explanation"] = await self._atimed(
+                result, "explain", c["explainer"].aexplain(
+                    problem,
+                    solution.get("llm_solution", "No solution available")
+                )
+            )
+
+
+def cache_key(raw_input, mode, fused_review=True):
+    """Result cache key: budget is left out because only complete runs are cached"""
+    return problem_key(raw_input, mode, fused_review)
+
+
+def cacheable(result):
+    """Only runs where every stage ran and every model answered are worth serving again"""
+    solution = result.get("solution") or {}
+    verification = result.get("verification") or {}
+    explanation = result.get("explanation")
+    return (
+        not result.get("skipped")
+        and not result.get("cached")
+        and solution.get("confidence", 0) > 0
+        # An unreachable or unparsable verifier reports confidence 0
+        and verification.get("confidence", 0) > 0
+        and isinstance(explanation, str) and not explanation.startswith(FALLBACK_NOTICE)
+    )
+
+
+def unverified(reason):
+    """Verdict for a solution whose verification was skipped"""
+    return {
+        "is_correct": False,
+        "confidence": 0.0,
+        "issues": [f"Not verified ({reason})"],
+        "needs_human_review": True,
+        "method": "skipped"
+    }
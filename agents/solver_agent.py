@@ -1,25 +1,22 @@
-from langchain_groq import ChatGroq
-from langchain.prompts import ChatPromptTemplate
-import sympy as sp
-from sympy.parsing.sympy_parser import parse_expr
-import traceback
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import asyncio
+from langchain_core.prompts import ChatPromptTemplate
+from llm.provider import get_chat_model
+from agents.math_text import format_symbolic_solution
+from rag.context import ContextAssembler
+from utils.deadline import timeout_for
+from utils.tokens import record_usage
+from utils.tracing import span
 
 class SolverAgent:
-    def __init__(self, rag_pipeline):
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("⚠️ GROQ_API_KEY not found in .env file")
-        
-        self.llm = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            temperature=0,
-            api_key=api_key
-        )
+    def __init__(self, rag_pipeline, llm_on_symbolic=False, sandbox=None, context_assembler=None):
+        self.llm = get_chat_model(temperature=0)
         self.rag = rag_pipeline
+        # When a deterministic solver succeeds the LLM call is skipped unless enabled
+        self.llm_on_symbolic = llm_on_symbolic
+        # Optional SympySandbox - symbolic work then runs in a worker process with a timeout
+        self.sandbox = sandbox
+        # Dedupes retrieved chunks and keeps {context} within a token budget
+        self.context_assembler = context_assembler or ContextAssembler()
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert math solver. Use the provided context and solve step-by-step.
@@ -35,75 +32,124 @@ Provide:
             ("user", "Problem: {problem}\nTopic: {topic}")
         ])
     
-    def solve(self, parsed_problem):
+    def solve(self, parsed_problem, use_llm=None):
         """Solve the math problem using RAG + tools"""
         problem_text = parsed_problem["problem_text"]
         topic = parsed_problem["topic"]
         
-        # Retrieve relevant context
+        # Try the deterministic topic solvers first - no retrieval or API call needed
+        sympy_result = self.try_sympy_solve(problem_text, parsed_problem.get("variables", []), topic)
+        symbolic = self._symbolic_answer(sympy_result, use_llm)
+        if symbolic is not None:
+            return symbolic
+        
+        context_text, context, context_stats = self.retrieve(problem_text, topic, sympy_result.get("signatures"))
+        
+        # Get LLM solution
+        chain = self.prompt | self.llm
+        
         try:
-            context = self.rag.retrieve_context(f"{topic} {problem_text}", k=3)
-            context_text = "\n\n".join([c["content"] for c in context]) if context else "No relevant context found."
+            with span("llm.solve"):
+                response = chain.invoke({
+                    "problem": problem_text,
+                    "topic": topic,
+                    "context": context_text
+                })
+                record_usage("solve", response)
+            
+            return self._llm_answer(response.content, 0.85, sympy_result, context, context_stats)
         except Exception as e:
-            print(f"⚠️ Error retrieving context: {e}")
-            context = []
-            context_text = "No context available."
+            print(f"❌ Error in LLM solution: {e}")
+            return self._llm_answer(f"Error: {str(e)}", 0.0, sympy_result, context, context_stats)
+    
+    async def asolve(self, parsed_problem, use_llm=None):
+        """Async solve() - SymPy and retrieval run on worker threads, the LLM call is awaited"""
+        problem_text = parsed_problem["problem_text"]
+        topic = parsed_problem["topic"]
         
-        # Try symbolic solving with SymPy
-        sympy_result = self.try_sympy_solve(problem_text, parsed_problem.get("variables", []))
+        sympy_result = await asyncio.to_thread(
+            self.try_sympy_solve, problem_text, parsed_problem.get("variables", []), topic
+        )
+        symbolic = self._symbolic_answer(sympy_result, use_llm)
+        if symbolic is not None:
+            return symbolic
+        
+        context_text, context, context_stats = await asyncio.to_thread(
+            self.retrieve, problem_text, topic, sympy_result.get("signatures")
+        )
         
-        # Get LLM solution
         chain = self.prompt | self.llm
         
         try:
-            response = chain.invoke({
-                "problem": problem_text,
-                "topic": topic,
-                "context": context_text
-            })
+            with span("llm.solve"):
+                response = await chain.ainvoke({
+                    "problem": problem_text,
+                    "topic": topic,
+                    "context": context_text
+                })
+                record_usage("solve", response)
             
-            return {
-                "llm_solution": response.content,
-                "sympy_result": sympy_result,
-                "retrieved_context": context,
-                "confidence": 0.85
-            }
+            return self._llm_answer(response.content, 0.85, sympy_result, context, context_stats)
         except Exception as e:
             print(f"❌ Error in LLM solution: {e}")
-            return {
-                "llm_solution": f"Error: {str(e)}",
-                "sympy_result": sympy_result,
-                "retrieved_context": context,
-                "confidence": 0.0
-            }
+            return self._llm_answer(f"Error: {str(e)}", 0.0, sympy_result, context, context_stats)
     
-    def try_sympy_solve(self, problem_text, variables):
-        """Attempt to solve using SymPy"""
+    def retrieve(self, problem_text, topic, signatures=None):
+        """(context_text, selected chunks, stats) from the knowledge base
+
+        `signatures` (from try_sympy_solve) add the formulas whose structure
+        matches the problem's expression ahead of the text search results.
+        """
+        context_stats = {}
         try:
-            # Simple equation detection
-            if "=" in problem_text and any(v in problem_text.lower() for v in ['x', 'y', 'z']):
-                # Clean the text
-                problem_text = problem_text.replace("^", "**")
-                parts = problem_text.split("=")
-                
-                if len(parts) == 2:
-                    lhs = parse_expr(parts[0].strip())
-                    rhs = parse_expr(parts[1].strip())
-                    equation = sp.Eq(lhs, rhs)
-                    
-                    # Detect variables
-                    vars_in_eq = list(equation.free_symbols)
-                    solution = sp.solve(equation, vars_in_eq)
-                    
-                    return {
-                        "success": True,
-                        "solution": str(solution),
-                        "equation": str(equation)
-                    }
+            with span("retrieval"):
+                candidates = self.rag.retrieve_formulas(signatures) + \
+                    self.rag.retrieve_context(f"{topic} {problem_text}", k=self.context_assembler.max_k)
+                context_text, context, context_stats = self.context_assembler.assemble(candidates)
+            if not context_text:
+                context_text = "No relevant context found."
         except Exception as e:
+            print(f"⚠️ Error retrieving context: {e}")
+            context = []
+            context_text = "No context available."
+        return context_text, context, context_stats
+    
+    def _symbolic_answer(self, sympy_result, use_llm):
+        """The SymPy answer when it stands on its own, else None"""
+        if use_llm is None:
+            use_llm = self.llm_on_symbolic or not sympy_result.get("success")
+        
+        if sympy_result.get("success") and not use_llm:
             return {
-                "success": False,
-                "error": str(e)
+                "llm_solution": format_symbolic_solution(sympy_result),
+                "sympy_result": sympy_result,
+                "retrieved_context": [],
+                "confidence": 0.95,
+                "solved_by": "sympy"
             }
-        
-        return {"success": False, "error": "Could not parse as equation"}
+        return None
+    
+    def _llm_answer(self, content, confidence, sympy_result, context, context_stats):
+        return {
+            "llm_solution": content,
+            "sympy_result": sympy_result,
+            "retrieved_context": context,
+            "context_stats": context_stats,
+            "confidence": confidence,
+            "solved_by": "llm"
+        }
+    
+    def try_sympy_solve(self, problem_text, variables, topic="algebra"):
+        """Attempt to solve using the deterministic SymPy solvers for the topic"""
+        with span("sympy", topic=topic) as sympy_span:
+            if self.sandbox is not None:
+                result = self.sandbox.run(
+                    "solve_symbolically", topic, problem_text, list(variables or []),
+                    timeout=timeout_for(self.sandbox.timeout)
+                )
+            else:
+                # SymPy is only imported when symbolic solving runs in this process
+                from agents.symbolic_solvers import solve_symbolically
+                result = solve_symbolically(topic, problem_text, variables)
+            sympy_span.set(success=bool(result.get("success")))
+        return result
@@ -0,0 +1,677 @@
+import re
+import sympy as sp
+import numpy as np
+from sympy.functions.elementary.trigonometric import TrigonometricFunction
+from sympy.parsing.sympy_parser import (
+    parse_expr,
+    standard_transformations,
+    implicit_multiplication,
+    implicit_application,
+    convert_xor
+)
+from agents.math_text import format_symbolic_solution, normalize_math_text
+from rag.formulas import result_signatures
+
+TRANSFORMATIONS = standard_transformations + (
+    implicit_multiplication,
+    implicit_application,
+    convert_xor
+)
+
+LOCAL_NAMES = {
+    "e": sp.E,
+    "pi": sp.pi,
+    "ln": sp.log,
+    "oo": sp.oo
+}
+
+
+def to_expr(text):
+    """Parse a math fragment, rejecting anything that is not plain notation"""
+    text = text.strip().rstrip(".?!,;:").strip()
+    if not text or re.search(r"__|\blambda\b|\bimport\b", text):
+        raise ValueError(f"Refusing to parse: {text!r}")
+
+    expr = parse_expr(normalize_math_text(text), local_dict=LOCAL_NAMES,
+                      transformations=TRANSFORMATIONS)
+
+    # Leftover English words parse as multi-letter symbols - treat as no match
+    for symbol in getattr(expr, "free_symbols", set()):
+        if len(symbol.name) > 1:
+            raise ValueError(f"Unexpected word in expression: {symbol.name}")
+    return expr
+
+
+def to_equation(text):
+    """Parse 'lhs = rhs' into a SymPy equation"""
+    parts = text.split("=")
+    if len(parts) != 2:
+        raise ValueError(f"Not a single equation: {text!r}")
+    return sp.Eq(to_expr(parts[0]), to_expr(parts[1]))
+
+
+def pick_variable(expr, variables=None, hint=None):
+    """Choose the variable to operate on"""
+    symbols = sorted(expr.free_symbols, key=lambda s: s.name)
+    if hint:
+        return sp.Symbol(hint)
+    for name in variables or []:
+        if any(s.name == name for s in symbols):
+            return sp.Symbol(name)
+    for name in ("x", "t", "y", "z"):
+        if any(s.name == name for s in symbols):
+            return sp.Symbol(name)
+    return symbols[0] if symbols else sp.Symbol("x")
+
+
+def _result(topic, method, solution, **extra):
+    result = {
+        "success": True,
+        "topic": topic,
+        "method": method,
+        "solution": str(solution),
+        "latex": sp.latex(solution) if isinstance(solution, sp.Basic) else str(solution)
+    }
+    result.update(extra)
+    return result
+
+
+# ---------------------------------------------------------------- calculus
+
+ORDER_WORDS = {"second": 2, "third": 3, "2nd": 2, "3rd": 3}
+
+DERIVATIVE_PATTERN = re.compile(
+    r"(?:(?P<order>second|third|2nd|3rd)\s+)?(?:derivative|differentiate)\s+(?:of\s+)?"
+    r"(?P<expr>.+?)"
+    r"(?:\s+(?:with respect to|w\.?r\.?t\.?)\s+(?P<var>[a-z]))?\s*[.?]?$",
+    re.IGNORECASE
+)
+LEIBNIZ_PATTERN = re.compile(r"d/d(?P<var>[a-z])\s*(?P<expr>.+?)\s*[.?]?$")
+
+INTEGRAL_PATTERN = re.compile(
+    r"(?:integrate|integral of|∫)\s*(?P<expr>.+?)"
+    r"(?:\s*d(?P<var>[a-z]))?"
+    r"(?:\s+from\s+(?P<lower>\S+)\s+to\s+(?P<upper>\S+?))?\s*[.?]?$",
+    re.IGNORECASE
+)
+
+LIMIT_PATTERN = re.compile(
+    r"lim(?:it)?(?:\s+of)?\s*\(?\s*(?P<var>[a-z])\s*(?:->|approaches|tends to)\s*(?P<point>[^)\s]+)\s*\)?\s*(?:of\s+)?(?P<expr>.+?)\s*[.?]?$",
+    re.IGNORECASE
+)
+LIMIT_SUFFIX_PATTERN = re.compile(
+    r"lim(?:it)?\s+(?:of\s+)?(?P<expr>.+?)\s+as\s+(?P<var>[a-z])\s*(?:->|approaches|tends to)\s*(?P<point>\S+?)\s*[.?]?$",
+    re.IGNORECASE
+)
+
+
+def _strip_function_prefix(text):
+    """Drop a leading 'f(x) =' or 'y =' from an expression"""
+    return re.sub(r"^\s*(?:[a-z]\([a-z]\)|y)\s*=\s*", "", text)
+
+
+def solve_derivative(problem_text, variables=None):
+    """d/dx of an expression, optionally of higher order"""
+    text = normalize_math_text(problem_text)
+    match = DERIVATIVE_PATTERN.search(text) or LEIBNIZ_PATTERN.search(text)
+    if not match:
+        return None
+
+    groups = match.groupdict()
+    expr = to_expr(_strip_function_prefix(groups["expr"]))
+    var = pick_variable(expr, variables, groups.get("var"))
+    order = ORDER_WORDS.get((groups.get("order") or "").lower(), 1)
+
+    derivative = sp.simplify(sp.diff(expr, var, order))
+    return _result(
+        "calculus", "derivative", derivative,
+        expression=str(expr),
+        variable=str(var),
+        order=order,
+        steps=[f"f({var}) = {expr}", f"d^{order}f/d{var}^{order} = {derivative}"]
+    )
+
+
+def solve_integral(problem_text, variables=None):
+    """Indefinite or definite integral"""
+    text = normalize_math_text(problem_text)
+    match = INTEGRAL_PATTERN.search(text)
+    if not match:
+        return None
+
+    groups = match.groupdict()
+    expr = to_expr(_strip_function_prefix(groups["expr"]))
+    var = pick_variable(expr, variables, groups.get("var"))
+
+    if groups.get("lower") and groups.get("upper"):
+        lower, upper = to_expr(groups["lower"]), to_expr(groups["upper"])
+        value = sp.simplify(sp.integrate(expr, (var, lower, upper)))
+        return _result(
+            "calculus", "definite_integral", value,
+            expression=str(expr),
+            variable=str(var),
+            bounds=[str(lower), str(upper)],
+            steps=[f"∫ {expr} d{var} from {lower} to {upper} = {value}"]
+        )
+
+    antiderivative = sp.integrate(expr, var)
+    if antiderivative.has(sp.Integral):
+        raise ValueError("No closed-form antiderivative found")
+    return _result(
+        "calculus", "integral", antiderivative,
+        expression=str(expr),
+        variable=str(var),
+        steps=[f"∫ {expr} d{var} = {antiderivative} + C"]
+    )
+
+
+def solve_limit(problem_text, variables=None):
+    """Limit of an expression at a point"""
+    text = normalize_math_text(problem_text)
+    match = LIMIT_SUFFIX_PATTERN.search(text) or LIMIT_PATTERN.search(text)
+    if not match:
+        return None
+
+    groups = match.groupdict()
+    expr = to_expr(groups["expr"])
+    var = sp.Symbol(groups["var"])
+    # "0+" / "0^-" ask for one side; a bare point asks for both
+    side = re.fullmatch(r"(.+?)\^?([+-])", groups["point"])
+    point = to_expr(side.group(1) if side else groups["point"])
+
+    if side:
+        value = sp.limit(expr, var, point, dir=side.group(2))
+    elif point.is_infinite:
+        value = sp.limit(expr, var, point)
+    else:
+        value = sp.limit(expr, var, point, dir="+")
+        if sp.limit(expr, var, point, dir="-") != value:
+            return None
+    if value is sp.zoo or value.has(sp.AccumBounds):
+        return None
+    arrow = f"{point}{side.group(2)}" if side else point
+    return _result(
+        "calculus", "limit", value,
+        expression=str(expr),
+        variable=str(var),
+        point=str(point),
+        steps=[f"lim({var} -> {arrow}) {expr} = {value}"]
+    )
+
+
+# ---------------------------------------------------------- linear algebra
+
+MATRIX_PATTERN = re.compile(r"\[\s*\[.*?\]\s*\]", re.DOTALL)
+
+# Numeric eigenproblems above this size go to NumPy instead of the
+# characteristic polynomial, which gets slow quickly in SymPy
+NUMPY_EIGEN_MIN_SIZE = 4
+
+
+def extract_matrix(problem_text):
+    """Find the first [[a, b], [c, d]] literal in the text"""
+    match = MATRIX_PATTERN.search(normalize_math_text(problem_text))
+    if not match:
+        return None
+
+    rows = re.findall(r"\[([^\[\]]*)\]", match.group(0))
+    matrix = [[to_expr(entry) for entry in row.split(",")] for row in rows]
+    if len({len(row) for row in matrix}) != 1:
+        raise ValueError("Matrix rows have different lengths")
+    return sp.Matrix(matrix)
+
+
+DETERMINANT_WORDS = re.compile(r"\bdet(?:erminant)?\b|\|A\|", re.IGNORECASE)
+INVERSE_WORDS = re.compile(r"\binverse\b|⁻¹|\*\*\s*\(?\s*-\s*1\b", re.IGNORECASE)
+# Something done to the matrix before the asked-for operation: A^2, A^T, 2A, A+B, transpose, adjoint
+MATRIX_OPERATION = re.compile(
+    r"\b[A-Z]\s*\*\*\s*(?!\(?\s*-\s*1\b)|\b\d+\s*\*?\s*[A-Z]\b|ᵀ|\b[A-Z]\s*[-+*/@]\s*[A-Z]\b"
+    r"|(?i:\btranspose\b|\badj(?:oint|ugate)?\b|\bsquare\b|\bcube\b|\bpower\b|\bproduct\b)"
+)
+
+
+def _plain_matrix_request(problem_text):
+    """False when the matrix solvers would answer a different question than asked
+
+    Eigenvectors, a determinant and an inverse asked together, or an
+    operation applied to the matrix first are left to the LLM.
+    """
+    text = normalize_math_text(problem_text)
+    if re.search(r"eigenvector", text, re.IGNORECASE):
+        return False
+    if DETERMINANT_WORDS.search(text) and INVERSE_WORDS.search(text):
+        return False
+    return not MATRIX_OPERATION.search(MATRIX_PATTERN.sub(" ", text))
+
+
+def _is_numeric(matrix):
+    return all(entry.is_number for entry in matrix)
+
+
+def solve_determinant(problem_text, variables=None):
+    if not DETERMINANT_WORDS.search(problem_text) or not _plain_matrix_request(problem_text):
+        return None
+    matrix = extract_matrix(problem_text)
+    if matrix is None or not matrix.is_square:
+        return None
+
+    determinant = sp.simplify(matrix.det())
+    return _result(
+        "linear_algebra", "determinant", determinant,
+        matrix=str(matrix.tolist()),
+        steps=[f"A = {matrix.tolist()}", f"det(A) = {determinant}"]
+    )
+
+
+def solve_inverse(problem_text, variables=None):
+    if not INVERSE_WORDS.search(normalize_math_text(problem_text)) or not _plain_matrix_request(problem_text):
+        return None
+    matrix = extract_matrix(problem_text)
+    if matrix is None or not matrix.is_square:
+        return None
+
+    determinant = sp.simplify(matrix.det())
+    if determinant == 0:
+        return _result(
+            "linear_algebra", "inverse", "Matrix is singular (det = 0), no inverse exists",
+            matrix=str(matrix.tolist()),
+            determinant="0",
+            steps=[f"det(A) = 0, so A is not invertible"]
+        )
+
+    inverse = sp.simplify(matrix.inv())
+    return _result(
+        "linear_algebra", "inverse", inverse.tolist(),
+        matrix=str(matrix.tolist()),
+        determinant=str(determinant),
+        steps=[f"det(A) = {determinant}", f"A⁻¹ = {inverse.tolist()}"]
+    )
+
+
+def solve_eigenvalues(problem_text, variables=None):
+    if not re.search(r"eigen", problem_text, re.IGNORECASE) or not _plain_matrix_request(problem_text):
+        return None
+    matrix = extract_matrix(problem_text)
+    if matrix is None or not matrix.is_square:
+        return None
+
+    if _is_numeric(matrix) and matrix.rows >= NUMPY_EIGEN_MIN_SIZE:
+        values = np.linalg.eigvals(np.array(matrix.tolist(), dtype=float))
+        eigenvalues = sorted((complex(round(v.real, 10), round(v.imag, 10)) if abs(v.imag) > 1e-12
+                              else round(float(v.real), 10) for v in values),
+                             key=lambda v: (abs(v), str(v)))
+        return _result(
+            "linear_algebra", "eigenvalues", eigenvalues,
+            matrix=str(matrix.tolist()),
+            engine="numpy",
+            steps=["Eigenvalues computed numerically with numpy.linalg.eigvals"]
+        )
+
+    lam = sp.Symbol("lambda")
+    characteristic = sp.factor((matrix - lam * sp.eye(matrix.rows)).det())
+    eigenvalues = matrix.eigenvals()
+    return _result(
+        "linear_algebra", "eigenvalues",
+        {str(k): v for k, v in eigenvalues.items()},
+        matrix=str(matrix.tolist()),
+        characteristic_polynomial=str(characteristic),
+        eigenvalues=[str(value) for value in eigenvalues],
+        engine="sympy",
+        steps=[f"det(A - λI) = {characteristic} = 0",
+               f"Eigenvalues (with multiplicity): {eigenvalues}"]
+    )
+
+
+# ------------------------------------------------------------- probability
+
+NCR_PATTERNS = [
+    re.compile(r"\b(\d+)\s*C\s*(\d+)\b"),
+    re.compile(r"\bC\(\s*(\d+)\s*,\s*(\d+)\s*\)"),
+    re.compile(r"\b(\d+)\s+choose\s+(\d+)\b", re.IGNORECASE),
+]
+NPR_PATTERNS = [
+    re.compile(r"\b(\d+)\s*P\s*(\d+)\b"),
+    re.compile(r"\bP\(\s*(\d+)\s*,\s*(\d+)\s*\)"),
+]
+
+
+def solve_combinatorics(problem_text, variables=None):
+    """nCr / nPr written out explicitly"""
+    for patterns, method in ((NCR_PATTERNS, "nCr"), (NPR_PATTERNS, "nPr")):
+        for pattern in patterns:
+            match = pattern.search(problem_text)
+            if not match:
+                continue
+            n, r = int(match.group(1)), int(match.group(2))
+            if r > n:
+                raise ValueError(f"r ({r}) cannot exceed n ({n})")
+            if method == "nCr":
+                value = sp.binomial(n, r)
+                formula = f"{n}C{r} = {n}!/({r}!({n}-{r})!) = {value}"
+            else:
+                value = sp.ff(n, r)
+                formula = f"{n}P{r} = {n}!/({n}-{r})! = {value}"
+            return _result("probability", method, value, n=n, r=r, steps=[formula])
+    return None
+
+
+BINOMIAL_TRIALS = re.compile(
+    r"(?:\bn\s*=\s*(\d+)|(\d+)\s+(?:independent\s+)?(?:trials|times|tosses|flips|rolls))",
+    re.IGNORECASE
+)
+BINOMIAL_P = re.compile(
+    r"(?:\bp\s*=\s*|probability of success (?:is\s+)?)(\d*\.?\d+(?:/\d+)?)",
+    re.IGNORECASE
+)
+BINOMIAL_K = re.compile(
+    r"\b(exactly|at least|at most|more than|fewer than|less than)\s+(\d+)",
+    re.IGNORECASE
+)
+
+
+# Success events that aren't one face of one fair coin or die
+COMPOUND_OUTCOME = re.compile(
+    r"\b(?:sum|total|product|even|odd|prime|multiple|greater|bigger|larger|smaller|either|or|both|doubles?)\b"
+    r"|\b(?:two|three|four|five|six|pair of|\d+)\s+(?:fair\s+)?(?:dice|coins)\b",
+    re.IGNORECASE
+)
+COIN_FACE = re.compile(r"\b(heads?|tails?)\b", re.IGNORECASE)
+DIE_FACE = re.compile(
+    r"\b(?:a|an|one|the)\s+(one|two|three|four|five|six|[1-6])\b(?!\s*(?:times|trials|rolls))"
+    r"|\b\d+\s+(one|two|three|four|five|six)\b|\b(ones|twos|threes|fours|fives|sixes|[1-6]'?s)\b",
+    re.IGNORECASE
+)
+FACE_NAMES = {"one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6",
+              "ones": "1", "twos": "2", "threes": "3", "fours": "4", "fives": "5", "sixes": "6"}
+
+
+def _single_outcome_probability(problem_text):
+    """1/2 for heads or tails of a coin, 1/6 for one named face of a die, else None"""
+    if COMPOUND_OUTCOME.search(problem_text):
+        return None
+    if re.search(r"\bcoins?\b", problem_text, re.IGNORECASE):
+        faces = {match.lower().rstrip("s") for match in COIN_FACE.findall(problem_text)}
+        return sp.Rational(1, 2) if len(faces) == 1 else None
+    if re.search(r"\b(?:die|dice)\b", problem_text, re.IGNORECASE):
+        faces = set()
+        for match in DIE_FACE.findall(problem_text):
+            face = "".join(match).lower().replace("'", "")
+            faces.add(FACE_NAMES.get(face, face.rstrip("s")))
+        return sp.Rational(1, 6) if len(faces) == 1 else None
+    return None
+
+
+def solve_binomial(problem_text, variables=None):
+    """P(X = k), P(X >= k), ... for X ~ Bin(n, p)"""
+    trials = BINOMIAL_TRIALS.search(problem_text)
+    bound = BINOMIAL_K.search(problem_text)
+    if not trials or not bound:
+        return None
+
+    n = int(trials.group(1) or trials.group(2))
+    kind, k = bound.group(1).lower(), int(bound.group(2))
+    if k > n:
+        return None
+    p_match = BINOMIAL_P.search(problem_text)
+    if p_match:
+        p = sp.nsimplify(p_match.group(1))
+    else:
+        p = _single_outcome_probability(problem_text)
+        if p is None:
+            return None
+
+    ks = {
+        "exactly": [k],
+        "at least": range(k, n + 1),
+        "more than": range(k + 1, n + 1),
+        "at most": range(0, k + 1),
+        "fewer than": range(0, k),
+        "less than": range(0, k),
+    }[kind]
+
+    value = sp.nsimplify(sum(sp.binomial(n, i) * p**i * (1 - p)**(n - i) for i in ks))
+    return _result(
+        "probability", "binomial", value,
+        n=n, p=str(p), k=k, condition=kind,
+        decimal=str(sp.N(value, 6)),
+        steps=[f"X ~ Bin(n={n}, p={p})",
+               f"P(X {kind} {k}) = Σ nCi p^i (1-p)^(n-i) = {value} ≈ {sp.N(value, 6)}"]
+    )
+
+
+PROBABILITY_ASSIGNMENT = re.compile(
+    r"P\(\s*([A-Za-z][\w']*(?:ᶜ|\^c)?)\s*(?:\|\s*([A-Za-z][\w']*(?:ᶜ|\^c)?|not\s+[A-Za-z]\w*)\s*)?\)\s*=\s*(\d*\.?\d+(?:/\d+)?%?)"
+)
+
+
+def _event(name):
+    """Canonical event name, complements end with a prime"""
+    name = name.strip()
+    if name.startswith("not "):
+        return name[4:].strip() + "'"
+    return re.sub(r"(?:ᶜ|\^c)$", "'", name)
+
+
+def _probability(value):
+    if value.endswith("%"):
+        return sp.nsimplify(value[:-1]) / 100
+    return sp.nsimplify(value)
+
+
+# A probability the text asks for rather than gives: "Find P(A'|B)", "P(B) = ?"
+PROBABILITY_TARGET = re.compile(
+    r"P\(\s*([A-Za-z][\w']*(?:ᶜ|\^c)?)\s*(?:\|\s*([A-Za-z][\w']*(?:ᶜ|\^c)?|not\s+[A-Za-z]\w*)\s*)?\)(?!\s*=\s*\.?\d)"
+)
+
+
+def _joint_table(given, hypothesis, evidence):
+    """{(h, e): P(h and e)} over H/H' and E/E', or None if the givens don't pin it down"""
+    prior = given.get((hypothesis, None))
+    likelihood = given.get((evidence, hypothesis))
+    if prior is None or likelihood is None:
+        return None, None
+    both = likelihood * prior
+    alternative = given.get((evidence, hypothesis + "'"))
+    if alternative is not None:
+        marginal = both + alternative * (1 - prior)
+        total = f"P({evidence}) = P({evidence}|{hypothesis})P({hypothesis}) + P({evidence}|{hypothesis}')P({hypothesis}') = {marginal}"
+    elif (evidence, None) in given:
+        marginal = given[(evidence, None)]
+        total = f"P({evidence}) = {marginal}"
+    else:
+        return None, None
+    table = {
+        (hypothesis, evidence): both,
+        (hypothesis + "'", evidence): marginal - both,
+        (hypothesis, evidence + "'"): prior - both,
+        (hypothesis + "'", evidence + "'"): 1 - prior - marginal + both
+    }
+    if any(value < 0 for value in table.values()):
+        raise ValueError("The given probabilities are inconsistent")
+    return table, total
+
+
+def _table_probability(table, event, condition=None):
+    def probability(name):
+        return sum(value for cell, value in table.items() if name in cell)
+
+    if condition is None:
+        return probability(event)
+    if probability(condition) == 0:
+        raise ValueError(f"P({condition}) is zero")
+    return sum(value for cell, value in table.items() if event in cell and condition in cell) / probability(condition)
+
+
+def solve_bayes(problem_text, variables=None):
+    """The asked-for P(X) or P(X|Y) from a prior and likelihoods
+
+    Needs exactly one probability the text asks for ("Find P(A'|B)"); with
+    none or several, the LLM reads the question instead.
+    """
+    given = {}
+    for event, condition, value in PROBABILITY_ASSIGNMENT.findall(problem_text):
+        key = (_event(event), _event(condition) if condition else None)
+        given[key] = _probability(value)
+
+    targets = {
+        (_event(event), _event(condition) if condition else None)
+        for event, condition in PROBABILITY_TARGET.findall(problem_text)
+    }
+    if len(targets) != 1:
+        return None
+    event, condition = targets.pop()
+    named = {event.rstrip("'")} | ({condition.rstrip("'")} if condition else set())
+
+    for (evidence, hypothesis) in list(given):
+        if hypothesis is None or hypothesis.endswith("'") or evidence.endswith("'"):
+            continue
+        if not named <= {evidence, hypothesis} or (condition and len(named) != 2):
+            continue
+        table, total = _joint_table(given, hypothesis, evidence)
+        if table is None:
+            continue
+
+        answer = sp.nsimplify(_table_probability(table, event, condition))
+        target = f"P({event}|{condition})" if condition else f"P({event})"
+        steps = [total]
+        if condition:
+            steps.append(f"{target} = P({event} ∩ {condition}) / P({condition}) = {answer} ≈ {sp.N(answer, 6)}")
+        elif event != evidence:
+            steps.append(f"{target} = {answer}")
+        return _result(
+            "probability", "bayes", answer,
+            target=target,
+            decimal=str(sp.N(answer, 6)),
+            steps=steps
+        )
+    return None
+
+
+# ------------------------------------------------------------------ algebra
+
+INSTRUCTION_PREFIX = re.compile(
+    r"^.*?(?:solve|find|determine|compute)\b[^:=]*?(?:[:,]|\bif\b|\bwhere\b|\bgiven\b|\bsystem\b|\bequations?\b)\s*",
+    re.IGNORECASE
+)
+
+
+# Relations the equation solver can't honour; "->" (from →) is not one
+INEQUALITY = re.compile(r"<|(?<!-)>|[≤≥]|!=")
+
+
+def extract_equations(problem_text):
+    """Split the text into the individual 'lhs = rhs' statements it contains
+
+    Returns [] when the text also has an inequality, a ≠ condition or a
+    chained relation: solving only its equations would drop part of the problem.
+    """
+    text = normalize_math_text(problem_text)
+    # Checked before the instruction prefix is stripped, which could swallow "Solve x > 0,"
+    if INEQUALITY.search(text):
+        return []
+    text = INSTRUCTION_PREFIX.sub("", text, count=1).lstrip(":, ")
+    text = re.sub(r"^\s*(?:solve|find)\s+", "", text, flags=re.IGNORECASE)
+    parts = re.split(r"[;\n]|,\s*(?![^()\[\]]*[)\]])|\band\b", text)
+    if any(part.count("=") > 1 for part in parts):
+        return []
+
+    equations = []
+    for part in parts:
+        if part.count("=") == 1:
+            try:
+                equations.append(to_equation(part))
+            except Exception:
+                return []
+    return equations
+
+
+REAL_DOMAIN = re.compile(r"\b(?:over|in)\s+(?:the\s+)?(?:reals|real numbers|R)\b|∈\s*ℝ|ℝ|\breal\b", re.IGNORECASE)
+# Domains the solver doesn't restrict to; with one of these the LLM takes the problem
+RESTRICTED_DOMAIN = re.compile(
+    r"\b(?:positive|negative|non-?negative|integers?|natural|whole|rational|interval|domain)\b|[∈ℤℕℚ]|\bin\s*[\[(]",
+    re.IGNORECASE
+)
+
+
+def solve_equations(problem_text, variables=None):
+    """A single equation or a system of simultaneous equations
+
+    Solutions are complex unless the text asks for real ones. Periodic
+    (trigonometric) equations and other domains return None: a finite list
+    of roots would not be the general solution.
+    """
+    real = bool(REAL_DOMAIN.search(problem_text))
+    problem_text = REAL_DOMAIN.sub(" ", problem_text)
+    if RESTRICTED_DOMAIN.search(problem_text):
+        return None
+    equations = extract_equations(problem_text)
+    if not equations:
+        return None
+    if any(eq.atoms(TrigonometricFunction) for eq in equations):
+        return None
+
+    symbols = set().union(*(eq.free_symbols for eq in equations))
+    if not symbols:
+        return None
+    preferred = [sp.Symbol(v) for v in variables or [] if sp.Symbol(v) in symbols]
+    unknowns = preferred or sorted(symbols, key=lambda s: s.name)
+    if len(equations) == 1 and not preferred:
+        unknowns = [pick_variable(equations[0], variables)]
+
+    if real and len(equations) == 1 and len(unknowns) == 1:
+        solutions = sp.solveset(equations[0], unknowns[0], sp.S.Reals)
+        if not isinstance(solutions, sp.FiniteSet) and solutions is not sp.S.EmptySet:
+            return None
+        roots = [{unknowns[0]: root} for root in solutions]
+    else:
+        roots = sp.solve(equations, unknowns, dict=True)
+        if real:
+            roots = [root for root in roots if all(value.is_real is not False for value in root.values())]
+    method = "system" if len(equations) > 1 else "equation"
+    return _result(
+        "algebra", method, roots,
+        equation=str(equations[0]) if len(equations) == 1 else str(equations),
+        equations=[str(eq) for eq in equations],
+        symbols=[str(s) for s in unknowns],
+        roots=[{str(k): str(v) for k, v in root.items()} for root in roots],
+        steps=[f"Equations: {', '.join(str(eq) for eq in equations)}",
+               f"Solutions: {roots if roots else 'no solution'}"]
+    )
+
+
+TOPIC_SOLVERS = {
+    "calculus": [solve_limit, solve_integral, solve_derivative],
+    "linear_algebra": [solve_inverse, solve_eigenvalues, solve_determinant],
+    "probability": [solve_bayes, solve_binomial, solve_combinatorics],
+    "algebra": [solve_equations],
+}
+
+
+def solve_symbolically(topic, problem_text, variables=None):
+    """Run the deterministic solvers registered for a topic
+
+    Returns the first solver result that applies, or a failure dict when
+    no solver recognised the problem. Either way "signatures" carries the
+    structural signatures of the problem's expression for formula retrieval.
+    """
+    errors = []
+    result = None
+    for solver in TOPIC_SOLVERS.get(topic, TOPIC_SOLVERS["algebra"]):
+        try:
+            result = solver(problem_text, variables)
+        except Exception as e:
+            errors.append(f"{solver.__name__}: {e}")
+            continue
+        if result is not None:
+            break
+
+    if result is None:
+        result = {
+            "success": False,
+            "error": "; ".join(errors) if errors else "No deterministic solver matched"
+        }
+    try:
+        result["signatures"] = result_signatures(result, problem_text)
+    except Exception as e:
+        print(f"⚠️ Could not compute formula signatures: {e}")
+    return result
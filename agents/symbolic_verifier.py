@@ -0,0 +1,222 @@
+import math
+import random
+import re
+import sympy as sp
+
+from agents.math_text import normalize_math_text
+
+# Residuals below this count as zero when simplify can't decide symbolically
+TOLERANCE = 1e-9
+
+# A passing check confirms the answer to SymPy's reading of the problem, not
+# that the reading is right, so it never claims more than the LLM verifier does
+PASSED_CONFIDENCE = 0.9
+
+
+def _is_zero(expr):
+    """True/False when decidable, None when it cannot be determined"""
+    expr = sp.simplify(expr)
+    if expr == 0:
+        return True
+    if expr.free_symbols:
+        return None
+    value = complex(sp.N(expr, 30))
+    return abs(value) < TOLERANCE
+
+
+def domain_issues(expr, root):
+    """Division by zero, negative radicands and log of non-positive values at a root"""
+    issues = []
+    for power in expr.atoms(sp.Pow):
+        base, exponent = power.as_base_exp()
+        value = base.subs(root)
+        if not value.is_number:
+            continue
+        if exponent.is_negative and _is_zero(value):
+            issues.append(f"{base} = 0 (division by zero)")
+        elif exponent.is_Rational and not exponent.is_integer and exponent.q % 2 == 0 and value.is_real and value < 0:
+            issues.append(f"{base} = {value} < 0 under an even root")
+    for log in expr.atoms(sp.log):
+        value = log.args[0].subs(root)
+        if value.is_number and value.is_real and value <= 0:
+            issues.append(f"log argument {log.args[0]} = {value} <= 0")
+    return issues
+
+
+def check_equations(result):
+    """Substitute every root back into every equation"""
+    if not result.get("roots"):
+        return None
+
+    equations = [sp.sympify(eq) for eq in result["equations"]]
+    checks, issues = [], []
+    for raw_root in result["roots"]:
+        root = {sp.Symbol(k): sp.sympify(v) for k, v in raw_root.items()}
+        label = ", ".join(f"{k} = {v}" for k, v in raw_root.items())
+
+        for eq in equations:
+            problems = domain_issues(eq.lhs, root) + domain_issues(eq.rhs, root)
+            if problems:
+                issues.append(f"{label} is outside the domain: {'; '.join(problems)}")
+                continue
+            satisfied = _is_zero((eq.lhs - eq.rhs).subs(root))
+            if satisfied is None:
+                return None
+            if not satisfied:
+                issues.append(f"{label} does not satisfy {eq}")
+        checks.append(f"Substituted {label} into {len(equations)} equation(s)")
+    return checks, issues
+
+
+def check_integral(result):
+    """Differentiate the antiderivative back to the integrand"""
+    expr = sp.sympify(result["expression"])
+    var = sp.Symbol(result["variable"])
+    antiderivative = sp.sympify(result["solution"])
+    ok = _is_zero(sp.diff(antiderivative, var) - expr)
+    if ok is None:
+        return None
+    issues = [] if ok else [f"d/d{var}({antiderivative}) does not equal {expr}"]
+    return [f"Differentiated the antiderivative with respect to {var}"], issues
+
+
+def check_definite_integral(result):
+    """Compare against numeric quadrature"""
+    expr = sp.sympify(result["expression"])
+    var = sp.Symbol(result["variable"])
+    lower, upper = (sp.sympify(b) for b in result["bounds"])
+    numeric = sp.Integral(expr, (var, lower, upper)).evalf(20)
+    value = sp.sympify(result["solution"])
+    if not numeric.is_number or not value.is_number:
+        return None
+    ok = abs(complex(numeric) - complex(sp.N(value, 20))) < 1e-6 * max(1.0, abs(complex(numeric)))
+    issues = [] if ok else [f"Numeric quadrature gives {numeric}, not {value}"]
+    return ["Compared with numeric quadrature"], issues
+
+
+def check_derivative(result):
+    """Compare with central finite differences at random sample points"""
+    if result.get("order", 1) != 1:
+        return None
+    expr = sp.sympify(result["expression"])
+    var = sp.Symbol(result["variable"])
+    if expr.free_symbols - {var}:
+        return None
+    derivative = sp.sympify(result["solution"])
+
+    f = sp.lambdify(var, expr, "math")
+    df = sp.lambdify(var, derivative, "math")
+    rng = random.Random(0)
+    h = 1e-6
+    checked = 0
+    for _ in range(10):
+        x0 = rng.uniform(0.1, 2.0)
+        try:
+            estimate = (f(x0 + h) - f(x0 - h)) / (2 * h)
+            exact = df(x0)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            continue
+        if not math.isclose(estimate, exact, rel_tol=1e-4, abs_tol=1e-4):
+            return ["Compared with finite differences"], [f"Derivative disagrees with finite differences at {var} = {x0:.3f}"]
+        checked += 1
+        if checked == 3:
+            break
+    if not checked:
+        return None
+    return [f"Compared with finite differences at {checked} points"], []
+
+
+def check_inverse(result):
+    """A times its inverse must be the identity"""
+    if "determinant" not in result or result["determinant"] == "0":
+        return None
+    matrix = sp.Matrix(sp.sympify(result["matrix"]))
+    inverse = sp.Matrix(sp.sympify(result["solution"]))
+    ok = sp.simplify(matrix * inverse - sp.eye(matrix.rows)) == sp.zeros(matrix.rows)
+    return ["Multiplied A by A⁻¹"], [] if ok else ["A × A⁻¹ is not the identity"]
+
+
+def check_eigenvalues(result):
+    """Every eigenvalue must be a root of det(A - λI)"""
+    if result.get("engine") != "sympy":
+        return None
+    matrix = sp.Matrix(sp.sympify(result["matrix"]))
+    issues = []
+    for value in (sp.sympify(v) for v in result["eigenvalues"]):
+        if not _is_zero((matrix - value * sp.eye(matrix.rows)).det()):
+            issues.append(f"det(A - ({value})I) is not zero")
+    return ["Substituted each eigenvalue into det(A - λI)"], issues
+
+
+def check_combinatorics(result):
+    """Recompute with the standard library"""
+    n, r = result["n"], result["r"]
+    expected = math.comb(n, r) if result["method"] == "nCr" else math.perm(n, r)
+    ok = int(result["solution"]) == expected
+    return ["Recomputed with math.comb / math.perm"], [] if ok else [f"Expected {expected}"]
+
+
+CHECKS = {
+    "equation": check_equations,
+    "system": check_equations,
+    "integral": check_integral,
+    "definite_integral": check_definite_integral,
+    "derivative": check_derivative,
+    "inverse": check_inverse,
+    "eigenvalues": check_eigenvalues,
+    "nCr": check_combinatorics,
+    "nPr": check_combinatorics,
+}
+
+
+def _compact(text):
+    """Notation-insensitive form for text matching: no spaces, ^ powers, implicit products"""
+    text = re.sub(r"\s+", "", normalize_math_text(str(text)))
+    return text.replace("**", "^").replace("*", "")
+
+
+def states_answer(solution, sympy_result):
+    """True when a solution's text states the SymPy answer (every root, or the solution itself)
+
+    Plain text matching: the solution may come from an API client and is never parsed.
+    """
+    text = _compact(solution)
+
+    def mentions(answer):
+        return re.search(re.escape(_compact(answer)) + r"(?!\d|\.\d)", text) is not None
+
+    if sympy_result.get("roots"):
+        return all(mentions(f"{k}={v}") for root in sympy_result["roots"] for k, v in root.items())
+    answer = sympy_result.get("solution")
+    return bool(answer) and mentions(answer)
+
+
+def verify_symbolically(sympy_result):
+    """Check a SymPy result against the equations or expressions it was solved from
+
+    Returns a verifier-shaped dict, or None when the result can't be checked
+    this way and the LLM verifier should decide instead.
+    """
+    if not sympy_result or not sympy_result.get("success"):
+        return None
+    check = CHECKS.get(sympy_result.get("method"))
+    if check is None:
+        return None
+
+    try:
+        outcome = check(sympy_result)
+    except Exception as e:
+        print(f"⚠️ Symbolic verification error: {e}")
+        return None
+    if outcome is None:
+        return None
+
+    checks, issues = outcome
+    return {
+        "is_correct": not issues,
+        "confidence": PASSED_CONFIDENCE if not issues else 0.0,
+        "issues": issues,
+        "needs_human_review": bool(issues),
+        "method": "symbolic",
+        "checks": checks
+    }
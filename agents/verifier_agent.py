@@ -1,9 +1,16 @@
-from langchain_groq import ChatGroq
-from langchain.prompts import ChatPromptTemplate
+import asyncio
+from langchain_core.prompts import ChatPromptTemplate
+from llm.provider import get_chat_model
+from utils.deadline import timeout_for
+from utils.llm_output import extract_json
+from utils.tokens import record_usage
+from utils.tracing import span
 
 class VerifierAgent:
-    def __init__(self):
-        self.llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
+    def __init__(self, sandbox=None):
+        self.llm = get_chat_model(temperature=0)
+        # Optional SympySandbox for running the symbolic checks out of process
+        self.sandbox = sandbox
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a math solution verifier. Check the solution for:
@@ -22,25 +29,79 @@ Respond with JSON:
             ("user", "Problem: {problem}\n\nSolution: {solution}\n\nVerify this solution.")
         ])
     
-    def verify(self, problem, solution):
-        """Verify solution correctness"""
+    def verify(self, problem, solution, sympy_result=None):
+        """Verify solution correctness
+        
+        Checkable SymPy results (equation roots, antiderivatives, inverses, ...)
+        get a symbolic verdict; everything else goes to the LLM.
+        """
+        symbolic = self.verify_symbolic(sympy_result)
+        if symbolic is not None:
+            return symbolic
+        
         chain = self.prompt | self.llm
-        response = chain.invoke({
-            "problem": problem,
-            "solution": solution
-        })
+        try:
+            with span("llm.verify"):
+                response = chain.invoke({
+                    "problem": problem,
+                    "solution": solution
+                })
+                record_usage("verify", response)
+        except Exception as e:
+            print(f"⚠️ Verifier unavailable: {e}")
+            return self._unverified(f"Verifier unavailable: {e}")
         
-        import json
+        return self._parse_verdict(response.content)
+    
+    async def averify(self, problem, solution, sympy_result=None):
+        """Async verify() - the symbolic checks run on a worker thread"""
+        symbolic = await asyncio.to_thread(self.verify_symbolic, sympy_result)
+        if symbolic is not None:
+            return symbolic
+        
+        chain = self.prompt | self.llm
         try:
-            content = response.content
-            if "```json" in content:
-                content = content.split("```json").split("```")[1]
-            result = json.loads(content.strip())
+            with span("llm.verify"):
+                response = await chain.ainvoke({
+                    "problem": problem,
+                    "solution": solution
+                })
+                record_usage("verify", response)
+        except Exception as e:
+            print(f"⚠️ Verifier unavailable: {e}")
+            return self._unverified(f"Verifier unavailable: {e}")
+        
+        return self._parse_verdict(response.content)
+    
+    def _parse_verdict(self, content):
+        try:
+            result = extract_json(content)
+            result["method"] = "llm"
             return result
-        except:
-            return {
-                "is_correct": True,
-                "confidence": 0.7,
-                "issues": [],
-                "needs_human_review": False
-            }
+        except Exception as e:
+            print(f"⚠️ Verifier parse error: {e}")
+            # An unparseable verdict is not a verdict - flag it for review
+            return self._unverified("Verifier response could not be parsed")
+    
+    def _unverified(self, issue):
+        return {
+            "is_correct": False,
+            "confidence": 0.0,
+            "issues": [issue],
+            "needs_human_review": True,
+            "method": "llm"
+        }
+    
+    def verify_symbolic(self, sympy_result):
+        """Symbolic/numeric verdict, or None when the result isn't checkable"""
+        if not sympy_result or not sympy_result.get("success"):
+            return None
+        with span("verify.symbolic"):
+            if self.sandbox is not None:
+                verdict = self.sandbox.run(
+                    "verify_symbolically", sympy_result, timeout=timeout_for(self.sandbox.timeout)
+                )
+                # Sandbox failures (timeouts, crashes) come back as error dicts
+                return verdict if verdict and "is_correct" in verdict else None
+            from agents.symbolic_verifier import verify_symbolically
+            return verify_symbolically(sympy_result)
@@ -0,0 +1,191 @@
+"""
+Async HTTP API around the agent pipeline
+
+One process holds one set of models (build_components); every request is a
+coroutine on the event loop. LLM calls are awaited (ainvoke), while SymPy,
+retrieval and memory lookups run on the default worker-thread pool, so many
+concurrent clients share a handful of threads instead of one each.
+
+Run:
+    uvicorn api.server:app --host 0.0.0.0 --port 8000
+    python -m api.server --port 8000
+
+Environment:
+    MATH_MENTOR_API_TIMEOUT          seconds per request before a 504 (default 60)
+    MATH_MENTOR_API_MAX_CONCURRENCY  requests worked on at once; the rest wait (default 64)
+"""
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Optional, Union
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from agents.parser_agent import normalize_parsed
+from agents.pipeline import PIPELINE_MODES, MathPipeline, build_components
+from agents.symbolic_verifier import states_answer
+from utils.deadline import resolve_budget
+from utils.tokens import track_usage
+from utils.tracing import tracer
+
+REQUEST_TIMEOUT = float(os.getenv("MATH_MENTOR_API_TIMEOUT", "60"))
+MAX_CONCURRENCY = int(os.getenv("MATH_MENTOR_API_MAX_CONCURRENCY", "64"))
+
+
+class ParseRequest(BaseModel):
+    input: str
+
+
+class SolveRequest(BaseModel):
+    problem: str
+    topic: str = ""
+    variables: list = []
+    use_llm: Optional[bool] = None
+
+
+class VerifyRequest(BaseModel):
+    problem: str
+    solution: str
+    topic: str = ""
+
+
+class ExplainRequest(BaseModel):
+    problem: str
+    solution: str
+
+
+class PipelineRequest(BaseModel):
+    input: str
+    mode: str = "staged"
+    fused_review: bool = True
+    # Seconds, or "fast" / "thorough"; never longer than the request timeout
+    budget: Union[float, str, None] = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    print("🔧 Loading models...")
+    components = await asyncio.to_thread(build_components, False)
+    app.state.components = components
+    app.state.pipeline = MathPipeline(components)
+    app.state.slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    print("✅ Math Mentor API ready")
+    yield
+    sandbox = components["solver"].sandbox
+    if sandbox is not None:
+        sandbox.shutdown()
+
+
+app = FastAPI(title="Math Mentor API", lifespan=lifespan)
+
+
+async def run_limited(stage, coro):
+    """Await an agent call under the concurrency cap, the request timeout and a trace"""
+    async with app.state.slots:
+        try:
+            with track_usage() as usage, tracer.trace(f"api.{stage}") as root:
+                result = await asyncio.wait_for(coro, REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"{stage} timed out after {REQUEST_TIMEOUT:g}s")
+        except Exception as e:
+            print(f"❌ API {stage} error: {e}")
+            raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {e}")
+    return result, usage, root.trace_id
+
+
+@app.post("/parse")
+async def parse(request: ParseRequest):
+    parsed, usage, trace_id = await run_limited("parse", app.state.components["parser"].aparse(request.input))
+    return {"parsed": parsed, "usage": usage, "trace_id": trace_id}
+
+
+@app.post("/solve")
+async def solve(request: SolveRequest):
+    parsed = normalize_parsed({
+        "problem_text": request.problem,
+        "topic": request.topic,
+        "variables": request.variables
+    }, request.problem)
+    solution, usage, trace_id = await run_limited(
+        "solve", app.state.components["solver"].asolve(parsed, use_llm=request.use_llm)
+    )
+    return {"parsed": parsed, "solution": solution, "usage": usage, "trace_id": trace_id}
+
+
+@app.post("/verify")
+async def verify(request: VerifyRequest):
+    verification, usage, trace_id = await run_limited("verify", verify_solution(request))
+    return {"verification": verification, "usage": usage, "trace_id": trace_id}
+
+
+async def verify_solution(request):
+    """Verify a client's solution, checking it symbolically only when it states our own SymPy answer
+
+    The SymPy result is always recomputed here (in the sandbox): results sent by
+    a client would be sympified, and could claim any answer was checked.
+    """
+    components = app.state.components
+    topic = normalize_parsed({"problem_text": request.problem, "topic": request.topic}, request.problem)["topic"]
+    sympy_result = await asyncio.to_thread(components["solver"].try_sympy_solve, request.problem, [], topic)
+    if not sympy_result.get("success") or not states_answer(request.solution, sympy_result):
+        sympy_result = None
+    return await components["verifier"].averify(request.problem, request.solution, sympy_result)
+
+
+@app.post("/explain")
+async def explain(request: ExplainRequest):
+    explanation, usage, trace_id = await run_limited(
+        "explain", app.state.components["explainer"].aexplain(request.problem, request.solution)
+    )
+    return {"explanation": explanation, "usage": usage, "trace_id": trace_id}
+
+
+@app.post("/pipeline")
+async def pipeline(request: PipelineRequest):
+    if request.mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {', '.join(PIPELINE_MODES)}")
+    try:
+        budget = resolve_budget(request.budget)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    # Leave headroom so a budgeted run returns its partial result before the hard timeout;
+    # without a budget the run is only bounded by that timeout
+    if budget is not None:
+        budget = min(budget, REQUEST_TIMEOUT * 0.9)
+
+    # MathPipeline.arun opens its own trace and usage tracking
+    async with app.state.slots:
+        try:
+            return await asyncio.wait_for(
+                app.state.pipeline.arun(request.input, request.mode, request.fused_review, budget), REQUEST_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"pipeline timed out after {REQUEST_TIMEOUT:g}s")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracer.render_prometheus()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Math Mentor HTTP API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    # A single worker process: the models are loaded once and shared by every request
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
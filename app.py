@@ -1,15 +1,15 @@
 import streamlit as st
-from multimodal.ocr_processor import OCRProcessor
-from multimodal.audio_processor import AudioProcessor
-from rag.vectorstore.vectorstore import RAGPipeline
-from agents.parser_agent import ParserAgent
-from agents.solver_agent import SolverAgent
-from agents.verifier_agent import VerifierAgent
-from agents.explainer_agent import ExplainerAgent
-from memory.store import MemoryStore
-from PIL import Image
+from rag.vectorstore.vectorstore import RAGPipeline, score_label
+from agents.pipeline import MathPipeline, build_components
+from multimodal.worksheet import iter_pages
+from utils.tracing import tracer, start_metrics_server
+from PIL import Image, ImageOps
+import numpy as np
+import hashlib
 import os
+from collections import OrderedDict
 from io import BytesIO
+import time
 
 
 # Page config
@@ -20,6 +20,11 @@ st.set_page_config(
 )
 
 
+# Header first: the page shows up while models are still loading
+st.title("🧮 Math Mentor - AI-Powered Math Solver")
+st.markdown("Upload an image, record audio, or type your JEE-style math problem")
+
+
 # Auto-setup on first run
 def auto_setup():
     """Auto setup for Streamlit Cloud or first-time local run"""
@@ -84,24 +89,188 @@ auto_setup()
 
 
 # Initialize components
-@st.cache_resource
+@st.cache_resource(show_spinner="🔧 Loading models...")
 def init_components():
-    rag = RAGPipeline()
-    rag.load_vectorstore()
-    
-    return {
-        "ocr": OCRProcessor(),
-        "audio": AudioProcessor(),
-        "rag": rag,
-        "parser": ParserAgent(),
-        "solver": SolverAgent(rag),
-        "verifier": VerifierAgent(),
-        "explainer": ExplainerAgent(),
-        "memory": MemoryStore()
-    }
+    # Optional Prometheus scrape endpoint for the stage histograms
+    if os.getenv("MATH_MENTOR_METRICS_PORT"):
+        start_metrics_server(os.getenv("MATH_MENTOR_METRICS_PORT"))
+    return build_components()
 
 
 components = init_components()
+pipeline = MathPipeline(components)
+
+# Pipeline results kept per session, most recent last
+MAX_CACHED_RESULTS = 5
+
+
+def result_key(raw_input, mode, budget=None):
+    """Session cache key for a problem: the input text, pipeline mode and latency budget"""
+    return hashlib.sha256(f"{mode}\n{budget}\n{raw_input.strip()}".encode("utf-8")).hexdigest()
+
+
+def save_feedback(key, result, raw_input, input_type, feedback, user_comment=None):
+    """Store the interaction once per result, however many times the buttons are clicked"""
+    if key not in st.session_state.feedback_saved:
+        interaction = {
+            "original_input": raw_input,
+            "input_type": input_type,
+            "parsed_problem": result["parsed"],
+            "solution": result["solution"].get("llm_solution"),
+            "verification": result["verification"],
+            "feedback": feedback
+        }
+        if user_comment is not None:
+            interaction["user_comment"] = user_comment
+        st.session_state.feedback_saved[key] = components["memory"].store_interaction(interaction)
+    return st.session_state.feedback_saved[key]
+
+
+def run_inference(kind, payload, job_key, label):
+    """Run an OCR/ASR job, showing its queue position and status until it finishes
+
+    The job id is kept in session state, so a rerun while waiting resumes
+    polling the same job instead of queueing a second one. Returns None when
+    the queue is full.
+    """
+    from multimodal.workers import QueueFull
+
+    pool = components["inference"]
+    job_id = st.session_state.inference_jobs.get(job_key)
+    if job_id is None or pool.status(job_id)["status"] == "unknown":
+        try:
+            job_id = pool.submit(kind, payload)
+        except QueueFull:
+            st.warning("⏳ The server is busy with other uploads, please try again in a moment.")
+            return None
+        st.session_state.inference_jobs[job_key] = job_id
+
+    placeholder = st.empty()
+    while True:
+        status = pool.status(job_id)
+        if status["status"] == "queued":
+            placeholder.info(f"⏳ {label} - waiting in queue (position {status['position']})")
+        elif status["status"] == "running":
+            placeholder.info(f"🔄 {label}... {time.time() - status['started']:.0f}s")
+        else:
+            break
+        time.sleep(0.3)
+
+    placeholder.empty()
+    st.session_state.inference_jobs.pop(job_key, None)
+    return pool.result(job_id, timeout=5)
+
+
+def problem_label(problem):
+    """One-line label for a problem read from a worksheet"""
+    number = f"Q{problem['number']}" if problem["number"] else "Problem"
+    text = problem["text"] if len(problem["text"]) <= 60 else problem["text"][:57] + "..."
+    return f"{problem['source']} p.{problem['page']} · {number}: {text}"
+
+
+def render_result(result, key, raw_input, input_type):
+    """Show a pipeline result; only reads from `result`, never calls the models"""
+    parsed = result["parsed"]
+    solution = result["solution"]
+    verification = result["verification"]
+    explanation = result["explanation"]
+    
+    # Step 1: Parse
+    st.write("### 🔍 Step 1: Parsing Problem")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.json(parsed, expanded=False)
+    with col2:
+        topic = parsed.get('topic', 'algebra')
+        st.info(f"**Topic**: {topic.title() if topic else 'Unknown'}")
+        if parsed.get('needs_clarification'):
+            st.warning(f"⚠️ {parsed.get('clarification_reason', 'Clarification needed')}")
+    
+    # Similar problems found in memory
+    similar_problems = result["similar_problems"]
+    
+    if similar_problems:
+        with st.expander("💡 Similar Problems Found in Memory"):
+            for sp in similar_problems:
+                problem_text = sp.get('parsed_problem', {}).get('problem_text', 'Unknown problem')
+                st.write(f"- {problem_text}")
+    
+    # Step 2: Solve
+    st.write("### 🧮 Step 2: Solving")
+
+    if result.get("cached"):
+        st.caption("🔥 Served from the result cache - this problem was solved and checked before")
+    if solution.get("solved_by") == "sympy":
+        st.success(f"⚡ Solved exactly with SymPy ({solution['sympy_result']['method']}) - no LLM call needed")
+
+    # Show retrieved context
+    with st.expander("📚 Retrieved Knowledge"):
+        context_stats = solution.get("context_stats")
+        if context_stats:
+            st.caption(
+                f"Context: {context_stats['tokens_used']} tokens from {context_stats['selected']}/"
+                f"{context_stats['candidates']} chunks ({context_stats['tokens_saved']} tokens saved)"
+            )
+        if solution.get("retrieved_context"):
+            for i, ctx in enumerate(solution["retrieved_context"]):
+                st.markdown(f"**Source {i+1}** (Score: {score_label(ctx)})")
+                st.text(ctx.get("content", "No content"))
+                st.divider()
+        else:
+            st.info("No relevant context retrieved")
+    
+    # Step 3: Verify
+    st.write("### ✅ Step 3: Verification")
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        if verification.get("is_correct"):
+            st.success("✅ Solution Verified")
+        else:
+            st.error("❌ Issues Found")
+        st.metric("Confidence", f"{verification.get('confidence', 0)*100:.0f}%")
+        if verification.get("method") == "symbolic":
+            st.caption("🧮 Checked symbolically by substitution")
+    
+    with col2:
+        if verification.get("issues"):
+            for issue in verification["issues"]:
+                st.warning(f"⚠️ {issue}")
+    
+    # Step 4: Explain
+    st.write("### 📖 Step 4: Explanation")
+    for skipped in result.get("skipped", []):
+        st.caption(f"⏭️ Skipped {skipped['stage']}: {skipped['reason']}")
+    st.markdown(explanation)
+    
+    # SymPy result if available
+    if (solution.get("sympy_result") or {}).get("success"):
+        st.code(f"SymPy Solution: {solution['sympy_result']['solution']}", language="python")
+    
+    # Feedback section
+    st.write("### 💬 Feedback")
+    if key in st.session_state.feedback_saved:
+        st.success(f"✅ Feedback saved! (ID: {st.session_state.feedback_saved[key][:8]})")
+        return
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if st.button("✅ Correct", use_container_width=True, key="correct_btn"):
+            save_feedback(key, result, raw_input, input_type, "correct")
+            st.rerun()
+    
+    with col2:
+        if st.button("❌ Incorrect", use_container_width=True, key="incorrect_btn"):
+            st.session_state["show_feedback_form"] = key
+    
+    if st.session_state.get("show_feedback_form") == key:
+        user_comment = st.text_input("What's wrong? (optional)")
+        if st.button("Submit Feedback", key="submit_feedback_btn"):
+            save_feedback(key, result, raw_input, input_type, "incorrect", user_comment)
+            st.session_state["show_feedback_form"] = None
+            st.rerun()
 
 
 # Initialize session state
@@ -111,11 +280,16 @@ if 'audio_processed' not in st.session_state:
     st.session_state.audio_processed = False
 if 'current_audio_file' not in st.session_state:
     st.session_state.current_audio_file = None
-
-
-# Header
-st.title("🧮 Math Mentor - AI-Powered Math Solver")
-st.markdown("Upload an image, record audio, or type your JEE-style math problem")
+if 'results' not in st.session_state:
+    st.session_state.results = OrderedDict()
+if 'feedback_saved' not in st.session_state:
+    st.session_state.feedback_saved = {}
+if 'ocr_results' not in st.session_state:
+    st.session_state.ocr_results = {}
+if 'inference_jobs' not in st.session_state:
+    st.session_state.inference_jobs = {}
+if 'worksheets' not in st.session_state:
+    st.session_state.worksheets = {}
 
 
 # Input mode selector
@@ -142,21 +316,37 @@ if input_mode == "📝 Text":
 
 
 elif input_mode == "📷 Image":
-    uploaded_file = st.file_uploader(
-        "Upload image of math problem",
-        type=["jpg", "jpeg", "png"]
+    uploaded_files = st.file_uploader(
+        "Upload image of math problem, or several images / a PDF worksheet",
+        type=["jpg", "jpeg", "png", "pdf"],
+        accept_multiple_files=True
     )
+    # One image keeps the single-problem flow; several files or a PDF are read as a worksheet
+    single_image = len(uploaded_files) == 1 and not uploaded_files[0].name.lower().endswith(".pdf")
+    uploaded_file = uploaded_files[0] if single_image else None
     
     if uploaded_file:
-        image = Image.open(uploaded_file)
+        # Upright as the camera saw it (phones store photos sideways plus an EXIF tag)
+        image = ImageOps.exif_transpose(Image.open(uploaded_file))
         col1, col2 = st.columns(2)
         
         with col1:
             st.image(image, caption="Uploaded Image", use_column_width=True)
         
         with col2:
-            with st.spinner("Extracting text from image..."):
-                raw_input, confidence = components["ocr"].process_image(image)
+            # OCR once per uploaded image, not on every rerun
+            image_key = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+            if image_key not in st.session_state.ocr_results:
+                if "inference" in components:
+                    ocr_result = run_inference("ocr", np.array(image), image_key, "Extracting text from image")
+                else:
+                    with st.spinner("Extracting text from image..."):
+                        # A fresh, undecoded copy: preprocessing can then let libjpeg decode a large
+                        # photo at reduced scale (the displayed image is already decoded and format-less)
+                        ocr_result = components["ocr"].process_image(Image.open(BytesIO(uploaded_file.getvalue())))
+                if ocr_result is not None:
+                    st.session_state.ocr_results = {image_key: tuple(ocr_result)}
+            raw_input, confidence = st.session_state.ocr_results.get(image_key, ("", 0.0))
                 
             st.metric("OCR Confidence", f"{confidence*100:.1f}%")
             
@@ -170,6 +360,48 @@ elif input_mode == "📷 Image":
             )
         
         input_type = "image"
+    
+    elif uploaded_files:
+        worksheet_key = hashlib.sha256(b"".join(f.getvalue() for f in uploaded_files)).hexdigest()
+        if worksheet_key not in st.session_state.worksheets:
+            # Pages are rendered and read a batch at a time; show problems as they arrive
+            problems = []
+            progress = st.empty()
+            listing = st.empty()
+            try:
+                for problem in components["ocr"].iter_problems(iter_pages(uploaded_files)):
+                    problems.append(problem)
+                    progress.info(f"🔄 Reading worksheet... page {problem['page']} of {problem['source']}")
+                    with listing.container():
+                        for found in problems:
+                            st.markdown(f"**{problem_label(found)}** ({found['confidence']*100:.0f}%)")
+            except Exception as e:
+                st.error(f"❌ Worksheet OCR stopped: {e}")
+            progress.empty()
+            listing.empty()
+            st.session_state.worksheets = {worksheet_key: problems}
+        problems = st.session_state.worksheets[worksheet_key]
+        
+        if not problems:
+            st.warning("⚠️ No problems found in the upload.")
+        else:
+            choice = st.selectbox(
+                f"📄 {len(problems)} problems found - pick one to solve:",
+                range(len(problems)),
+                format_func=lambda i: problem_label(problems[i])
+            )
+            confidence = problems[choice]["confidence"]
+            st.metric("OCR Confidence", f"{confidence*100:.1f}%")
+            if confidence < 0.7:
+                st.warning("⚠️ Low confidence! Please verify extracted text.")
+            raw_input = st.text_area(
+                "Extracted Text (editable):",
+                value=problems[choice]["text"],
+                height=100,
+                key=f"worksheet_text_{worksheet_key}_{choice}"
+            )
+        
+        input_type = "image"
 
 
 elif input_mode == "🎤 Audio":
@@ -217,16 +449,22 @@ elif input_mode == "🎤 Audio":
         if st.session_state.current_audio_file != audio_file_name or not st.session_state.audio_processed:
             st.session_state.current_audio_file = audio_file_name
             
-            with st.spinner("🔄 Transcribing audio... This may take a moment"):
-                try:
-                    transcribed = components["audio"].process_audio(audio_data)
+            try:
+                if "inference" in components:
+                    transcribed = run_inference(
+                        "asr", audio_data.getvalue(), f"audio:{audio_file_name}", "Transcribing audio"
+                    )
+                else:
+                    with st.spinner("🔄 Transcribing audio... This may take a moment"):
+                        transcribed = components["audio"].process_audio(audio_data)
+                if transcribed is not None:
                     st.session_state.transcribed_text = transcribed
                     st.session_state.audio_processed = True
                     st.success("✅ Transcription complete!")
-                except Exception as e:
-                    st.error(f"❌ Transcription failed: {str(e)}")
-                    st.exception(e)
-                    st.session_state.transcribed_text = None
+            except Exception as e:
+                st.error(f"❌ Transcription failed: {str(e)}")
+                st.exception(e)
+                st.session_state.transcribed_text = None
     
     # Show editable text area if transcription exists
     if st.session_state.transcribed_text:
@@ -256,132 +494,95 @@ elif input_mode == "🎤 Audio":
 # Solve button - show if there's input
 if raw_input:
     st.divider()
+    fused_mode = st.toggle(
+        "⚡ Fast mode (fewer LLM calls)",
+        help="Parse + solve in one call and verify + explain in another, instead of four separate calls"
+    )
+    quick = st.toggle(
+        "⏱️ Quick answer",
+        help="Answer within a few seconds, skipping the explanation or LLM check when time runs short"
+    )
+    mode = "fused" if fused_mode else "staged"
+    budget = "fast" if quick else None
+    key = result_key(raw_input, mode, budget)
+    
     if st.button("🚀 Solve Problem", type="primary", use_container_width=True):
-        with st.spinner("Processing your problem..."):
-            
-            try:
-                # Step 1: Parse
-                st.write("### 🔍 Step 1: Parsing Problem")
-                parsed = components["parser"].parse(raw_input)
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.json(parsed, expanded=False)
-                with col2:
-                    topic = parsed.get('topic', 'algebra')
-                    st.info(f"**Topic**: {topic.title() if topic else 'Unknown'}")
-                    if parsed.get('needs_clarification'):
-                        st.warning(f"⚠️ {parsed.get('clarification_reason', 'Clarification needed')}")
-                
-                # Check for similar problems in memory
-                similar_problems = components["memory"].get_similar_problems(
-                    parsed.get("problem_text", raw_input)
-                )
-                
-                if similar_problems:
-                    with st.expander("💡 Similar Problems Found in Memory"):
-                        for sp in similar_problems:
-                            problem_text = sp.get('parsed_problem', {}).get('problem_text', 'Unknown problem')
-                            st.write(f"- {problem_text}")
-                
-                # Step 2: Solve
-                st.write("### 🧮 Step 2: Solving")
-                solution = components["solver"].solve(parsed)
-                
-                # Show retrieved context
-                with st.expander("📚 Retrieved Knowledge"):
-                    if solution.get("retrieved_context"):
-                        for i, ctx in enumerate(solution["retrieved_context"]):
-                            st.markdown(f"**Source {i+1}** (Score: {ctx.get('score', 0):.3f})")
-                            st.text(ctx.get("content", "No content"))
-                            st.divider()
-                    else:
-                        st.info("No relevant context retrieved")
-                
-                # Step 3: Verify
-                st.write("### ✅ Step 3: Verification")
-                verification = components["verifier"].verify(
-                    parsed.get("problem_text", raw_input),
-                    solution.get("llm_solution", "No solution generated")
-                )
-                
-                col1, col2 = st.columns([1, 3])
-                with col1:
-                    if verification.get("is_correct"):
-                        st.success("✅ Solution Verified")
-                    else:
-                        st.error("❌ Issues Found")
-                    st.metric("Confidence", f"{verification.get('confidence', 0)*100:.0f}%")
-                
-                with col2:
-                    if verification.get("issues"):
-                        for issue in verification["issues"]:
-                            st.warning(f"⚠️ {issue}")
-                
-                # Step 4: Explain
-                st.write("### 📖 Step 4: Explanation")
-                explanation = components["explainer"].explain(
-                    parsed.get("problem_text", raw_input),
-                    solution.get("llm_solution", "No solution available")
-                )
-                
-                st.markdown(explanation)
-                
-                # SymPy result if available
-                if solution.get("sympy_result", {}).get("success"):
-                    st.code(f"SymPy Solution: {solution['sympy_result']['solution']}", language="python")
-                
-                # Feedback section
-                st.write("### 💬 Feedback")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    if st.button("✅ Correct", use_container_width=True, key="correct_btn"):
-                        memory_id = components["memory"].store_interaction({
-                            "original_input": raw_input,
-                            "input_type": input_type,
-                            "parsed_problem": parsed,
-                            "solution": solution.get("llm_solution"),
-                            "verification": verification,
-                            "feedback": "correct"
-                        })
-                        st.success(f"✅ Feedback saved! (ID: {memory_id[:8]})")
-                
-                with col2:
-                    if st.button("❌ Incorrect", use_container_width=True, key="incorrect_btn"):
-                        st.session_state["show_feedback_form"] = True
-                
-                if st.session_state.get("show_feedback_form"):
-                    user_comment = st.text_input("What's wrong? (optional)")
-                    if st.button("Submit Feedback", key="submit_feedback_btn"):
-                        memory_id = components["memory"].store_interaction({
-                            "original_input": raw_input,
-                            "input_type": input_type,
-                            "parsed_problem": parsed,
-                            "solution": solution.get("llm_solution"),
-                            "verification": verification,
-                            "feedback": "incorrect",
-                            "user_comment": user_comment
-                        })
-                        st.success(f"✅ Feedback saved! (ID: {memory_id[:8]})")
-                        st.session_state["show_feedback_form"] = False
-            
-            except Exception as e:
-                st.error(f"❌ An error occurred: {str(e)}")
-                st.exception(e)
+        if key in st.session_state.results:
+            # Same input already solved this session - show it again without any model calls
+            st.session_state.results.move_to_end(key)
+        else:
+            with st.spinner("Processing your problem..."):
+                try:
+                    st.session_state.results[key] = pipeline.run(raw_input, mode=mode, budget=budget)
+                    while len(st.session_state.results) > MAX_CACHED_RESULTS:
+                        st.session_state.results.popitem(last=False)
+                except Exception as e:
+                    st.error(f"❌ An error occurred: {str(e)}")
+                    st.exception(e)
+    
+    # Rendered from the session cache, so feedback clicks and expanders never re-solve
+    if key in st.session_state.results:
+        result = st.session_state.results[key]
+        if result.get("profile") and not result.get("render_profiled"):
+            # The run was profiled: profile its first render too, under the same request id
+            result["render_profiled"] = True
+            with components["profiler"].profile(result["trace_id"], label="render"):
+                render_result(result, key, raw_input, input_type)
+        else:
+            render_result(result, key, raw_input, input_type)
 
 
 # Sidebar
 with st.sidebar:
     st.header("📊 System Stats")
     
-    # Reload memories to get current count
-    try:
-        current_count = len(components["memory"].load_memories())
-        st.metric("Total Problems Solved", current_count)
-    except Exception as e:
-        st.metric("Total Problems Solved", 0)
-        st.caption(f"⚠️ Error loading memory: {str(e)}")
+    # Running aggregates kept by the store - no reload of the memories per rerun
+    memory_stats = components["memory"].stats()
+    st.metric("Total Problems Solved", memory_stats["total"], delta=f"{memory_stats['last_hour']} this hour")
+    pass_rate = memory_stats["verification"]["pass_rate"]
+    if pass_rate is not None:
+        st.caption(f"✅ Verifier pass rate: {pass_rate*100:.0f}% · {memory_stats['last_24h']} solved in the last 24h")
+    if memory_stats["by_topic"]:
+        topics = sorted(memory_stats["by_topic"].items(), key=lambda item: -item[1])
+        st.caption("📚 " + " · ".join(f"{topic}: {n}" for topic, n in topics[:5]))
+    
+    st.divider()
+    
+    st.header("⏱️ Performance")
+    stage_stats = tracer.snapshot()
+    if stage_stats:
+        st.dataframe(
+            [
+                {
+                    "stage": stage,
+                    "n": stats["count"],
+                    "p50 ms": round(stats["p50"] * 1000),
+                    "p95 ms": round(stats["p95"] * 1000),
+                    "p99 ms": round(stats["p99"] * 1000)
+                }
+                for stage, stats in stage_stats.items()
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.caption("No requests timed yet")
+    
+    suppressed = sum(n for event, n in tracer.counts().items() if event.startswith("singleflight.") and "suppressed" in event)
+    if suppressed:
+        st.caption(f"♻️ {suppressed} duplicate runs shared with an identical in-flight problem")
+    if "profiler" in components:
+        st.caption(f"🔬 Profiling {components['profiler'].percent:g}% of runs into `{components['profiler'].directory}`")
+    cache_hits = tracer.counts().get("result_cache.hits", 0)
+    if cache_hits:
+        st.caption(f"🔥 {cache_hits} problems answered from the result cache")
+    
+    if "inference" in components:
+        load = components["inference"].snapshot()
+        st.caption(
+            f"🖼️ OCR queue: {load['ocr']['queued']} waiting, {load['ocr']['running']} running · "
+            f"🎤 ASR queue: {load['asr']['queued']} waiting, {load['asr']['running']} running"
+        )
     
     st.divider()
     
@@ -411,8 +612,11 @@ with st.sidebar:
     # Show storage location
     with st.expander("🗂️ Storage Info"):
         st.caption(f"**Memory File:** `{components['memory'].storage_path}`")
-        if os.path.exists(components['memory'].storage_path):
-            file_size = os.path.getsize(components['memory'].storage_path)
-            st.caption(f"**File Size:** {file_size} bytes")
+        if memory_stats["bytes"]:
+            st.caption(f"**File Size:** {memory_stats['bytes']} bytes ({memory_stats['hot']} recent memories)")
         else:
             st.caption("**Status:** Not created yet")
+        archive = memory_stats.get("archive") or {}
+        if archive.get("segments"):
+            st.caption(f"**Archive:** {archive['count']} memories in {archive['segments']} segments, "
+                       f"{archive['bytes']} bytes, since {archive['first'][:10]}")
@@ -0,0 +1,232 @@
+"""
+Headless batch solver for worksheets and past papers
+
+Reads problems from JSONL ({"id": ..., "problem": ...} per line) or CSV (a
+"problem" column, optional "id"), runs each through the agent pipeline and
+appends one JSON line per problem to the output as soon as it finishes.
+
+The output file doubles as the checkpoint: rerunning the same command skips
+every id that already has a successful result, so an interrupted run resumes
+where it stopped. Failed problems are retried on the next run.
+
+Usage:
+    python batch_solve.py worksheet.jsonl -o results.jsonl
+    python batch_solve.py paper.csv -o results.jsonl --concurrency 8 --rate 30
+    python batch_solve.py paper.csv -o results.jsonl --mode fused --column question
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.deadline import BUDGETS
+from utils.rate_limit import TokenBucket
+
+
+def read_problems(path, column="problem"):
+    """[(id, problem_text)] from a JSONL or CSV file"""
+    problems = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for i, row in enumerate(rows):
+            text = (row.get(column) or "").strip()
+            if text:
+                problem_id = row.get("id")
+                problems.append((str(problem_id if problem_id not in (None, "") else i), text))
+    return problems
+
+
+def parse_budget(value):
+    """--budget as seconds ("20", ".5") or a BUDGETS name"""
+    if value in BUDGETS:
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected seconds or one of {', '.join(BUDGETS)}, got '{value}'")
+
+
+def completed_ids(output_path):
+    """Ids with a successful result in an existing output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a killed run
+            if not record.get("error"):
+                done.add(str(record["id"]))
+    return done
+
+
+def to_record(problem_id, problem, result):
+    """The fields of a pipeline result worth keeping in the output
+
+    A solver that failed inside the pipeline reports confidence 0; the
+    record gets an "error" so the next run retries it.
+    """
+    solution = result.get("solution", {})
+    record = {
+        "id": problem_id,
+        "problem": problem,
+        "topic": result.get("parsed", {}).get("topic"),
+        "solved_by": solution.get("solved_by"),
+        "solution": solution.get("llm_solution"),
+        "sympy_result": solution.get("sympy_result"),
+        "verification": result.get("verification"),
+        "explanation": result.get("explanation"),
+        "timings": result.get("timings"),
+        "skipped": result.get("skipped"),
+        "latency": result.get("latency"),
+        "usage": result.get("usage"),
+        "trace_id": result.get("trace_id")
+    }
+    if not solution.get("confidence", 0):
+        record["error"] = solution.get("llm_solution") or "No solution"
+    return record
+
+
+class BatchSolver:
+    """Runs problems through a shared MathPipeline with bounded concurrency"""
+
+    def __init__(self, pipeline, output_path, concurrency=4, rate_per_minute=None, mode="staged", budget=None):
+        self.pipeline = pipeline
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.limiter = TokenBucket.per_minute(rate_per_minute) if rate_per_minute else None
+        self.mode = mode
+        self.budget = budget
+        self.solved = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _write(self, record):
+        with self._lock:
+            self._out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._out.flush()
+
+    def solve_one(self, problem_id, problem):
+        if self.limiter is not None:
+            while not self.limiter.acquire(timeout=0.5):
+                if self._stop.is_set():
+                    return None
+        if self._stop.is_set():
+            return None
+
+        try:
+            record = to_record(problem_id, problem, self.pipeline.run(problem, mode=self.mode, budget=self.budget))
+        except Exception as e:
+            record = {"id": problem_id, "problem": problem, "error": f"{type(e).__name__}: {e}"}
+        self._write(record)
+        return record
+
+    def run(self, problems):
+        """Solve every problem, streaming results; returns (solved, failed, seconds)"""
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+        total = len(problems)
+        start = time.perf_counter()
+        pending = iter(problems)
+        in_flight = set()
+
+        with open(self.output_path, "a", encoding="utf-8") as self._out, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            try:
+                while True:
+                    # Keep a small queue ahead of the workers instead of submitting everything
+                    while len(in_flight) < self.concurrency * 2:
+                        item = next(pending, None)
+                        if item is None:
+                            break
+                        in_flight.add(pool.submit(self.solve_one, *item))
+                    if not in_flight:
+                        break
+
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self._report(future.result(), total, start)
+            except KeyboardInterrupt:
+                self._stop.set()
+                for future in in_flight:
+                    future.cancel()
+                print("\n⏸️ Interrupted - waiting for running problems to finish, rerun to resume")
+                raise
+            finally:
+                self._stop.set()
+
+        return self.solved, self.failed, time.perf_counter() - start
+
+    def _report(self, record, total, start):
+        if record is None:
+            return
+        if record.get("error"):
+            self.failed += 1
+            status = f"❌ {record['error']}"
+        else:
+            self.solved += 1
+            verified = (record.get("verification") or {}).get("is_correct")
+            status = f"✅ {record['solved_by']}, verified={verified}, {record['latency']:.1f}s"
+
+        done = self.solved + self.failed
+        rate = done / max(time.perf_counter() - start, 1e-9) * 60
+        print(f"[{done}/{total}] {record['id']}: {status} ({rate:.1f} problems/min)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV problem file")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file (also the resume checkpoint)")
+    parser.add_argument("--column", default="problem", help="Field holding the problem text")
+    parser.add_argument("--concurrency", type=int, default=4, help="Problems solved at once")
+    parser.add_argument("--rate", type=float, default=None, help="Max problems started per minute")
+    parser.add_argument("--mode", default="staged", choices=["staged", "fused"])
+    parser.add_argument("--budget", type=parse_budget, default=None,
+                        help="Latency budget per problem: seconds, or fast/thorough")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing results and start over")
+    args = parser.parse_args()
+
+    problems = read_problems(args.input, args.column)
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    done = completed_ids(args.output)
+    todo = [(pid, text) for pid, text in problems if pid not in done]
+
+    if done:
+        print(f"↩️ Resuming: {len(problems) - len(todo)} of {len(problems)} problems already solved")
+    if not todo:
+        print("✅ Nothing to do")
+        return
+
+    from agents.pipeline import MathPipeline, build_components
+
+    print("🔧 Loading models...")
+    pipeline = MathPipeline(build_components(include_multimodal=False))
+    solver = BatchSolver(pipeline, args.output, args.concurrency, args.rate, args.mode, args.budget)
+
+    print(f"🚀 Solving {len(todo)} problems (concurrency {args.concurrency}"
+          f"{f', {args.rate:g}/min' if args.rate else ''}, {args.mode})")
+    try:
+        solved, failed, seconds = solver.run(todo)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    rate = (solved + failed) / max(seconds, 1e-9) * 60
+    print(f"\n🏁 {solved} solved, {failed} failed in {seconds:.1f}s ({rate:.1f} problems/min)")
+    print(f"💾 Results in {args.output}")
+    if failed:
+        print("ℹ️ Rerun the same command to retry failed problems")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+OCR latency and confidence with and without image preprocessing
+
+Runs EasyOCR over two fixture sets generated from the problem bank: clean
+renders and 12 MP phone-photo-like JPEGs (tinted, unevenly lit, noisy,
+stored sideways with an EXIF orientation tag). Each variant reports latency
+(preprocessing included), mean confidence and similarity of the extracted
+text to the original problem.
+
+Usage:
+    python -m benchmarks.bench_ocr_preprocess
+    python -m benchmarks.bench_ocr_preprocess --limit 5 --variants raw preprocessed
+    python -m benchmarks.bench_ocr_preprocess --output benchmarks/results/ocr-preprocess.json
+"""
+import argparse
+import difflib
+import os
+import time
+
+from benchmarks.common import load_problems, render_photo_fixture, render_problem_image, save_json, summarize
+
+FIXTURE_DIR = "benchmarks/fixtures"
+
+VARIANTS = {
+    "raw": {"preprocess": False},
+    "preprocessed": {"preprocess": True},
+    "preprocessed+binarize": {"preprocess": True, "binarize": True},
+}
+
+
+def prepare_fixtures(problems):
+    """{"clean": [(problem, path)], "photo": [(problem, path)]}, generated once"""
+    fixtures = {"clean": [], "photo": []}
+    for i, problem in enumerate(problems):
+        clean = os.path.join(FIXTURE_DIR, "images", f"{problem['id']}.png")
+        photo = os.path.join(FIXTURE_DIR, "photos", f"{problem['id']}.jpg")
+        if not os.path.exists(clean):
+            render_problem_image(problem["problem"], clean)
+        if not os.path.exists(photo):
+            render_photo_fixture(problem["problem"], photo, seed=i)
+        fixtures["clean"].append((problem, clean))
+        fixtures["photo"].append((problem, photo))
+    return fixtures
+
+
+def similarity(expected, actual):
+    return difflib.SequenceMatcher(None, " ".join(expected.lower().split()), " ".join(actual.lower().split())).ratio()
+
+
+def run_variant(ocr, images, options):
+    from PIL import Image
+
+    ocr.preprocess = options.get("preprocess", True)
+    ocr.preprocess_options["binarize"] = options.get("binarize", False)
+    latencies, confidences, accuracy = [], [], []
+    for problem, path in images:
+        # Opened per run: decoding is part of what preprocessing can speed up
+        image = Image.open(path)
+        start = time.perf_counter()
+        text, confidence = ocr.process_image(image)
+        latencies.append(time.perf_counter() - start)
+        confidences.append(confidence)
+        accuracy.append(similarity(problem["problem"], text))
+    return {
+        "latency_s": summarize(latencies),
+        "confidence_mean": sum(confidences) / len(confidences),
+        "text_similarity_mean": sum(accuracy) / len(accuracy)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--problems", default="benchmarks/fixtures/problems.jsonl")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N problems")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    from multimodal.ocr_processor import OCRProcessor
+
+    problems = load_problems(args.problems)[:args.limit]
+    fixtures = prepare_fixtures(problems)
+    ocr = OCRProcessor()
+
+    report = {}
+    for fixture_set, images in fixtures.items():
+        for name in args.variants:
+            print(f"▶️  {fixture_set} / {name}: {len(images)} images...")
+            report[f"{fixture_set}/{name}"] = run_variant(ocr, images, VARIANTS[name])
+
+    print(f"\n{'fixtures / variant':<30}{'p50 s':>8}{'p95 s':>8}{'mean s':>8}{'conf':>7}{'text sim':>10}")
+    for name, stats in report.items():
+        print(f"{name:<30}{stats['latency_s']['p50']:>8.2f}{stats['latency_s']['p95']:>8.2f}"
+              f"{stats['latency_s']['mean']:>8.2f}{stats['confidence_mean']:>7.2f}{stats['text_similarity_mean']:>10.2f}")
+
+    if args.output:
+        save_json(report, args.output)
+        print(f"\n💾 Saved report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
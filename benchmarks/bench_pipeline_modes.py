@@ -0,0 +1,73 @@
+"""
+Compare latency and token usage of the staged (4-call) and fused pipelines
+
+Usage:
+    python -m benchmarks.bench_pipeline_modes
+    python -m benchmarks.bench_pipeline_modes --problems benchmarks/fixtures/problems.jsonl --repeat 2 --output bench_modes.json
+    python -m benchmarks.bench_pipeline_modes --provider replay --latency lognormal:-0.7,0.5
+"""
+import argparse
+import os
+from agents.pipeline import MathPipeline, build_components
+from benchmarks.common import load_problems, save_json, summarize
+
+VARIANTS = {
+    "staged": {"mode": "staged"},
+    "fused": {"mode": "fused", "fused_review": True},
+    "fused+separate-review": {"mode": "fused", "fused_review": False},
+}
+
+
+def run_variant(pipeline, problems, repeat, options):
+    latencies, prompt_tokens, completion_tokens, calls = [], [], [], []
+    for _ in range(repeat):
+        for problem in problems:
+            result = pipeline.run(problem["problem"], **options)
+            latencies.append(result["latency"])
+            prompt_tokens.append(sum(u["prompt_tokens"] for u in result["usage"].values()))
+            completion_tokens.append(sum(u["completion_tokens"] for u in result["usage"].values()))
+            calls.append(sum(u["calls"] for u in result["usage"].values()))
+    return {
+        "latency_s": summarize(latencies),
+        "prompt_tokens": summarize(prompt_tokens),
+        "completion_tokens": summarize(completion_tokens),
+        "llm_calls": summarize(calls)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--problems", default="benchmarks/fixtures/problems.jsonl")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--output", help="Write the full report as JSON")
+    parser.add_argument("--provider", choices=["groq", "replay", "record"], help="Override MATH_MENTOR_LLM_PROVIDER")
+    parser.add_argument("--latency", help="Replay latency distribution, e.g. uniform:0.2,0.8")
+    args = parser.parse_args()
+
+    if args.provider:
+        os.environ["MATH_MENTOR_LLM_PROVIDER"] = args.provider
+    if args.latency:
+        os.environ["MATH_MENTOR_REPLAY_LATENCY"] = args.latency
+
+    problems = load_problems(args.problems)
+    pipeline = MathPipeline(build_components(include_multimodal=False))
+
+    report = {}
+    for name in args.variants:
+        print(f"▶️  {name}: {len(problems) * args.repeat} runs...")
+        report[name] = run_variant(pipeline, problems, args.repeat, VARIANTS[name])
+
+    print(f"\n{'variant':<24}{'p50 s':>8}{'p95 s':>8}{'mean s':>8}{'calls':>7}{'prompt tok':>12}{'compl tok':>11}")
+    for name, stats in report.items():
+        print(f"{name:<24}{stats['latency_s']['p50']:>8.2f}{stats['latency_s']['p95']:>8.2f}"
+              f"{stats['latency_s']['mean']:>8.2f}{stats['llm_calls']['mean']:>7.1f}"
+              f"{stats['prompt_tokens']['mean']:>12.0f}{stats['completion_tokens']['mean']:>11.0f}")
+
+    if args.output:
+        save_json(report, args.output)
+        print(f"\n💾 Saved report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compare retrieval latency and hit quality of the dense, lexical and hybrid paths
+
+Each query has the text its answer chunk must contain. Reported per mode:
+latency (p50/p95), hit@k (the expected text is in any returned chunk), MRR
+(1 / rank of the first chunk containing it) and, for hybrid, how many
+queries BM25 answered alone without the embedding model.
+
+Keyword queries are formula lookups ("Bayes theorem", "nCr"); question
+queries are problem statements like the solver sends.
+
+Usage:
+    python -m benchmarks.bench_retrieval
+    python -m benchmarks.bench_retrieval --k 3 --repeat 20 --output bench_retrieval.json
+    python -m benchmarks.bench_retrieval --modes lexical hybrid
+"""
+import argparse
+import time
+
+from benchmarks.common import save_json, summarize
+from rag.vectorstore.vectorstore import RAGPipeline
+
+QUERIES = [
+    ("keyword", "Bayes theorem", "Bayes Theorem"),
+    ("keyword", "nCr", "nCr"),
+    ("keyword", "quotient rule", "Quotient Rule"),
+    ("keyword", "chain rule", "Chain Rule"),
+    ("keyword", "Cramer's rule", "Cramer's rule"),
+    ("keyword", "eigenvalues", "Eigenvalues"),
+    ("keyword", "discriminant", "Discriminant"),
+    ("keyword", "variance", "Variance"),
+    ("keyword", "binomial distribution", "Binomial Distribution"),
+    ("keyword", "determinant 2x2", "Determinant (2×2)"),
+    ("keyword", "difference of squares", "Difference of squares"),
+    ("keyword", "expected value", "Expected Value"),
+    ("question", "calculus Find the derivative of sin(x)/x", "Quotient Rule"),
+    ("question", "algebra Solve x^2 - 5x + 6 = 0", "Quadratic Formula"),
+    ("question", "probability P(B|A) = 0.9, P(A) = 0.01, P(B) = 0.05, find P(A|B)", "Bayes Theorem"),
+    ("question", "calculus Evaluate the integral of 1/x", "∫1/x"),
+    ("question", "linear_algebra Find the inverse of the matrix [[1, 2], [3, 4]]", "Matrix Inverse"),
+    ("question", "probability How many ways can 3 students be chosen from a class of 10?", "Combinations"),
+    ("question", "calculus What is the limit of sin(x)/x as x approaches 0?", "lim(x→0) sin(x)/x"),
+    ("question", "algebra Expand (a+b)^5", "Binomial Theorem"),
+]
+
+MODES = ["dense", "lexical", "hybrid"]
+
+
+def run_mode(rag, mode, k, repeat):
+    latencies, hits, reciprocal_ranks, lexical_only = {}, {}, {}, 0
+    for kind, query, expected in QUERIES:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = rag.retrieve_context(query, k=k, mode=mode)
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        rank = next((i + 1 for i, r in enumerate(results) if expected in r["content"]), None)
+        hits.setdefault(kind, []).append(rank is not None)
+        reciprocal_ranks.setdefault(kind, []).append(1 / rank if rank else 0.0)
+        lexical_only += bool(results) and all(r.get("source") == "lexical" for r in results)
+
+    report = {"lexical_only": lexical_only, "queries": len(QUERIES)}
+    for kind in latencies:
+        report[kind] = {
+            "latency_s": summarize(latencies[kind]),
+            "hit_at_k": sum(hits[kind]) / len(hits[kind]),
+            "mrr": sum(reciprocal_ranks[kind]) / len(reciprocal_ranks[kind])
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per query")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    rag = RAGPipeline()
+    modes = list(args.modes)
+    if any(mode != "lexical" for mode in modes):
+        try:
+            rag.load_vectorstore()
+            # Warm the embedding model so its load time isn't charged to the first query
+            rag.embeddings.embed_query("warm up")
+        except ImportError as e:
+            print(f"⚠️ Dense retrieval unavailable ({e}); running the lexical path only")
+            modes = ["lexical"]
+    if rag.load_lexical() is None:
+        raise SystemExit("❌ No lexical index - build the vector store first (python rag/vectorstore/vectorstore.py)")
+
+    report = {}
+    for mode in modes:
+        print(f"▶️  {mode}: {len(QUERIES)} queries x {args.repeat}...")
+        report[mode] = run_mode(rag, mode, args.k, args.repeat)
+
+    print(f"\n{'mode':<9}{'kind':<10}{'p50 ms':>9}{'p95 ms':>9}{'hit@' + str(args.k):>8}{'MRR':>7}")
+    for mode, result in report.items():
+        for kind in ("keyword", "question"):
+            stats = result[kind]
+            print(f"{mode:<9}{kind:<10}{stats['latency_s']['p50'] * 1000:>9.2f}{stats['latency_s']['p95'] * 1000:>9.2f}"
+                  f"{stats['hit_at_k']:>8.0%}{stats['mrr']:>7.2f}")
+    if "hybrid" in report:
+        print(f"\n🔤 Hybrid answered {report['hybrid']['lexical_only']}/{len(QUERIES)} queries from BM25 alone")
+
+    if args.output:
+        save_json(report, args.output)
+        print(f"\n💾 Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Startup benchmark: cold import time of the app's modules and time to first render
+
+Every measurement runs in a fresh interpreter. Import time comes from
+`python -X importtime` over everything app.py imports at module level,
+broken down by top-level package. Time to first render runs app.py once
+through Streamlit's AppTest harness with the offline replay LLM.
+
+The check fails (exit 1) when:
+  - a heavy dependency (torch, whisper, easyocr, sentence_transformers,
+    langchain_community, sympy, faiss) is imported by the app's modules
+    instead of at first use
+  - cold import time exceeds --max-import-ms
+  - cold import time regressed past --tolerance against a --compare baseline
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 7 --label before-lazy-imports
+    python -m benchmarks.bench_startup --compare benchmarks/results/startup-base.json --tolerance 0.2
+    python -m benchmarks.bench_startup --max-import-ms 1500 --no-render
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import load_json, save_json
+
+RESULTS_DIR = "benchmarks/results"
+
+# Must not be imported until something actually uses them
+HEAVY_MODULES = (
+    "torch", "whisper", "easyocr", "sentence_transformers", "langchain_community",
+    "langchain_huggingface", "sympy", "faiss"
+)
+
+RENDER_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("app.py", default_timeout={timeout})
+app.run()
+print(json.dumps({{"first_render_s": time.perf_counter() - start, "exceptions": [str(e.value) for e in app.exception]}}))
+"""
+
+
+def app_imports(path="app.py"):
+    """Modules app.py imports at module level"""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def available(modules):
+    """Split modules into importable (by find_spec in a child) and missing"""
+    code = ("import importlib.util, json, sys\n"
+            "print(json.dumps([m for m in sys.argv[1:] if importlib.util.find_spec(m.split('.')[0]) is None]))")
+    missing = json.loads(subprocess.run(
+        [sys.executable, "-c", code, *modules], capture_output=True, text=True, check=True
+    ).stdout)
+    return [m for m in modules if m not in missing], missing
+
+
+def import_profile(modules):
+    """(total seconds, {top-level package: self seconds}, imported module names) for one cold import"""
+    statement = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.getcwd()}
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing the app's modules failed:\n{proc.stderr[-2000:]}")
+
+    packages, imported = {}, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        imported.add(name)
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+    return sum(packages.values()), packages, imported
+
+
+def first_render(timeout):
+    """Seconds for a fresh interpreter to run app.py once (AppTest), or None without Streamlit"""
+    env = {**os.environ, "PYTHONPATH": os.getcwd(), "MATH_MENTOR_LLM_PROVIDER": "replay"}
+    proc = subprocess.run(
+        [sys.executable, "-c", RENDER_SCRIPT.format(timeout=timeout)],
+        capture_output=True, text=True, env=env
+    )
+    if proc.returncode != 0:
+        print(f"⚠️ First-render run failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr else proc.returncode}")
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Cold imports to take the median of")
+    parser.add_argument("--top", type=int, default=15, help="Packages shown in the breakdown")
+    parser.add_argument("--no-render", action="store_true", help="Skip the time-to-first-render run")
+    parser.add_argument("--render-timeout", type=float, default=600)
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median cold import takes longer")
+    parser.add_argument("--label", default=time.strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed import-time regression (0.2 = 20%%)")
+    parser.add_argument("--slack-ms", type=float, default=50, help="Absolute noise allowance on top of --tolerance")
+    args = parser.parse_args()
+
+    modules, missing = available(app_imports())
+    if missing:
+        print(f"⚠️ Not installed, left out of the measurement: {', '.join(missing)}")
+
+    runs = [import_profile(modules) for _ in range(args.repeat)]
+    totals = [total for total, _, _ in runs]
+    median_run = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    _, packages, imported = median_run
+    heavy = sorted({name.split(".")[0] for name in imported} & set(HEAVY_MODULES))
+
+    report = {
+        "label": args.label,
+        "modules": modules,
+        "missing": missing,
+        "import_s": {"median": statistics.median(totals), "min": min(totals), "max": max(totals)},
+        "packages_s": dict(sorted(packages.items(), key=lambda item: -item[1])),
+        "heavy_imported": heavy,
+        "first_render": None if args.no_render else first_render(args.render_timeout)
+    }
+
+    print(f"\n📦 Cold import of {len(modules)} app modules: median {report['import_s']['median'] * 1000:.0f} ms "
+          f"(min {report['import_s']['min'] * 1000:.0f}, max {report['import_s']['max'] * 1000:.0f}, n={args.repeat})")
+    print(f"\n{'package':<28}{'self ms':>9}{'share':>8}")
+    for package, seconds in list(report["packages_s"].items())[:args.top]:
+        print(f"{package:<28}{seconds * 1000:>9.1f}{seconds / median_run[0]:>8.0%}")
+    if report["first_render"]:
+        print(f"\n🖥️  Time to first render: {report['first_render']['first_render_s']:.2f}s")
+        for error in report["first_render"]["exceptions"]:
+            print(f"   ⚠️ {error}")
+
+    path = os.path.join(RESULTS_DIR, f"startup-{args.label}.json")
+    save_json(report, path)
+    print(f"\n💾 Saved results to {path}")
+
+    ok = True
+    if heavy:
+        print(f"\n❌ Heavy modules imported at startup: {', '.join(heavy)} - import them at first use")
+        ok = False
+    median_ms = report["import_s"]["median"] * 1000
+    if args.max_import_ms is not None and median_ms > args.max_import_ms:
+        print(f"\n❌ Cold import {median_ms:.0f} ms exceeds the {args.max_import_ms:.0f} ms budget")
+        ok = False
+    if args.compare:
+        base_ms = load_json(args.compare)["import_s"]["median"] * 1000
+        limit = base_ms * (1 + args.tolerance) + args.slack_ms
+        print(f"\n📊 Cold import {median_ms:.0f} ms vs baseline {base_ms:.0f} ms ({(median_ms - base_ms) / base_ms:+.0%})")
+        if median_ms > limit:
+            print(f"❌ Regression beyond {args.tolerance:.0%} + {args.slack_ms:.0f} ms")
+            ok = False
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q in 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(values):
+    """count / mean / p50 / p95 / p99 / max"""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0
+    }
+
+
+def load_problems(path):
+    """Read a JSONL problem bank: one {"id", "problem", ...} object per line"""
+    problems = []
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            record.setdefault("id", str(i))
+            problems.append(record)
+    return problems
+
+
+def save_json(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def read_rss_bytes():
+    """Current resident set size of this process (Linux /proc, psutil elsewhere)"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return 0
+
+
+class ResourceSampler:
+    """Background sampler of process CPU utilisation and RSS"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.rss = []
+        self.cpu = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        last_cpu, last_wall = time.process_time(), time.perf_counter()
+        while not self._stop.wait(self.interval):
+            cpu, wall = time.process_time(), time.perf_counter()
+            self.cpu.append(100.0 * (cpu - last_cpu) / max(wall - last_wall, 1e-9))
+            self.rss.append(read_rss_bytes())
+            last_cpu, last_wall = cpu, wall
+
+    def __enter__(self):
+        self._start_cpu = time.process_time()
+        self._start_wall = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.cpu_seconds = time.process_time() - self._start_cpu
+        self.wall_seconds = time.perf_counter() - self._start_wall
+
+    def report(self):
+        return {
+            "cpu_seconds": self.cpu_seconds,
+            "cpu_percent_mean": sum(self.cpu) / len(self.cpu) if self.cpu else 0.0,
+            "cpu_percent_max": max(self.cpu) if self.cpu else 0.0,
+            "cores": os.cpu_count(),
+            "rss_mb_peak": max(self.rss) / 2**20 if self.rss else read_rss_bytes() / 2**20,
+            "rss_mb_end": read_rss_bytes() / 2**20
+        }
+
+
+def render_problem_image(text, path, width=1200, font_size=36):
+    """Draw a problem statement as a black-on-white PNG (OCR fixture)"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    image = Image.new("RGB", (width, font_size * 4), "white")
+    ImageDraw.Draw(image).text((40, font_size), text, fill="black", font=font)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    image.save(path)
+    return path
+
+
+def synth_audio(path, seconds=4.0, rate=16000):
+    """Write a speech-like tone sequence WAV (ASR load fixture - not real speech)"""
+    import math
+    import struct
+    import wave
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        pitch = 180 + 60 * math.sin(2 * math.pi * 3 * t)
+        envelope = 0.5 * (1 + math.sin(2 * math.pi * 4 * t))
+        frames += struct.pack("<h", int(8000 * envelope * math.sin(2 * math.pi * pitch * t)))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(frames))
+    return path
+
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def render_photo_fixture(text, path, size=(4032, 3024), orientation=6, seed=0):
+    """A phone-photo-like JPEG of a problem: 12 MP, tinted paper, uneven light, noise, EXIF rotation"""
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = size
+    font_size = height // 24
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    page = Image.new("L", size, 255)
+    ImageDraw.Draw(page).text((width // 6, height // 3), text, fill=0, font=font)
+
+    rng = np.random.default_rng(seed)
+    light = np.linspace(0.75, 1.0, width)[None, :] * np.linspace(0.85, 1.0, height)[:, None]
+    ink = np.asarray(page, dtype=np.float32) / 255
+    gray = (40 + 170 * ink) * light + rng.normal(0, 6, (height, width))
+    tint = np.array([1.0, 0.96, 0.88], dtype=np.float32)
+    photo = Image.fromarray(np.clip(gray[..., None] * tint, 0, 255).astype(np.uint8))
+
+    # Stored sideways like a portrait phone shot; orientation 6 says "rotate 90° clockwise to view"
+    exif = Image.Exif()
+    if orientation == 6:
+        photo = photo.transpose(Image.ROTATE_90)
+        exif[0x0112] = 6
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    photo.save(path, quality=90, exif=exif)
+    return path
@@ -0,0 +1,210 @@
+"""
+Load test: N concurrent simulated sessions against one shared set of components
+
+Each session mirrors a Streamlit user: it picks a text, image or audio input
+from the local fixtures, runs OCR/ASR if needed, then the full parse -> solve
+-> verify -> explain pipeline. The LLM is the offline replay stand-in (see
+llm/replay.py), so results depend on the host, not on Groq.
+
+Usage:
+    python -m benchmarks.load_test --sessions 8 --requests 5
+    python -m benchmarks.load_test --sessions 16 --mix text=0.6,image=0.3,audio=0.1 --label v2
+    python -m benchmarks.load_test --sessions 16 --compare benchmarks/results/load-v1.json
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (
+    ResourceSampler, load_problems, render_problem_image, save_json, summarize, synth_audio
+)
+
+FIXTURE_DIR = "benchmarks/fixtures"
+RESULTS_DIR = "benchmarks/results"
+
+# Stages whose p95 is checked by --compare
+COMPARED_STAGES = ("pipeline", "parse", "solve", "verify", "explain", "retrieval", "ocr", "asr")
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    unknown = set(mix) - {"text", "image", "audio"}
+    if unknown:
+        raise ValueError(f"Unknown input types in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def prepare_fixtures(problems):
+    """Images of every problem and one synthetic audio clip, generated once"""
+    images = []
+    for problem in problems:
+        path = os.path.join(FIXTURE_DIR, "images", f"{problem['id']}.png")
+        if not os.path.exists(path):
+            render_problem_image(problem["problem"], path)
+        images.append((problem, path))
+
+    audio = os.path.join(FIXTURE_DIR, "audio", "problem.wav")
+    if not os.path.exists(audio):
+        synth_audio(audio)
+    return images, audio
+
+
+class LoadTest:
+    def __init__(self, components, problems, mix, mode, seed):
+        from agents.pipeline import MathPipeline
+
+        self.components = components
+        self.pipeline = MathPipeline(components)
+        self.problems = problems
+        self.mix = mix
+        self.mode = mode
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.latencies = {"text": [], "image": [], "audio": []}
+        self.errors = []
+        self.lock = threading.Lock()
+        self.images, self.audio = prepare_fixtures(problems) if set(mix) - {"text"} else ([], None)
+
+    def _pick(self):
+        with self.rng_lock:
+            kind = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+            problem = self.rng.choice(self.problems)
+            image = self.rng.choice(self.images) if self.images else None
+        return kind, problem, image
+
+    def request(self):
+        kind, problem, image = self._pick()
+        start = time.perf_counter()
+        try:
+            if kind == "image":
+                from PIL import Image
+                text, _ = self.components["ocr"].process_image(Image.open(image[1]).convert("RGB"))
+                # Synthetic fixtures OCR cleanly, but fall back like a user editing the text would
+                raw_input = text or image[0]["problem"]
+            elif kind == "audio":
+                with open(self.audio, "rb") as f:
+                    self.components["audio"].process_audio(f)
+                # The tone fixture has no words; the user "edits" in the real problem
+                raw_input = problem["problem"]
+            else:
+                raw_input = problem["problem"]
+
+            self.pipeline.run(raw_input, mode=self.mode)
+        except Exception as e:
+            with self.lock:
+                self.errors.append(f"{kind}: {type(e).__name__}: {e}")
+            return
+        with self.lock:
+            self.latencies[kind].append(time.perf_counter() - start)
+
+    def session(self, requests, think_time):
+        for _ in range(requests):
+            self.request()
+            if think_time:
+                time.sleep(think_time)
+
+
+def compare(report, baseline_path, tolerance):
+    """Print p95 deltas per stage; return False if any regressed past tolerance"""
+    from benchmarks.common import load_json
+
+    baseline = load_json(baseline_path)
+    ok = True
+    print(f"\n{'stage':<14}{'base p95':>10}{'p95':>10}{'delta':>9}")
+    for stage in COMPARED_STAGES:
+        old = baseline["stages"].get(stage, {}).get("p95")
+        new = report["stages"].get(stage, {}).get("p95")
+        if not old or new is None:
+            continue
+        delta = (new - old) / old
+        flag = "  ❌" if delta > tolerance else ""
+        ok = ok and delta <= tolerance
+        print(f"{stage:<14}{old * 1000:>8.0f}ms{new * 1000:>8.0f}ms{delta:>+8.0%}{flag}")
+
+    old_tp, new_tp = baseline["throughput_rps"], report["throughput_rps"]
+    print(f"{'throughput':<14}{old_tp:>8.2f}/s{new_tp:>8.2f}/s{(new_tp - old_tp) / old_tp:>+8.0%}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent simulated sessions")
+    parser.add_argument("--requests", type=int, default=5, help="Problems solved per session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between a session's requests")
+    parser.add_argument("--mix", default="text=0.7,image=0.2,audio=0.1")
+    parser.add_argument("--mode", default="staged", choices=["staged", "fused"])
+    parser.add_argument("--problems", default=os.path.join(FIXTURE_DIR, "problems.jsonl"))
+    parser.add_argument("--latency", default="lognormal:-0.7,0.5", help="Stub LLM latency distribution")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default=time.strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # Stubbed LLM - must be set before any agent is constructed
+    os.environ["MATH_MENTOR_LLM_PROVIDER"] = "replay"
+    os.environ["MATH_MENTOR_REPLAY_LATENCY"] = args.latency
+
+    from agents.pipeline import build_components
+    from utils.tracing import tracer
+
+    mix = parse_mix(args.mix)
+    problems = load_problems(args.problems)
+    print("🔧 Loading shared components...")
+    components = build_components(include_multimodal=bool(set(mix) - {"text"}))
+    test = LoadTest(components, problems, mix, args.mode, args.seed)
+
+    # Warm up once so model loading doesn't land in the measurements
+    test.request()
+    tracer.reset()
+    for values in test.latencies.values():
+        values.clear()
+
+    total = args.sessions * args.requests
+    print(f"🚀 {args.sessions} sessions x {args.requests} requests ({args.mix}, {args.mode})...")
+    with ResourceSampler() as resources, ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        for _ in range(args.sessions):
+            pool.submit(test.session, args.requests, args.think_time)
+
+    completed = sum(len(v) for v in test.latencies.values())
+    report = {
+        "label": args.label,
+        "config": vars(args),
+        "completed": completed,
+        "errors": len(test.errors),
+        "error_samples": test.errors[:10],
+        "wall_seconds": resources.wall_seconds,
+        "throughput_rps": completed / resources.wall_seconds if resources.wall_seconds else 0.0,
+        "request_latency": {kind: summarize(v) for kind, v in test.latencies.items() if v},
+        "stages": tracer.snapshot(),
+        "resources": resources.report()
+    }
+
+    print(f"\n✅ {completed}/{total} requests in {resources.wall_seconds:.1f}s "
+          f"({report['throughput_rps']:.2f} req/s, {len(test.errors)} errors)")
+    print(f"\n{'stage':<24}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<24}{stats['count']:>6}{stats['p50'] * 1000:>9.0f}"
+              f"{stats['p95'] * 1000:>9.0f}{stats['p99'] * 1000:>9.0f}")
+    res = report["resources"]
+    print(f"\n🖥️  CPU {res['cpu_percent_mean']:.0f}% mean / {res['cpu_percent_max']:.0f}% max "
+          f"of {res['cores']} cores, RSS peak {res['rss_mb_peak']:.0f} MB")
+
+    path = os.path.join(RESULTS_DIR, f"load-{args.label}.json")
+    save_json(report, path)
+    print(f"💾 Saved results to {path}")
+
+    if args.compare and not compare(report, args.compare, args.tolerance):
+        print("\n❌ p95 regression beyond tolerance")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from pydantic import PrivateAttr
+
+from utils.deadline import DeadlineExceeded, remaining, timeout_for
+from utils.deadline import check as check_deadline
+from utils.rate_limit import TokenBucket
+from utils.tokens import count_tokens
+from utils.tracing import Histogram, tracer
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "TimeoutException", "ConnectError", "ReadError", "RemoteProtocolError", "TimeoutError"
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header, if the error carries one"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaLimiter:
+    """Requests/min and tokens/min buckets shared by every call to one provider"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute, completion_reserve=400):
+        self.requests = TokenBucket.per_minute(requests_per_minute, burst=max(1, requests_per_minute // 6))
+        self.tokens = TokenBucket.per_minute(tokens_per_minute, burst=max(1, tokens_per_minute // 6))
+        # Completion length isn't known up front; reserve a typical answer's worth
+        self.completion_reserve = completion_reserve
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def cost(self, messages):
+        return sum(count_tokens(m.content) for m in messages) + self.completion_reserve
+
+    def pause(self, seconds):
+        """Stop issuing calls for `seconds` (after a 429 with Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def pause_remaining(self):
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def acquire(self, cost, timeout=None):
+        """Wait for quota; False if it can't be had within `timeout` seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pause = self.pause_remaining()
+        if timeout is not None and pause >= timeout:
+            return False
+        time.sleep(pause)
+        if not self.requests.acquire(timeout=self._left(deadline)):
+            return False
+        return self.tokens.acquire(cost, timeout=self._left(deadline))
+
+    async def aacquire(self, cost, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pause = self.pause_remaining()
+        if timeout is not None and pause >= timeout:
+            return False
+        await asyncio.sleep(pause)
+        if not await self.requests.aacquire(timeout=self._left(deadline)):
+            return False
+        return await self.tokens.aacquire(cost, timeout=self._left(deadline))
+
+    def _left(self, deadline):
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def try_acquire(self, cost):
+        """Take quota only if it's free right now (used for optional hedges)"""
+        if self.pause_remaining() or not self.requests.try_acquire():
+            return False
+        return self.tokens.try_acquire(cost)
+
+
+class CircuitBreaker:
+    """Fail fast after repeated transient failures, probe again after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # Token of the one call let through while half-open, until it reports back
+        self._probe = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """Raise while open; returns a probe token if this call is the half-open probe, else None"""
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._probe is not None):
+                tracer.count("llm.circuit_rejected")
+                raise CircuitOpenError(
+                    f"LLM temporarily unavailable after {self.failures} consecutive failures"
+                )
+            if state == "half_open":
+                # Let exactly one probe through
+                self._probe = object()
+                return self._probe
+        return None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe = None
+
+    def record_failure(self):
+        with self._lock:
+            self._fail()
+
+    def end_probe(self, probe):
+        """Release the probe slot; a probe that ended any other way than success failed"""
+        if probe is None:
+            return
+        with self._lock:
+            if self._probe is probe:
+                self._fail()
+
+    def _fail(self):
+        self.failures += 1
+        self._probe = None
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                tracer.count("llm.circuit_opened")
+            self.opened_at = time.monotonic()
+
+
+def _in_thread(fn, *args, **kwargs):
+    """Run fn on a thread of its own and return its Future
+
+    A shared pool would cap every in-flight LLM call in the process at its
+    size, and calls abandoned at a deadline would keep holding its threads.
+    """
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name="llm-call", daemon=True).start()
+    return future
+
+
+class ResilientChatModel(BaseChatModel):
+    """Wraps a chat model with quota limiting, retries, a circuit breaker and hedging
+
+    All instances for one provider share the same QuotaLimiter and
+    CircuitBreaker (see get_resilience), so the quotas hold across agents.
+    Transient errors are retried with full-jitter exponential backoff,
+    honouring Retry-After. With `hedge=True`, a call still running after the
+    recent p95 latency gets a duplicate request, if quota allows; the first
+    answer wins.
+    """
+
+    inner: Any
+    limiter: Any = None
+    breaker: Any = None
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    hedge: bool = False
+    hedge_min_samples: int = 20
+
+    _latency: Any = PrivateAttr(default_factory=Histogram)
+    _latency_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return f"resilient-{self.inner._llm_type}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        cost = self.limiter.cost(messages) if self.limiter else 0
+        for attempt in range(self.max_retries + 1):
+            check_deadline()
+            probe = self.breaker.before_call() if self.breaker else None
+            try:
+                if self.limiter and not self.limiter.acquire(cost, timeout=remaining()):
+                    raise DeadlineExceeded("Latency budget exhausted waiting for LLM quota")
+                result = self._call(messages, stop, cost, **kwargs)
+                if self.breaker:
+                    self.breaker.record_success()
+                return result
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                # Whatever ended the attempt (a 400, the deadline, a quota timeout), free the probe slot
+                if self.breaker:
+                    self.breaker.end_probe(probe)
+            time.sleep(delay)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        cost = self.limiter.cost(messages) if self.limiter else 0
+        for attempt in range(self.max_retries + 1):
+            check_deadline()
+            probe = self.breaker.before_call() if self.breaker else None
+            try:
+                if self.limiter and not await self.limiter.aacquire(cost, timeout=remaining()):
+                    raise DeadlineExceeded("Latency budget exhausted waiting for LLM quota")
+                result = await self._acall(messages, stop, cost, **kwargs)
+                if self.breaker:
+                    self.breaker.record_success()
+                return result
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                # Whatever ended the attempt (a 400, the deadline, cancellation), free the probe slot
+                if self.breaker:
+                    self.breaker.end_probe(probe)
+            await asyncio.sleep(delay)
+
+    def _on_failure(self, error, attempt):
+        """Seconds to back off before retrying, or None to give up"""
+        if not is_retryable(error):
+            return None
+        if self.breaker:
+            self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            return None
+
+        wait_hint = retry_after(error)
+        if wait_hint is not None and self.limiter:
+            self.limiter.pause(wait_hint)
+        if getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError":
+            tracer.count("llm.rate_limited")
+
+        # Full jitter: spreads retries from many sessions instead of synchronizing them
+        delay = max(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)), wait_hint or 0.0)
+        left = remaining()
+        if left is not None and delay >= left:
+            # No time left for another attempt - fail now rather than at the deadline
+            return None
+        tracer.count("llm.retries")
+        return delay
+
+    def _observe(self, seconds):
+        with self._latency_lock:
+            self._latency.observe(seconds)
+
+    def _hedge_delay(self):
+        with self._latency_lock:
+            if not self.hedge or len(self._latency.samples) < self.hedge_min_samples:
+                return None
+            return self._latency.quantile(0.95)
+
+    def _call(self, messages, stop, cost, **kwargs):
+        start = time.perf_counter()
+        delay = self._hedge_delay()
+        if delay is None and remaining() is None:
+            result = self.inner._generate(messages, stop=stop, **kwargs)
+            self._observe(time.perf_counter() - start)
+            return result
+
+        # Run on another thread so the caller can stop waiting at the hedge delay or the deadline
+        primary = _in_thread(self.inner._generate, messages, stop=stop, **kwargs)
+        pending = {primary}
+        backup = None
+        if delay is not None:
+            done, _ = wait(pending, timeout=timeout_for(delay))
+            if not done and remaining() != 0.0 and (self.limiter is None or self.limiter.try_acquire(cost)):
+                tracer.count("llm.hedged")
+                backup = _in_thread(self.inner._generate, messages, stop=stop, **kwargs)
+                pending.add(backup)
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                tracer.count("llm.deadline_exceeded")
+                raise DeadlineExceeded("Latency budget exhausted waiting for the LLM")
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        tracer.count("llm.hedge_won")
+                    self._observe(time.perf_counter() - start)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _acall(self, messages, stop, cost, **kwargs):
+        start = time.perf_counter()
+        delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self.inner._agenerate(messages, stop=stop, **kwargs))
+        pending = {primary}
+        backup = None
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=timeout_for(delay))
+            if not done and remaining() != 0.0 and (self.limiter is None or self.limiter.try_acquire(cost)):
+                tracer.count("llm.hedged")
+                backup = asyncio.ensure_future(self.inner._agenerate(messages, stop=stop, **kwargs))
+                pending.add(backup)
+
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    tracer.count("llm.deadline_exceeded")
+                    raise DeadlineExceeded("Latency budget exhausted waiting for the LLM")
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            tracer.count("llm.hedge_won")
+                        self._observe(time.perf_counter() - start)
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+_resilience = {}
+_resilience_lock = threading.Lock()
+
+
+def get_resilience(provider):
+    """(QuotaLimiter, CircuitBreaker) shared by every model of a provider"""
+    with _resilience_lock:
+        if provider not in _resilience:
+            _resilience[provider] = (
+                QuotaLimiter(
+                    int(os.getenv("MATH_MENTOR_LLM_RPM", "30")),
+                    int(os.getenv("MATH_MENTOR_LLM_TPM", "12000"))
+                ),
+                CircuitBreaker(
+                    failure_threshold=int(os.getenv("MATH_MENTOR_LLM_BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv("MATH_MENTOR_LLM_BREAKER_RESET", "30"))
+                )
+            )
+        return _resilience[provider]
+
+
+_http_clients = None
+_http_clients_lock = threading.Lock()
+
+
+def _per_loop_async_client(**kwargs):
+    """An httpx.AsyncClient that sends through a separate pool per event loop
+
+    httpx connections belong to the loop that opened them, and the app, the
+    API and asyncio.run() in scripts each run their own loop. SDKs only take
+    an httpx.AsyncClient instance, so this one keeps the per-loop pools
+    itself; a pool is dropped with its loop.
+    """
+    import httpx
+
+    class PerLoopAsyncClient(httpx.AsyncClient):
+        def __init__(self):
+            super().__init__(**kwargs)
+            self._pools = weakref.WeakKeyDictionary()
+            self._pools_lock = threading.Lock()
+
+        def _pool(self):
+            loop = asyncio.get_running_loop()
+            with self._pools_lock:
+                pool = self._pools.get(loop)
+                if pool is None:
+                    pool = self._pools[loop] = httpx.AsyncClient(**kwargs)
+                return pool
+
+        async def send(self, request, **send_kwargs):
+            return await self._pool().send(request, **send_kwargs)
+
+        async def aclose(self):
+            await self._pool().aclose()
+
+    return PerLoopAsyncClient()
+
+
+def get_http_clients():
+    """(sync, async) keep-alive httpx clients shared by every ChatGroq instance"""
+    global _http_clients
+    with _http_clients_lock:
+        if _http_clients is None:
+            import httpx
+
+            limits = httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=60)
+            timeout = httpx.Timeout(float(os.getenv("MATH_MENTOR_LLM_TIMEOUT", "60")), connect=5.0)
+            _http_clients = (
+                httpx.Client(limits=limits, timeout=timeout),
+                _per_loop_async_client(limits=limits, timeout=timeout)
+            )
+        return _http_clients
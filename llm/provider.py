@@ -0,0 +1,89 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+# "groq"   - live Groq API (default)
+# "replay" - offline stand-in answering from recorded/synthesized responses
+# "record" - live Groq API, appending every response to the replay file
+PROVIDERS = ("groq", "replay", "record")
+
+# One model per (provider, model, temperature, hedge), shared by every agent
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_provider():
+    return os.getenv("MATH_MENTOR_LLM_PROVIDER", "groq").lower()
+
+
+def get_chat_model(temperature=0, model=DEFAULT_MODEL, hedge=None):
+    """Chat model for an agent, chosen by MATH_MENTOR_LLM_PROVIDER
+
+    Models are wrapped in ResilientChatModel (quota limiting, retries,
+    circuit breaker, deadlines) and shared, so all agents use one connection
+    pool and one set of quotas. `hedge` defaults to MATH_MENTOR_LLM_HEDGE.
+    """
+    provider = get_provider()
+    if provider not in PROVIDERS:
+        raise ValueError(f"⚠️ Unknown LLM provider '{provider}', expected one of {', '.join(PROVIDERS)}")
+    if hedge is None:
+        hedge = os.getenv("MATH_MENTOR_LLM_HEDGE", "0") == "1"
+
+    key = (provider, model, temperature, hedge)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = _build_model(provider, temperature, model, hedge)
+        return _models[key]
+
+
+def _build_model(provider, temperature, model, hedge):
+    from llm.client import ResilientChatModel, get_resilience
+
+    if provider == "replay":
+        from llm.replay import ReplayChatModel
+        replay = ReplayChatModel(
+            records_path=os.getenv("MATH_MENTOR_REPLAY_FILE"),
+            on_miss=os.getenv("MATH_MENTOR_REPLAY_ON_MISS", "synthesize"),
+            latency=os.getenv("MATH_MENTOR_REPLAY_LATENCY", "0")
+        )
+        # No quotas or retries offline, but deadlines and hedging behave as they do live
+        return ResilientChatModel(inner=replay, max_retries=0, hedge=hedge)
+
+    limiter, breaker = get_resilience("groq")
+    llm = ResilientChatModel(
+        inner=_groq_model(temperature, model),
+        limiter=limiter,
+        breaker=breaker,
+        max_retries=int(os.getenv("MATH_MENTOR_LLM_RETRIES", "3")),
+        hedge=hedge
+    )
+    if provider == "record":
+        from llm.replay import RecordingChatModel
+        return RecordingChatModel(
+            inner=llm,
+            records_path=os.getenv("MATH_MENTOR_REPLAY_FILE", "llm/recordings.jsonl")
+        )
+    return llm
+
+
+def _groq_model(temperature, model):
+    from langchain_groq import ChatGroq
+    from llm.client import get_http_clients
+
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("⚠️ GROQ_API_KEY not found in .env file")
+    http_client, http_async_client = get_http_clients()
+    return ChatGroq(
+        model=model,
+        temperature=temperature,
+        api_key=api_key,
+        # Retries are handled by ResilientChatModel, with jitter and shared quotas
+        max_retries=0,
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
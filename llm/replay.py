@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from utils.tokens import count_tokens
+
+
+def prompt_hash(messages):
+    """Stable key for a rendered prompt"""
+    payload = json.dumps([(m.type, m.content) for m in messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_records(path):
+    """{prompt_hash: record} from a JSON-lines recordings file"""
+    records = {}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    records[record["key"]] = record
+    return records
+
+
+class LatencyModel:
+    """Injected latency, parsed from a spec string
+
+    "0.4" or "fixed:0.4"          constant seconds
+    "uniform:0.2,0.8"             uniform between two bounds
+    "normal:0.5,0.1"              normal(mean, stddev), clipped at 0
+    "lognormal:-0.7,0.5"          exp(normal(mu, sigma)) - long right tail
+    """
+
+    def __init__(self, spec="0", seed=0):
+        self.spec = spec or "0"
+        kind, _, params = self.spec.partition(":")
+        if not params:
+            kind, params = "fixed", kind
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",")]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {self.spec}")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            if self.kind == "fixed":
+                return self.params[0]
+            if self.kind == "uniform":
+                return self._rng.uniform(*self.params)
+            if self.kind == "normal":
+                return max(0.0, self._rng.gauss(*self.params))
+            return math.exp(self._rng.gauss(*self.params))
+
+
+TOPIC_KEYWORDS = {
+    "calculus": ("derivative", "differentiate", "integra", "limit", "lim", "d/dx", "maxim", "minim"),
+    "linear_algebra": ("matrix", "determinant", "eigen", "inverse", "[["),
+    "probability": ("probability", "coin", "dice", "die ", "p(", "choose", "ncr", "npr", "bayes"),
+}
+
+
+def guess_topic(text):
+    lowered = text.lower()
+    if re.search(r"\b\d+\s*[cp]\s*\d+\b", lowered):
+        return "probability"
+    for topic, keywords in TOPIC_KEYWORDS.items():
+        if any(k in lowered for k in keywords):
+            return topic
+    return "algebra"
+
+
+def _user_problem(messages):
+    """The problem statement from the last user message"""
+    content = messages[-1].content if messages else ""
+    match = re.search(r"(?:Problem:|Parse this math problem:)\s*(.*?)(?:\n|$)", content)
+    return match.group(1).strip() if match else content.strip()
+
+
+def synthesize_response(messages):
+    """A schema-valid stand-in answer for whichever agent prompt this is"""
+    system = messages[0].content if messages else ""
+    problem = _user_problem(messages)
+    variables = sorted(set(re.findall(r"\b([a-z])\b", problem)) & {"x", "y", "z", "n", "k", "t"})
+    solution = (
+        f"**Solution approach:** Apply the standard method for this problem.\n\n"
+        f"**Step-by-step:**\n1. Restate: {problem}\n2. Apply the relevant formula.\n\n"
+        f"**Final answer:** (synthesized offline response)"
+    )
+    parse_fields = {
+        "problem_text": problem,
+        "topic": guess_topic(problem),
+        "variables": variables,
+        "constraints": [],
+        "needs_clarification": False,
+        "clarification_reason": ""
+    }
+    verdict = {"is_correct": True, "confidence": 0.9, "issues": [], "needs_human_review": False}
+
+    if '"problem_text"' in system and '"solution"' in system:
+        return json.dumps(dict(parse_fields, solution=solution))
+    if '"problem_text"' in system:
+        return json.dumps(parse_fields)
+    if '"is_correct"' in system and '"explanation"' in system:
+        return json.dumps(dict(verdict, explanation=f"Let's walk through it.\n\n{solution}"))
+    if '"is_correct"' in system:
+        return json.dumps(verdict)
+    return solution
+
+
+class ReplayChatModel(BaseChatModel):
+    """Offline chat model: recorded responses keyed on prompt hash
+
+    Prompts without a recording are answered by synthesize_response() (or
+    raise when on_miss="error"), so the full pipeline runs without network
+    access. `latency` injects a delay per call for throughput/tail-latency
+    benchmarks; use a fixed seed for reproducible runs.
+    """
+
+    records_path: Optional[str] = None
+    on_miss: str = "synthesize"
+    latency: str = "0"
+    seed: int = 0
+
+    _records: dict = PrivateAttr(default_factory=dict)
+    _latency_model: Any = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._records = load_records(self.records_path)
+        self._latency_model = LatencyModel(self.latency, self.seed)
+
+    @property
+    def _llm_type(self):
+        return "replay"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        record, content = self._lookup(messages)
+        delay = self._latency_model.sample()
+        if delay > 0:
+            time.sleep(delay)
+        return self._result(messages, record, content)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        # Sleep on the event loop so async callers see true overlap, not executor threads
+        record, content = self._lookup(messages)
+        delay = self._latency_model.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._result(messages, record, content)
+
+    def _lookup(self, messages):
+        key = prompt_hash(messages)
+        record = self._records.get(key)
+        if record is not None:
+            return record, record["content"]
+        if self.on_miss == "error":
+            raise KeyError(f"No recorded response for prompt {key[:12]}")
+        return None, synthesize_response(messages)
+
+    def _result(self, messages, record, content):
+        prompt_tokens = sum(count_tokens(m.content) for m in messages)
+        completion_tokens = count_tokens(content)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            },
+            response_metadata={"model_name": "replay", "replayed": record is not None}
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class RecordingChatModel(BaseChatModel):
+    """Pass-through to a live model that appends every response to a recordings file"""
+
+    inner: Any
+    records_path: str
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return "recording"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        self._record(messages, result)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+        self._record(messages, result)
+        return result
+
+    def _record(self, messages, result):
+        message = result.generations[0].message
+        record = {
+            "key": prompt_hash(messages),
+            "content": message.content,
+            "usage": getattr(message, "usage_metadata", None) or {}
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(self.records_path) or ".", exist_ok=True)
+            with open(self.records_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
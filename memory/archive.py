@@ -0,0 +1,151 @@
+import gzip
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+
+class ArchiveStore:
+    """Immutable, gzip-compressed JSONL segments of old memories
+
+    index.json lists every segment with its time range, count and size, so
+    date-range reads open only the segments that overlap. Each segment has
+    an `.ids` sidecar (one id per line) that is read on the first lookup
+    by id and then cached. Callers serialize writes (MemoryStore holds its
+    file lock); reads need no lock because segments never change once written.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self._ids = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self):
+        """Index entries, oldest first"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)["segments"]
+        except (OSError, json.JSONDecodeError, KeyError):
+            return []
+
+    def _write_index(self, segments):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"segments": segments}, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def append_segment(self, memories):
+        """Write memories (oldest first) as a new segment; returns its index entry"""
+        timestamps = [m.get("timestamp") or "" for m in memories]
+        name = f"segment-{min(timestamps)[:19].replace(':', '')}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+
+        with gzip.open(f"{path}.tmp", 'wt', encoding='utf-8') as f:
+            for memory in memories:
+                f.write(json.dumps(memory, ensure_ascii=False) + "\n")
+        with open(f"{path}.ids.tmp", 'w', encoding='utf-8') as f:
+            f.write("\n".join(str(m.get("id")) for m in memories) + "\n")
+        os.replace(f"{path}.ids.tmp", f"{path}.ids")
+        os.replace(f"{path}.tmp", path)
+
+        entry = {
+            "file": name,
+            "first": min(timestamps),
+            "last": max(timestamps),
+            "count": len(memories),
+            "bytes": os.path.getsize(path)
+        }
+        self._write_index(self.segments() + [entry])
+        return entry
+
+    def _segment_ids(self, entry):
+        with self._lock:
+            if entry["file"] not in self._ids:
+                try:
+                    with open(os.path.join(self.directory, entry["file"] + ".ids"), 'r', encoding='utf-8') as f:
+                        self._ids[entry["file"]] = set(f.read().split())
+                except OSError:
+                    self._ids[entry["file"]] = set()
+            return self._ids[entry["file"]]
+
+    def contains(self, memory_id):
+        return any(memory_id in self._segment_ids(entry) for entry in self.segments())
+
+    def get(self, memory_id):
+        """The archived memory with this id, or None"""
+        for entry in reversed(self.segments()):
+            if memory_id in self._segment_ids(entry):
+                for memory in self._read(entry):
+                    if memory.get("id") == memory_id:
+                        return memory
+        return None
+
+    def iter_memories(self, start=None, end=None):
+        """Stream archived memories with start <= timestamp < end (ISO strings or datetimes)"""
+        start = start.isoformat() if isinstance(start, datetime) else start
+        end = end.isoformat() if isinstance(end, datetime) else end
+        for entry in self.segments():
+            if (start and entry["last"] < start) or (end and entry["first"] >= end):
+                continue
+            for memory in self._read(entry):
+                timestamp = memory.get("timestamp") or ""
+                if (not start or timestamp >= start) and (not end or timestamp < end):
+                    yield memory
+
+    def _read(self, entry):
+        try:
+            with gzip.open(os.path.join(self.directory, entry["file"]), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (OSError, EOFError, json.JSONDecodeError) as e:
+            print(f"⚠️ Error reading archive segment {entry['file']}: {e}")
+
+    def prune(self, max_age_days=None, max_bytes=None, now=None, forget=None):
+        """Delete the oldest segments past the age or total-size cap; returns the deleted entries
+
+        forget, if given, is called with every memory of a segment before it is deleted.
+        """
+        segments = self.segments()
+        cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).isoformat() if max_age_days else None
+        total = sum(entry["bytes"] for entry in segments)
+        deleted = []
+        while segments and ((cutoff and segments[0]["last"] < cutoff) or (max_bytes and total > max_bytes)):
+            entry = segments.pop(0)
+            total -= entry["bytes"]
+            deleted.append(entry)
+        if deleted:
+            if forget is not None:
+                for entry in deleted:
+                    for memory in self._read(entry):
+                        forget(memory)
+            self._write_index(segments)
+            for entry in deleted:
+                self._remove(entry["file"])
+        return deleted
+
+    def clear(self):
+        for entry in self.segments():
+            self._remove(entry["file"])
+        self._write_index([])
+
+    def _remove(self, name):
+        with self._lock:
+            self._ids.pop(name, None)
+        for path in (name, name + ".ids"):
+            try:
+                os.remove(os.path.join(self.directory, path))
+            except FileNotFoundError:
+                pass
+
+    def summary(self):
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "count": sum(entry["count"] for entry in segments),
+            "bytes": sum(entry["bytes"] for entry in segments),
+            "first": segments[0]["first"] if segments else None
+        }
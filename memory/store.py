@@ -1,51 +1,278 @@
+import atexit
 import json
 import os
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import uuid
 
+from memory.archive import ArchiveStore
+
+try:
+    import fcntl
+except ImportError:  # Windows - writers are only serialized within a process
+    fcntl = None
+
+# Hourly store counts kept for the throughput figures
+STATS_HOURS = 48
+# Count/size caps archive down to this fraction of the cap, so retention doesn't rerun every commit
+RETENTION_LOW_WATER = 0.8
+
+
+def empty_stats():
+    return {
+        "total": 0,
+        "by_topic": {},
+        "by_input_type": {},
+        "by_feedback": {},
+        "verification": {"checked": 0, "passed": 0},
+        "per_hour": {},
+        "bytes": 0,
+        "hot": 0,
+        "archive": {"segments": 0, "count": 0, "bytes": 0, "first": None}
+    }
+
+
+def retention_from_env():
+    """MemoryStore retention settings from MATH_MENTOR_MEMORY_* variables"""
+    def number(name, default, scale=1):
+        value = os.getenv(name, default)
+        return float(value) * scale if value not in (None, "", "0") else None
+
+    hot_mb = number("MATH_MENTOR_MEMORY_HOT_MB", "8", 2**20)
+    archive_mb = number("MATH_MENTOR_MEMORY_ARCHIVE_MB", None, 2**20)
+    hot_max = number("MATH_MENTOR_MEMORY_HOT_MAX", "2000")
+    return {
+        "hot_max_age_days": number("MATH_MENTOR_MEMORY_HOT_DAYS", "30"),
+        "hot_max_count": int(hot_max) if hot_max else None,
+        "hot_max_bytes": int(hot_mb) if hot_mb else None,
+        "archive_max_age_days": number("MATH_MENTOR_MEMORY_ARCHIVE_DAYS", None),
+        "archive_max_bytes": int(archive_mb) if archive_mb else None
+    }
+
+
+def count_memory(stats, memory):
+    """Fold one memory into running aggregates"""
+    stats["total"] += 1
+    parsed = memory.get("parsed_problem") if isinstance(memory.get("parsed_problem"), dict) else {}
+    for field, value in (
+        ("by_topic", parsed.get("topic") or "unknown"),
+        ("by_input_type", memory.get("input_type") or "unknown"),
+        ("by_feedback", memory.get("feedback") or "none")
+    ):
+        stats[field][value] = stats[field].get(value, 0) + 1
+
+    verification = memory.get("verification")
+    if isinstance(verification, dict) and verification.get("is_correct") is not None:
+        stats["verification"]["checked"] += 1
+        stats["verification"]["passed"] += bool(verification["is_correct"])
+
+    hour = (memory.get("timestamp") or datetime.now().isoformat())[:13]
+    stats["per_hour"][hour] = stats["per_hour"].get(hour, 0) + 1
+    if len(stats["per_hour"]) > STATS_HOURS:
+        for old in sorted(stats["per_hour"])[:-STATS_HOURS]:
+            del stats["per_hour"][old]
+
+
+def uncount_memory(stats, memory):
+    """Take a deleted memory back out of the aggregates"""
+    stats["total"] = max(stats["total"] - 1, 0)
+    parsed = memory.get("parsed_problem") if isinstance(memory.get("parsed_problem"), dict) else {}
+    for field, value in (
+        ("by_topic", parsed.get("topic") or "unknown"),
+        ("by_input_type", memory.get("input_type") or "unknown"),
+        ("by_feedback", memory.get("feedback") or "none")
+    ):
+        if stats[field].get(value, 0) > 1:
+            stats[field][value] -= 1
+        else:
+            stats[field].pop(value, None)
+
+    verification = memory.get("verification")
+    if isinstance(verification, dict) and verification.get("is_correct") is not None:
+        stats["verification"]["checked"] = max(stats["verification"]["checked"] - 1, 0)
+        stats["verification"]["passed"] = max(stats["verification"]["passed"] - bool(verification["is_correct"]), 0)
+
+    hour = (memory.get("timestamp") or "")[:13]
+    if stats["per_hour"].get(hour, 0) > 1:
+        stats["per_hour"][hour] -= 1
+    else:
+        stats["per_hour"].pop(hour, None)
+
+
+def parse_lines(data):
+    """Memories from complete JSONL lines, skipping a torn or corrupted line"""
+    memories = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            memories.append(json.loads(line))
+        except json.JSONDecodeError:
+            print("⚠️ Skipping corrupted memory line")
+    return memories
+
+
 class MemoryStore:
-    def __init__(self, storage_path="memory/storage.json"):
+    """Interaction history shared by every session and server process
+
+    Memories live in an append-only JSONL file. store_interaction returns
+    immediately; a background writer groups everything stored within
+    `commit_interval` seconds into one append + fsync under an inter-process
+    file lock. Readers tail the file from the last offset they saw, so writes
+    from other processes show up without reloading the whole history.
+
+    That file is the hot tier. Memories older than `hot_max_age_days`, or
+    the oldest ones once it holds more than `hot_max_count` memories or
+    `hot_max_bytes`, move to compressed archive segments (memory/archive/)
+    in the background. Loading and similarity search only read the hot
+    tier; get_memory and iter_memories also reach into the archive, which
+    is itself capped by `archive_max_age_days` / `archive_max_bytes`.
+    """
+
+    def __init__(self, storage_path="memory/storage.jsonl", commit_interval=0.2,
+                 hot_max_age_days=30, hot_max_count=2000, hot_max_bytes=8 * 2**20,
+                 archive_max_age_days=None, archive_max_bytes=None, retention_interval=3600):
+        # The old single-JSON-document file is imported once, then left alone
+        if storage_path.endswith(".json"):
+            self.legacy_path, storage_path = storage_path, os.path.splitext(storage_path)[0] + ".jsonl"
+        else:
+            self.legacy_path = os.path.splitext(storage_path)[0] + ".json"
         self.storage_path = storage_path
+        self.lock_path = storage_path + ".lock"
+        # Aggregates kept next to the data and updated on every commit, so dashboards never reload it
+        self.stats_path = os.path.splitext(storage_path)[0] + ".stats.json"
+        self.commit_interval = commit_interval
+        self.hot_max_age_days = hot_max_age_days
+        self.hot_max_count = hot_max_count
+        self.hot_max_bytes = hot_max_bytes
+        self.archive_max_age_days = archive_max_age_days
+        self.archive_max_bytes = archive_max_bytes
+        self.retention_interval = retention_interval
+        self._last_retention = 0.0
         # Ensure directory exists
         os.makedirs(os.path.dirname(self.storage_path) if os.path.dirname(self.storage_path) else "memory", exist_ok=True)
-        self.memories = self.load_memories()
-    
-    def load_memories(self):
-        """Load memories from disk"""
-        if os.path.exists(self.storage_path):
+
+        self.memories = []
+        self._ids = set()
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.RLock()
+        self._file_thread_lock = threading.Lock()
+
+        self._pending = []
+        self._queued = 0
+        self._committed = 0
+        self._writer = None
+        self._closed = False
+        # Bumped by clear_memories, so a batch the writer took before the clear is dropped
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._stats_cache = (None, empty_stats())
+        self.archive = ArchiveStore(os.path.join(os.path.dirname(self.storage_path) or ".", "archive"))
+
+        self._import_legacy()
+        self._refresh()
+        print(f"✅ Loaded {len(self.memories)} memories from {self.storage_path}")
+        atexit.register(self.close)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared with every other process using this store"""
+        with self._file_thread_lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
             try:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    print(f"✅ Loaded {len(data)} memories from {self.storage_path}")
-                    return data
-            except json.JSONDecodeError:
-                print(f"⚠️ Corrupted memory file, starting fresh")
-                return []
-            except Exception as e:
-                print(f"⚠️ Error loading memories: {e}")
-                return []
-        else:
-            print(f"ℹ️ No memory file found at {self.storage_path}, creating new one")
-            return []
-    
-    def save_memories(self):
-        """Save memories to disk"""
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _import_legacy(self):
+        with self._file_lock():
+            if os.path.exists(self.storage_path):
+                return
+            memories = []
+            if os.path.exists(self.legacy_path):
+                try:
+                    with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                        memories = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"⚠️ Could not import {self.legacy_path}: {e}")
+            self._replace_file(memories)
+            if memories:
+                print(f"📦 Imported {len(memories)} memories from {self.legacy_path}")
+
+    def _replace_file(self, memories, stats=None):
+        """Atomically swap in a new log (a new inode, which readers take as 'reload')"""
+        tmp_path = f"{self.storage_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write("".join(json.dumps(m, ensure_ascii=False) + "\n" for m in memories).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.storage_path)
+        if stats is None:
+            stats = empty_stats()
+            for memory in memories:
+                count_memory(stats, memory)
+        stats["hot"] = len(memories)
+        self._write_stats(self._mark(stats, os.stat(self.storage_path)))
+
+    def _refresh(self):
+        """Pick up memories appended by other processes since the last look"""
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.storage_path) if os.path.dirname(self.storage_path) else "memory", exist_ok=True)
-            
-            # Save to file with pretty printing
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(self.memories, f, indent=2, ensure_ascii=False)
-            
-            print(f"✅ Saved {len(self.memories)} memories to {self.storage_path}")
-            return True
-        except Exception as e:
-            print(f"❌ Error saving memories: {e}")
-            return False
-    
+            stat = os.stat(self.storage_path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                # Replaced (cleared / rewritten) - start over, keeping our own uncommitted memories
+                with self._cond:
+                    pending = list(self._pending)
+                self.memories, self._ids, self._offset, self._inode = [], set(), 0, stat.st_ino
+                for memory in pending:
+                    self._remember(memory)
+            if stat.st_size == self._offset:
+                return
+            with open(self.storage_path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read(stat.st_size - self._offset)
+            # Only complete lines; a line being appended right now is read next time
+            end = data.rfind(b"\n") + 1
+            for memory in parse_lines(data[:end].decode("utf-8", errors="replace")):
+                if memory.get("id") not in self._ids:
+                    self._remember(memory)
+            self._offset += end
+
+    def _remember(self, memory):
+        self.memories.append(memory)
+        self._ids.add(memory.get("id"))
+
+    def load_memories(self):
+        """Load memories from disk"""
+        self._refresh()
+        with self._lock:
+            return list(self.memories)
+
+    def save_memories(self, timeout=None):
+        """Wait until every stored memory is durably committed"""
+        return self.flush(timeout)
+
+    def flush(self, timeout=None):
+        """Block until pending memories are committed; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._queued
+            while self._committed < target:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
     def store_interaction(self, data):
-        """Store a complete interaction"""
+        """Store a complete interaction (written to disk by the background committer)"""
         memory = {
             "id": str(uuid.uuid4()),
             "timestamp": datetime.now().isoformat(),
@@ -57,24 +284,244 @@ class MemoryStore:
             "feedback": data.get("feedback"),
             "user_comment": data.get("user_comment", "")
         }
-        
-        self.memories.append(memory)
-        success = self.save_memories()
-        
-        if success:
-            print(f"✅ Stored memory {memory['id']}")
-        else:
-            print(f"❌ Failed to store memory")
-        
+
+        with self._lock:
+            self._remember(memory)
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._pending.append(memory)
+                self._queued += 1
+                self._cond.notify_all()
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="memory-writer", daemon=True)
+                    self._writer.start()
+            generation = self._generation
+        if closed:
+            # The writer has stopped; commit in the caller rather than leave it pending forever
+            try:
+                self._commit([memory], generation)
+            except Exception as e:
+                print(f"❌ Error saving memories: {e}")
         return memory["id"]
-    
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            # Let concurrent stores join this commit
+            if not self._closed:
+                time.sleep(self.commit_interval)
+            with self._cond:
+                batch, self._pending = self._pending, []
+                generation = self._generation
+            try:
+                self._commit(batch, generation)
+            except Exception as e:
+                print(f"❌ Error saving memories: {e}")
+                with self._cond:
+                    if generation == self._generation:
+                        self._pending = batch + self._pending
+                time.sleep(1.0)
+                continue
+            with self._cond:
+                # A clear since the batch was taken has already settled its count
+                if generation == self._generation:
+                    self._committed += len(batch)
+                self._cond.notify_all()
+            try:
+                self._maybe_enforce_retention()
+            except Exception as e:
+                print(f"⚠️ Error applying memory retention: {e}")
+
+    def _commit(self, batch, generation):
+        """One locked append + fsync for a batch, and the matching stats update
+
+        Nothing is written if the store was cleared since the batch was taken.
+        """
+        data = "".join(json.dumps(m, ensure_ascii=False) + "\n" for m in batch).encode("utf-8")
+        with self._file_lock():
+            with self._cond:
+                if generation != self._generation:
+                    return
+            stats = self._current_stats()
+            with open(self.storage_path, 'ab') as f:
+                if f.tell() and not self._ends_with_newline():
+                    # A writer died mid-line; don't glue our first memory onto its fragment
+                    f.write(b"\n")
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            for memory in batch:
+                count_memory(stats, memory)
+            stats["hot"] += len(batch)
+            self._write_stats(self._mark(stats, os.stat(self.storage_path)))
+        print(f"✅ Stored {len(batch)} memor{'y' if len(batch) == 1 else 'ies'}")
+
+    def _ends_with_newline(self):
+        with open(self.storage_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _current_stats(self):
+        """Persisted stats brought up to the end of the log (call under the file lock)"""
+        stat = os.stat(self.storage_path)
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            stats = None
+        if (stats is None or "hot" not in stats
+                or stats.get("inode") != stat.st_ino or stats.get("offset", 0) > stat.st_size):
+            # Rebuild: everything archived, then the whole hot tier
+            stats, offset = empty_stats(), 0
+            for memory in self.archive.iter_memories():
+                count_memory(stats, memory)
+            stats["archive"] = self.archive.summary()
+        else:
+            offset = stats["offset"]
+        if offset < stat.st_size:
+            # Lines whose writer crashed before updating the stats (or a missing stats file)
+            with open(self.storage_path, 'rb') as f:
+                f.seek(offset)
+                for memory in parse_lines(f.read().decode("utf-8", errors="replace")):
+                    count_memory(stats, memory)
+                    stats["hot"] += 1
+        return stats
+
+    def _mark(self, stats, stat):
+        stats["inode"], stats["offset"], stats["bytes"] = stat.st_ino, stat.st_size, stat.st_size
+        return stats
+
+    def _write_stats(self, stats):
+        # Write-then-rename so a reader never sees half a file
+        tmp_path = f"{self.stats_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, ensure_ascii=False)
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            print(f"⚠️ Error saving memory stats: {e}")
+
+    def _maybe_enforce_retention(self):
+        stats = self.stats()
+        over_count = self.hot_max_count and stats.get("hot", 0) > self.hot_max_count
+        over_size = self.hot_max_bytes and stats.get("bytes", 0) > self.hot_max_bytes
+        # The age cap needs a scan of the hot tier, so it is only checked every retention_interval
+        due = time.monotonic() - self._last_retention > self.retention_interval
+        if over_count or over_size or due:
+            self.enforce_retention()
+
+    def enforce_retention(self, now=None):
+        """Move memories past the hot-tier caps into an archive segment and prune the archive"""
+        self._last_retention = time.monotonic()
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=self.hot_max_age_days)).isoformat() if self.hot_max_age_days else None
+
+        with self._file_lock():
+            stats = self._current_stats()
+            with open(self.storage_path, 'rb') as f:
+                memories = parse_lines(f.read().decode("utf-8", errors="replace"))
+
+            expired = [m for m in memories if cutoff and (m.get("timestamp") or "") < cutoff]
+            keep = [m for m in memories if not (cutoff and (m.get("timestamp") or "") < cutoff)]
+            if self.hot_max_count and len(keep) > self.hot_max_count:
+                excess = len(keep) - int(self.hot_max_count * RETENTION_LOW_WATER)
+                expired, keep = expired + keep[:excess], keep[excess:]
+            if self.hot_max_bytes:
+                sizes = [len(json.dumps(m, ensure_ascii=False).encode("utf-8")) + 1 for m in keep]
+                total = sum(sizes)
+                if total > self.hot_max_bytes:
+                    excess = 0
+                    while excess < len(keep) and total > self.hot_max_bytes * RETENTION_LOW_WATER:
+                        total -= sizes[excess]
+                        excess += 1
+                    expired, keep = expired + keep[:excess], keep[excess:]
+
+            archived = 0
+            if expired:
+                # Already archived if a previous run died before rewriting the hot tier
+                expired = [m for m in expired if not self.archive.contains(m.get("id"))]
+                if expired:
+                    self.archive.append_segment(sorted(expired, key=lambda m: m.get("timestamp") or ""))
+                    archived = len(expired)
+            pruned = self.archive.prune(
+                self.archive_max_age_days, self.archive_max_bytes, now,
+                forget=lambda memory: uncount_memory(stats, memory)
+            )
+
+            stats["archive"] = self.archive.summary()
+            if len(keep) != len(memories):
+                self._replace_file(keep, stats)
+            else:
+                self._write_stats(self._mark(stats, os.stat(self.storage_path)))
+
+        if archived or pruned:
+            print(f"🗄️ Archived {archived} memories, pruned {sum(e['count'] for e in pruned)} archived ones")
+        return {"archived": archived, "pruned": sum(e["count"] for e in pruned), "hot": len(keep)}
+
+    def get_memory(self, memory_id):
+        """A memory by id from either tier; the archive is only read when the hot tier misses"""
+        self._refresh()
+        with self._lock:
+            for memory in reversed(self.memories):
+                if memory.get("id") == memory_id:
+                    return memory
+        return self.archive.get(memory_id)
+
+    def iter_memories(self, start=None, end=None):
+        """Stream every memory (archive, then hot) with start <= timestamp < end, for analytics"""
+        yield from self.archive.iter_memories(start, end)
+        start = start.isoformat() if isinstance(start, datetime) else start
+        end = end.isoformat() if isinstance(end, datetime) else end
+        for memory in self.load_memories():
+            timestamp = memory.get("timestamp") or ""
+            if (not start or timestamp >= start) and (not end or timestamp < end):
+                yield memory
+
+    def stats(self):
+        """Aggregate statistics without touching the stored memories"""
+        try:
+            version = os.stat(self.stats_path).st_mtime_ns
+        except OSError:
+            version = None
+        if version != self._stats_cache[0]:
+            try:
+                with open(self.stats_path, 'r', encoding='utf-8') as f:
+                    self._stats_cache = (version, json.load(f))
+            except (OSError, json.JSONDecodeError):
+                pass
+
+        stats = json.loads(json.dumps(self._stats_cache[1]))
+        with self._cond:
+            pending = list(self._pending)
+        # Stored but not yet committed - counted so the numbers move as soon as the user acts
+        for memory in pending:
+            count_memory(stats, memory)
+        stats["hot"] = stats.get("hot", 0) + len(pending)
+
+        checked = stats["verification"]["checked"]
+        stats["verification"]["pass_rate"] = stats["verification"]["passed"] / checked if checked else None
+        now = datetime.now()
+        stats["last_hour"] = stats["per_hour"].get(now.strftime("%Y-%m-%dT%H"), 0)
+        stats["last_24h"] = sum(
+            stats["per_hour"].get((now - timedelta(hours=h)).strftime("%Y-%m-%dT%H"), 0) for h in range(24)
+        )
+        return stats
+
     def get_similar_problems(self, problem_text, limit=3):
         """Retrieve similar past problems"""
-        if not self.memories:
+        self._refresh()
+        with self._lock:
+            memories = list(self.memories)
+        if not memories:
             return []
-        
+
         similar = []
-        for memory in self.memories:
+        for memory in memories:
             parsed = memory.get("parsed_problem")
             if parsed and isinstance(parsed, dict):
                 stored_text = parsed.get("problem_text", "")
@@ -82,34 +529,51 @@ class MemoryStore:
                     similarity = self._simple_similarity(problem_text, stored_text)
                     if similarity > 0.3:
                         similar.append((memory, similarity))
-        
+
         similar.sort(key=lambda x: x[1], reverse=True)
         return [m[0] for m in similar[:limit]]
-    
+
     def _simple_similarity(self, text1, text2):
         """Simple word overlap similarity"""
         if not text1 or not text2:
             return 0.0
-        
+
         words1 = set(text1.lower().split())
         words2 = set(text2.lower().split())
-        
+
         if not words1 or not words2:
             return 0.0
-        
+
         intersection = len(words1 & words2)
         union = len(words1 | words2)
-        
+
         return intersection / union if union > 0 else 0.0
-    
+
     def get_all_memories(self):
         """Get all stored memories"""
-        return self.memories
-    
+        return self.load_memories()
+
     def clear_memories(self):
-        """Clear all memories"""
-        self.memories = []
-        success = self.save_memories()
-        if success:
+        """Clear all memories, in every process sharing the store"""
+        try:
+            with self._cond:
+                self._pending = []
+                self._committed = self._queued
+                self._generation += 1
+                self._cond.notify_all()
+            with self._file_lock():
+                self.archive.clear()
+                self._replace_file([])
+            self._refresh()
             print("✅ All memories cleared")
-        return success
+            return True
+        except OSError as e:
+            print(f"❌ Error clearing memories: {e}")
+            return False
+
+    def close(self, timeout=5.0):
+        """Commit what's pending and stop the writer"""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -1,9 +1,10 @@
-import whisper
 import tempfile
 import os
+from utils.tracing import span
 
 class AudioProcessor:
     def __init__(self, model_size="base"):
+        import whisper  # pulls in torch; imported only when ASR is actually set up
         print(f"Loading Whisper {model_size} model...")
         self.model = whisper.load_model(model_size)
         print("✅ Whisper model loaded")
@@ -17,11 +18,12 @@ class AudioProcessor:
         
         try:
             # Transcribe audio
-            result = self.model.transcribe(
-                tmp_path,
-                language="en",
-                task="transcribe"
-            )
+            with span("asr"):
+                result = self.model.transcribe(
+                    tmp_path,
+                    language="en",
+                    task="transcribe"
+                )
             
             text = result["text"].strip()
             
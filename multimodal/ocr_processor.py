@@ -1,31 +1,162 @@
-import easyocr
-from PIL import Image
+from PIL import Image, ImageOps
 import numpy as np
+from multimodal.worksheet import chunks, split_problems
+from utils.tracing import span
+
+# Preprocessing defaults: EasyOCR's detector cost grows with pixel count, and
+# text ~30-40px tall is plenty for its recognizer
+PREPROCESS_DEFAULTS = {
+    "max_side": 2048,          # cheap first downscale before any analysis
+    "target_text_height": 36,  # downscale further until lines are about this tall
+    "crop": True,              # crop to the inked region (plus a margin)
+    "binarize": False,         # feed a black/white image instead of grayscale
+}
+# Longest side of the copy used to locate the text and measure line height
+ANALYSIS_SIDE = 1024
+
+
+def adaptive_threshold(gray, window=None, offset=0.15):
+    """Ink mask by comparing each pixel with its local mean (Bradley's method, integral image)"""
+    h, w = gray.shape
+    window = window or max(15, (min(h, w) // 16) | 1)
+    half = window // 2
+
+    integral = np.zeros((h + 1, w + 1), dtype=np.int64)
+    integral[1:, 1:] = gray.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+
+    rows = np.arange(h)
+    cols = np.arange(w)
+    y0, y1 = np.clip(rows - half, 0, h), np.clip(rows + half + 1, 0, h)
+    x0, x1 = np.clip(cols - half, 0, w), np.clip(cols + half + 1, 0, w)
+    sums = (integral[y1][:, x1] - integral[y0][:, x1] - integral[y1][:, x0] + integral[y0][:, x0])
+    area = (y1 - y0)[:, None] * (x1 - x0)[None, :]
+    return gray * area < sums * (1.0 - offset)
+
+
+def ink_bounds(mask, margin=0.02, min_fraction=0.002):
+    """(top, bottom, left, right) of the inked region, ignoring sparse noise rows/columns"""
+    h, w = mask.shape
+    rows = np.flatnonzero(mask.sum(axis=1) > max(1, w * min_fraction))
+    cols = np.flatnonzero(mask.sum(axis=0) > max(1, h * min_fraction))
+    if not len(rows) or not len(cols):
+        return 0, h, 0, w
+    pad = int(max(h, w) * margin)
+    return (max(0, rows[0] - pad), min(h, rows[-1] + 1 + pad),
+            max(0, cols[0] - pad), min(w, cols[-1] + 1 + pad))
+
+
+def text_height(mask, min_fraction=0.01):
+    """Median height in pixels of the text lines (runs of inked rows), or None"""
+    inked = mask.sum(axis=1) > max(1, mask.shape[1] * min_fraction)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], inked.astype(np.int8), [0]))))
+    heights = edges[1::2] - edges[::2]
+    heights = heights[heights >= 4]  # specks and underlines aren't lines of text
+    return float(np.median(heights)) if len(heights) else None
+
+
+def preprocess_image(image, max_side=2048, target_text_height=36, crop=True, binarize=False):
+    """Rotate by EXIF, downscale, crop to the text; returns (uint8 array, info)"""
+    if isinstance(image, str):
+        image = Image.open(image)
+    if isinstance(image, Image.Image):
+        original_size = image.size
+        if max_side and image.format == "JPEG" and max(image.size) > max_side:
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full resolution
+            ratio = max_side / max(image.size)
+            image.draft("L", (round(image.width * ratio), round(image.height * ratio)))
+        image = ImageOps.exif_transpose(image)
+    else:
+        image = Image.fromarray(np.asarray(image))
+        original_size = image.size
+
+    gray = image.convert("L")
+    if max_side and max(gray.size) > max_side:
+        gray.thumbnail((max_side, max_side), Image.BILINEAR)
+    pixels = np.asarray(gray)
+
+    # Find the text on a small copy; layout survives downscaling and it's much cheaper
+    ratio = min(1.0, ANALYSIS_SIDE / max(gray.size))
+    small = gray.resize((max(1, round(gray.width * ratio)), max(1, round(gray.height * ratio))), Image.BOX)
+    mask = adaptive_threshold(np.asarray(small))
+
+    if crop:
+        top, bottom, left, right = (round(edge / ratio) for edge in ink_bounds(mask))
+        pixels = pixels[top:bottom, left:right]
+
+    scale = 1.0
+    height = text_height(mask)
+    height = height / ratio if height else None
+    if target_text_height and height and height > target_text_height:
+        scale = target_text_height / height
+        size = (max(1, round(pixels.shape[1] * scale)), max(1, round(pixels.shape[0] * scale)))
+        pixels = np.asarray(Image.fromarray(pixels).resize(size, Image.BOX))
+
+    if binarize:
+        pixels = np.where(adaptive_threshold(pixels), 0, 255).astype(np.uint8)
+
+    return np.ascontiguousarray(pixels), {
+        "original_size": original_size,
+        "size": (pixels.shape[1], pixels.shape[0]),
+        "text_height": height,
+        "scale": scale
+    }
+
 
 class OCRProcessor:
-    def __init__(self):
+    def __init__(self, preprocess=True, **options):
+        import easyocr  # pulls in torch; imported only when OCR is actually set up
         self.reader = easyocr.Reader(['en'], gpu=False)
-    
+        # preprocess=False hands images to EasyOCR untouched (the old behaviour)
+        self.preprocess = preprocess
+        self.preprocess_options = {**PREPROCESS_DEFAULTS, **options}
+
     def process_image(self, image_path_or_file):
         """Process image and extract text with confidence"""
+        if self.preprocess:
+            with span("ocr.preprocess"):
+                image, _ = preprocess_image(image_path_or_file, **self.preprocess_options)
         # Convert to numpy array if PIL Image
-        if isinstance(image_path_or_file, Image.Image):
+        elif isinstance(image_path_or_file, Image.Image):
             image = np.array(image_path_or_file)
         else:
             image = image_path_or_file
-        
+
         # Perform OCR
-        results = self.reader.readtext(image, detail=1)
-        
+        with span("ocr"):
+            results = self.reader.readtext(image, detail=1)
+
         if not results:
             return "", 0.0
-        
+
         # Extract text and calculate average confidence
         extracted_text = ' '.join([res[1] for res in results])
         avg_confidence = sum([res[2] for res in results]) / len(results)
-        
+
         return extracted_text, avg_confidence
-    
+
+    def readtext_pages(self, images, batch_size=16):
+        """readtext detail results for several pages, detected in one batched call"""
+        if self.preprocess:
+            with span("ocr.preprocess"):
+                arrays = [preprocess_image(image, **self.preprocess_options)[0] for image in images]
+        else:
+            arrays = [np.asarray(Image.fromarray(np.asarray(image)).convert("L")) for image in images]
+
+        # readtext_batched needs equal sizes; pad with white so box coordinates stay put
+        height = max(a.shape[0] for a in arrays)
+        width = max(a.shape[1] for a in arrays)
+        padded = [np.pad(a, ((0, height - a.shape[0]), (0, width - a.shape[1])), constant_values=255) for a in arrays]
+
+        with span("ocr"):
+            return self.reader.readtext_batched(padded, detail=1, batch_size=batch_size)
+
+    def iter_problems(self, pages, batch_size=4):
+        """Problems from many pages (see worksheet.iter_pages), yielded as each batch is read"""
+        for batch in chunks(pages, batch_size):
+            results = self.readtext_pages([page["image"] for page in batch])
+            for page, page_results in zip(batch, results):
+                yield from split_problems(page_results, page["source"], page["page"])
+
     def needs_hitl(self, confidence, threshold=0.7):
         """Check if HITL is needed based on confidence"""
         return confidence < threshold
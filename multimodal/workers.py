@@ -0,0 +1,358 @@
+import atexit
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+
+from utils.tracing import tracer
+
+KINDS = ("ocr", "asr")
+
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when a kind's queue is at its depth limit"""
+
+
+def _limit_threads(threads, cores):
+    """Pin this process to `cores` and cap every native thread pool at `threads`"""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if cores and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+
+def _load_processor(kind):
+    if kind == "ocr":
+        from multimodal.ocr_processor import OCRProcessor
+        return OCRProcessor()
+    from multimodal.audio_processor import AudioProcessor
+    return AudioProcessor()
+
+
+def _run_job(processor, kind, payload):
+    if kind == "ocr" and isinstance(payload, dict):
+        return processor.readtext_pages(payload["pages"])
+    if kind == "ocr":
+        return processor.process_image(payload)
+    return processor.process_audio(io.BytesIO(payload))
+
+
+def _worker_main(kind, jobs, results, threads, cores):
+    """Worker loop: load one model, then run jobs of its kind until told to stop"""
+    _limit_threads(threads, cores)
+    processor = _load_processor(kind)
+    results.put(("ready", kind, os.getpid(), None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, payload = job
+        results.put(("running", job_id, os.getpid(), time.time()))
+        try:
+            results.put(("done", job_id, _run_job(processor, kind, payload), time.time()))
+        except Exception as e:
+            results.put(("error", job_id, f"{type(e).__name__}: {e}", time.time()))
+
+
+class InferencePool:
+    """Out-of-process OCR/ASR with a bounded job queue per model
+
+    Each worker process loads one model once, is pinned to its own CPU cores
+    and caps PyTorch/BLAS threads to match, so concurrent sessions share a
+    predictable amount of CPU instead of oversubscribing it. submit() raises
+    QueueFull past `max_queue` waiting jobs (backpressure); status() reports
+    queued/running/done/error for polling, and result() blocks for the answer.
+    """
+
+    def __init__(self, ocr_workers=1, asr_workers=1, threads_per_worker=2, max_queue=8,
+                 reserve_cores=1, start_method="spawn"):
+        self.threads_per_worker = threads_per_worker
+        self.max_queue = max_queue
+        self._context = multiprocessing.get_context(start_method)
+        self._results = self._context.Queue()
+        self._queues = {kind: self._context.Queue() for kind in KINDS}
+        self._workers = {kind: [] for kind in KINDS}
+        self._jobs = {}
+        self._ready = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._cores = self._core_groups(ocr_workers + asr_workers, reserve_cores)
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "respawns": 0}
+
+        for kind, count in (("ocr", ocr_workers), ("asr", asr_workers)):
+            for _ in range(count):
+                self._spawn(kind)
+
+        threading.Thread(target=self._collect, daemon=True).start()
+        threading.Thread(target=self._watch, daemon=True).start()
+        atexit.register(self.shutdown)
+
+    def _core_groups(self, workers, reserve_cores):
+        """Disjoint core sets per worker, leaving the first cores to the app process
+
+        With fewer usable cores than workers nothing is pinned: workers sharing
+        a pinned core would stall each other while other cores sit idle.
+        """
+        if not hasattr(os, "sched_getaffinity"):
+            return itertools.repeat(None)
+        cores = sorted(os.sched_getaffinity(0))
+        usable = cores[reserve_cores:]
+        workers = max(workers, 1)
+        if len(usable) < workers:
+            return itertools.repeat(None)
+        per_worker = max(1, min(self.threads_per_worker, len(usable) // workers))
+        groups = [set(usable[i * per_worker:(i + 1) * per_worker]) for i in range(workers)]
+        return itertools.cycle(groups)
+
+    def _spawn(self, kind):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(kind, self._queues[kind], self._results, self.threads_per_worker, next(self._cores)),
+            daemon=True
+        )
+        process.start()
+        self._workers[kind].append(process)
+
+    def submit(self, kind, payload):
+        """Queue an OCR (image array/PIL image) or ASR (audio bytes) job; returns its id"""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown inference job kind: {kind}")
+        with self._lock:
+            if self.queue_depth(kind) >= self.max_queue:
+                self.stats["rejected"] += 1
+                tracer.count(f"{kind}.rejected")
+                raise QueueFull(f"{kind.upper()} queue is full ({self.max_queue} jobs waiting)")
+            if kind in self._failed:
+                raise RuntimeError(f"{kind.upper()} workers failed to start")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id, "kind": kind, "status": "queued", "submitted": time.time(),
+                "started": None, "finished": None, "worker": None, "result": None, "error": None,
+                "abandoned": False, "done": threading.Event()
+            }
+            self.stats["submitted"] += 1
+        self._queues[kind].put((job_id, payload))
+        return job_id
+
+    def queue_depth(self, kind):
+        return sum(1 for job in self._jobs.values() if job["kind"] == kind and job["status"] == "queued")
+
+    def status(self, job_id):
+        """Public view of a job: status, queue position, timings, result/error"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return {"id": job_id, "status": "unknown"}
+            view = {k: v for k, v in job.items() if k != "done"}
+            if job["status"] == "queued":
+                view["position"] = 1 + sum(
+                    1 for other in self._jobs.values()
+                    if other["kind"] == job["kind"] and other["status"] == "queued"
+                    and other["submitted"] < job["submitted"]
+                )
+            return view
+
+    def result(self, job_id, timeout=None):
+        """Block until the job finishes; its result, or RuntimeError/TimeoutError"""
+        job = self._jobs[job_id]
+        if not job["done"].wait(timeout):
+            # Nobody will collect it now; drop it as soon as it finishes
+            self.abandon(job_id)
+            raise TimeoutError(f"{job['kind']} job still {job['status']} after {timeout}s")
+        self.forget(job_id)
+        if job["status"] == "error":
+            raise RuntimeError(job["error"])
+        return job["result"]
+
+    def run(self, kind, payload, timeout=None):
+        return self.result(self.submit(kind, payload), timeout)
+
+    def forget(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["done"].is_set():
+                del self._jobs[job_id]
+
+    def abandon(self, job_id):
+        """Drop a job whose caller gave up: now if finished, else when it finishes"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if job["done"].is_set():
+                del self._jobs[job_id]
+            else:
+                job["abandoned"] = True
+
+    def _finish(self, job):
+        job["done"].set()
+        if job.get("abandoned"):
+            with self._lock:
+                self._jobs.pop(job["id"], None)
+
+    def _collect(self):
+        while not self._closed:
+            try:
+                event, job_id, value, stamp = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if event == "ready":
+                self._ready.add(value)
+                continue
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if event == "running":
+                    job["status"], job["worker"], job["started"] = "running", value, stamp
+                    continue
+                job["status"], job["finished"] = event, stamp
+                if event == "done":
+                    job["result"] = value
+                    self.stats["completed"] += 1
+                else:
+                    job["error"] = value
+                    self.stats["failed"] += 1
+            self._observe(job)
+            self._finish(job)
+
+    def _observe(self, job):
+        started = job["started"] or job["submitted"]
+        tracer.observe(f"{job['kind']}.queue_wait", max(0.0, started - job["submitted"]))
+        if job["finished"]:
+            tracer.observe(job["kind"], max(0.0, job["finished"] - started))
+
+    def _watch(self):
+        """Replace crashed workers and fail the job each one was running"""
+        while not self._closed:
+            time.sleep(1.0)
+            for kind, processes in self._workers.items():
+                for process in list(processes):
+                    if process.is_alive() or self._closed:
+                        continue
+                    with self._lock:
+                        processes.remove(process)
+                    error = f"{kind.upper()} worker exited with code {process.exitcode}"
+                    if process.pid in self._ready:
+                        self._fail_jobs(lambda job: job["status"] == "running" and job["worker"] == process.pid, error)
+                        self.stats["respawns"] += 1
+                        self._spawn(kind)
+                    else:
+                        # Died before its model loaded; respawning would fail the same way
+                        print(f"❌ {error} while loading its model")
+                        if not processes:
+                            self._failed.add(kind)
+                            self._fail_jobs(lambda job: job["kind"] == kind and job["status"] != "done", error)
+
+    def _fail_jobs(self, match, error):
+        with self._lock:
+            crashed = [job for job in self._jobs.values() if not job["done"].is_set() and match(job)]
+            for job in crashed:
+                job["status"], job["error"], job["finished"] = "error", error, time.time()
+                self.stats["failed"] += 1
+        for job in crashed:
+            self._finish(job)
+
+    def snapshot(self):
+        """Queue depths, busy workers and counters for the UI"""
+        with self._lock:
+            return {
+                kind: {
+                    "workers": len(self._workers[kind]),
+                    "queued": self.queue_depth(kind),
+                    "running": sum(1 for j in self._jobs.values() if j["kind"] == kind and j["status"] == "running")
+                }
+                for kind in KINDS
+            } | {"stats": dict(self.stats)}
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        for kind, processes in self._workers.items():
+            for _ in processes:
+                self._queues[kind].put(None)
+        for processes in self._workers.values():
+            for process in processes:
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.kill()
+
+
+class PooledOCR:
+    """OCRProcessor interface backed by the pool"""
+
+    def __init__(self, pool, timeout=120):
+        self.pool = pool
+        self.timeout = timeout
+
+    def process_image(self, image):
+        import numpy as np
+        from PIL import Image, ImageOps
+
+        if isinstance(image, Image.Image):
+            # Arrays carry no EXIF, so apply the orientation before converting
+            image = np.array(ImageOps.exif_transpose(image))
+        return tuple(self.pool.run("ocr", image, self.timeout))
+
+    def iter_problems(self, pages, batch_size=4):
+        """Problems from many pages, batches spread over the OCR workers, yielded in page order"""
+        import numpy as np
+        from collections import deque
+        from multimodal.worksheet import chunks, split_problems
+
+        # Keep every worker busy plus one batch queued behind them
+        ahead = self.pool.snapshot()["ocr"]["workers"] + 1
+        pending = deque()
+
+        def finish_oldest():
+            batch, job_id = pending.popleft()
+            for page, results in zip(batch, self.pool.result(job_id, self.timeout)):
+                yield from split_problems(results, page["source"], page["page"])
+
+        for batch in chunks(pages, batch_size):
+            images = [np.asarray(page["image"]) for page in batch]
+            while True:
+                try:
+                    pending.append((batch, self.pool.submit("ocr", {"pages": images})))
+                    break
+                except QueueFull:
+                    if not pending:
+                        raise
+                    yield from finish_oldest()
+            while len(pending) >= ahead:
+                yield from finish_oldest()
+        while pending:
+            yield from finish_oldest()
+
+    def needs_hitl(self, confidence, threshold=0.7):
+        return confidence < threshold
+
+
+class PooledAudio:
+    """AudioProcessor interface backed by the pool"""
+
+    def __init__(self, pool, timeout=300):
+        self.pool = pool
+        self.timeout = timeout
+
+    def process_audio(self, audio_file):
+        data = audio_file.getvalue() if hasattr(audio_file, "getvalue") else audio_file.read()
+        return self.pool.run("asr", data, self.timeout)
@@ -0,0 +1,157 @@
+import io
+import re
+from itertools import islice
+
+import numpy as np
+
+# A line that opens a new numbered problem: "3.", "3:", "Q3", "Q.3)", "Question 3", "Problem 3".
+# "3)" and "(3)" are left out: they mark multiple-choice options, which stay with their question
+PROBLEM_NUMBER = re.compile(
+    r"^\s*(?:(?:Q(?:uestion)?|Problem|Ex(?:ercise)?)\s*\.?\s*(\d{1,3})\s*[\.\):]?|(\d{1,3})\s*[\.:](?!\d))\s*", re.I
+)
+# A vertical gap this many line heights tall separates unnumbered problems
+PROBLEM_GAP = 1.5
+
+
+def chunks(iterable, size):
+    """Lists of up to `size` items, consumed lazily"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_bytes(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    return source.read()
+
+
+def _source_name(source, index):
+    if isinstance(source, str):
+        return source
+    return getattr(source, "name", None) or f"upload-{index + 1}"
+
+
+def iter_pdf_pages(data, dpi=200):
+    """Rasterize PDF pages one at a time (pypdfium2, else pdf2image/poppler)"""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                try:
+                    yield page.render(scale=dpi / 72).to_pil()
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+        return
+
+    try:
+        from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+    except ImportError:
+        raise RuntimeError("PDF upload needs pypdfium2 (pip install pypdfium2) or pdf2image with poppler")
+    for number in range(1, pdfinfo_from_bytes(data)["Pages"] + 1):
+        yield convert_from_bytes(data, dpi=dpi, first_page=number, last_page=number)[0]
+
+
+def iter_pages(sources, dpi=200):
+    """{"source", "page", "image"} for every image file and PDF page, rendered only when reached"""
+    from PIL import Image, ImageOps
+
+    for index, source in enumerate(sources):
+        name = _source_name(source, index)
+        data = _read_bytes(source)
+        if data[:5] == b"%PDF-":
+            for number, image in enumerate(iter_pdf_pages(data, dpi), start=1):
+                yield {"source": name, "page": number, "image": image}
+        else:
+            image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+            yield {"source": name, "page": 1, "image": image.convert("RGB")}
+
+
+def group_lines(results):
+    """Merge readtext (box, text, confidence) detections into text lines, top to bottom"""
+    boxes = []
+    for box, text, confidence in results:
+        points = np.asarray(box, dtype=float)
+        boxes.append({
+            "left": points[:, 0].min(), "right": points[:, 0].max(),
+            "top": points[:, 1].min(), "bottom": points[:, 1].max(),
+            "text": text, "confidence": float(confidence)
+        })
+
+    lines = []
+    for box in sorted(boxes, key=lambda b: (b["top"] + b["bottom"]) / 2):
+        line = lines[-1] if lines else None
+        if line is not None:
+            overlap = min(line["bottom"], box["bottom"]) - max(line["top"], box["top"])
+            height = min(line["bottom"] - line["top"], box["bottom"] - box["top"])
+            if overlap > 0.5 * max(height, 1):
+                line["boxes"].append(box)
+                line["top"], line["bottom"] = min(line["top"], box["top"]), max(line["bottom"], box["bottom"])
+                continue
+        lines.append({"top": box["top"], "bottom": box["bottom"], "boxes": [box]})
+
+    for line in lines:
+        line["boxes"].sort(key=lambda b: b["left"])
+        line["text"] = " ".join(b["text"] for b in line["boxes"])
+    return lines
+
+
+def split_problems(results, source=None, page=None):
+    """Problems on one page from readtext detail output
+
+    Numbered worksheets split at each problem number (text above the first
+    number - titles, instructions - is dropped). Without numbers, problems
+    are separated by vertical gaps wider than PROBLEM_GAP line heights.
+    """
+    lines = group_lines(results)
+    if not lines:
+        return []
+
+    numbered = any(PROBLEM_NUMBER.match(line["text"]) for line in lines)
+    line_height = float(np.median([line["bottom"] - line["top"] for line in lines]))
+
+    blocks = []
+    for line in lines:
+        match = PROBLEM_NUMBER.match(line["text"])
+        if numbered:
+            starts = match is not None
+        else:
+            starts = not blocks or line["top"] - blocks[-1][-1]["bottom"] > PROBLEM_GAP * line_height
+        if starts:
+            blocks.append([line])
+        elif blocks:
+            blocks[-1].append(line)
+
+    problems = []
+    for block in blocks:
+        boxes = [box for line in block for box in line["boxes"]]
+        match = PROBLEM_NUMBER.match(block[0]["text"]) if numbered else None
+        text = " ".join(line["text"] for line in block)
+        problems.append({
+            "source": source,
+            "page": page,
+            "number": (match.group(1) or match.group(2)) if match else None,
+            "text": text[match.end():].strip() if match else text,
+            "confidence": sum(b["confidence"] for b in boxes) / len(boxes),
+            "bbox": (
+                int(min(b["left"] for b in boxes)), int(block[0]["top"]),
+                int(max(b["right"] for b in boxes)), int(block[-1]["bottom"])
+            )
+        })
+    return problems
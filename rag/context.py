@@ -0,0 +1,116 @@
+from utils.tokens import count_tokens
+
+# The splitter in RAGPipeline.build_vectorstore overlaps chunks by 50 chars
+MIN_OVERLAP_CHARS = 15
+
+
+def _strip_overlap(previous, text):
+    """Remove the longest prefix of text that is a suffix of an included chunk"""
+    best = 0
+    for prior in previous:
+        limit = min(len(prior), len(text))
+        for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+            if size <= best:
+                break
+            if prior.endswith(text[:size]):
+                best = size
+                break
+    return text[best:], best
+
+
+class ContextAssembler:
+    """Builds the solver's {context} from retrieval results under a token budget
+
+    Results are expected in retrieval order with FAISS L2 distances as
+    "score" (lower is better). Steps: drop results above score_threshold,
+    cut at the first large jump in score (adaptive k), strip chunk overlap
+    and repeated lines, then pack chunks until token_budget is used up.
+    Survivors keep their retrieval order, so formula matches placed first
+    and the rank-fused order are what the budget honours.
+    """
+
+    def __init__(self, token_budget=400, score_threshold=1.4, min_k=1, max_k=6,
+                 max_score_gap=0.25, baseline_k=3):
+        self.token_budget = token_budget
+        self.score_threshold = score_threshold
+        self.min_k = min_k
+        self.max_k = max_k
+        self.max_score_gap = max_score_gap
+        self.baseline_k = baseline_k
+
+    def select(self, results):
+        """Threshold and score-gap cutoff; returns (kept, dropped_threshold, dropped_gap)"""
+        scored = sorted((r for r in results if r.get("score") is not None), key=lambda r: r["score"])
+
+        kept = [r for r in scored if r["score"] <= self.score_threshold]
+        dropped_threshold = len(scored) - len(kept)
+        if len(kept) < self.min_k:
+            kept = scored[:self.min_k]
+            dropped_threshold = len(scored) - len(kept)
+
+        cut = len(kept)
+        for i in range(max(1, self.min_k), len(kept)):
+            if kept[i]["score"] - kept[i - 1]["score"] > self.max_score_gap:
+                cut = i
+                break
+        dropped_gap = len(kept) - cut
+
+        # Unscored results (formula and exact keyword hits) always stay in the running
+        keep = {id(r) for r in kept[:cut]}
+        selected = [r for r in results if r.get("score") is None or id(r) in keep]
+        return selected[:self.max_k], dropped_threshold, dropped_gap
+
+    def assemble(self, results):
+        """Return (context_text, selected_results, stats)"""
+        baseline = "\n\n".join(r["content"] for r in results[:self.baseline_k])
+        stats = {
+            "candidates": len(results),
+            "tokens_baseline": count_tokens(baseline),
+            "overlap_chars_removed": 0,
+            "duplicate_lines_removed": 0,
+            "truncated": False
+        }
+
+        candidates, stats["dropped_by_threshold"], stats["dropped_by_gap"] = self.select(results)
+
+        included, parts, selected = [], [], []
+        seen_lines = set()
+        used = 0
+        for result in candidates:
+            text, removed = _strip_overlap(included, result["content"])
+            stats["overlap_chars_removed"] += removed
+
+            lines = []
+            for line in text.splitlines():
+                key = " ".join(line.split()).lower()
+                if len(key) > 3 and key in seen_lines:
+                    stats["duplicate_lines_removed"] += 1
+                    continue
+                lines.append(line)
+            if not "".join(lines).strip():
+                continue
+
+            kept_lines = []
+            for line in lines:
+                cost = count_tokens(line) + 1
+                if used + cost > self.token_budget:
+                    stats["truncated"] = True
+                    break
+                kept_lines.append(line)
+                used += cost
+            if not kept_lines:
+                break
+
+            for line in kept_lines:
+                seen_lines.add(" ".join(line.split()).lower())
+            included.append(result["content"])
+            parts.append("\n".join(kept_lines).strip())
+            selected.append(result)
+            if stats["truncated"]:
+                break
+
+        context_text = "\n\n".join(parts)
+        stats["selected"] = len(selected)
+        stats["tokens_used"] = count_tokens(context_text)
+        stats["tokens_saved"] = stats["tokens_baseline"] - stats["tokens_used"]
+        return context_text, selected, stats
@@ -0,0 +1,310 @@
+import json
+import os
+import re
+import warnings
+
+# Exponents written with superscript letters (xⁿ⁻¹, aᵐ⁺ⁿ); digit-only runs are left to normalize_math_text
+SUPERSCRIPT_RUN = re.compile(r"[ⁿᵐʳᵏˣ⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺]*[ⁿᵐʳᵏˣ⁺][ⁿᵐʳᵏˣ⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺]*")
+SUPERSCRIPT_LETTERS = str.maketrans("ⁿᵐʳᵏˣ⁰¹²³⁴⁵⁶⁷⁸⁹⁻⁺", "nmrkx0123456789-+")
+# Knowledge-base calculus notation rewritten into SymPy calls
+DERIVATIVE_NOTATION = re.compile(r"d/d([a-z])\s*\((.+)\)$")
+INTEGRAL_NOTATION = re.compile(r"∫(.+?)\s*d([a-z])$")
+LIMIT_NOTATION = re.compile(r"lim\s*\(\s*([a-z])\s*(?:→|->)\s*([^)]+)\)\s*(.+)$")
+# Words allowed in a formula fragment; any other word means the fragment is prose
+MATH_WORDS = {
+    "sin", "cos", "tan", "cot", "sec", "csc", "log", "exp", "sqrt", "det", "Derivative", "Integral", "Limit"
+}
+# Prose between formulas: longer words other than function names, short English words, clause punctuation
+PROSE = re.compile(
+    r"\b(?!(?:" + "|".join(sorted(MATH_WORDS | {"lim"})) + r")\b)[A-Za-z]{3,}\b"
+    r"|\b(?:of|is|if|to|as|at|by|be|in|on|or|an|it)\b|[,;:?!]\s|[.?!:]$"
+)
+# Single-letter names the knowledge base uses for arbitrary functions of x (u/v, f+g)
+FUNCTION_PLACEHOLDERS = {"u", "v", "f", "g"}
+# Score for the closest skeleton level matched: exact, general, or only the abstract shape (which rule applies)
+LEVEL_SCORES = {"s": 1.0, "g": 0.8, "a": 0.6}
+# Weights of the supporting features (degree, function set, shared subterms) and their share of the score
+DETAIL_WEIGHTS = {"deg": 1.0, "fn": 1.0, "t": 0.5}
+DETAIL_SHARE = 0.25
+# Skeleton levels, from exact structure to the shape a rule applies to
+CONCRETE, GENERAL, ABSTRACT = 0, 1, 2
+
+
+def _parse(text):
+    """SymPy expression for one formula fragment (knowledge-base or problem notation)"""
+    import sympy as sp
+    from sympy.parsing.sympy_parser import (
+        parse_expr, standard_transformations, split_symbols, implicit_multiplication,
+        implicit_application, convert_xor
+    )
+    from agents.math_text import normalize_math_text
+    from agents.symbolic_solvers import LOCAL_NAMES
+
+    text = text.strip().rstrip(".?!,;:").strip()
+    text = SUPERSCRIPT_RUN.sub(lambda m: "**(" + m.group(0).translate(SUPERSCRIPT_LETTERS) + ")", text)
+    match = DERIVATIVE_NOTATION.match(text)
+    if match:
+        text = f"Derivative({match.group(2)}, {match.group(1)})"
+    match = INTEGRAL_NOTATION.match(text)
+    if match:
+        text = f"Integral({match.group(1)}, {match.group(2)})"
+    match = LIMIT_NOTATION.match(text)
+    if match:
+        text = f"Limit({match.group(3)}, {match.group(1)}, {normalize_math_text(match.group(2))})"
+    # Two-letter runs are implicit products (ax, dx); longer words are prose
+    words = set(re.findall(r"[A-Za-z]{3,}", text))
+    if not text or words - MATH_WORDS or re.search(r"__|[±≤≥<>∪∩|∈Σ]", text):
+        raise ValueError(f"Not a formula: {text!r}")
+
+    local_names = dict(LOCAL_NAMES, Derivative=sp.Derivative, Integral=sp.Integral, Limit=sp.Limit)
+    # Knowledge-base formulas write products without operators (ax², uv), so symbols are split too
+    transformations = standard_transformations + (
+        split_symbols, implicit_multiplication, implicit_application, convert_xor
+    )
+    with warnings.catch_warnings():
+        # parse_expr warns about "2(x+1)"-style calls it then treats as products
+        warnings.simplefilter("ignore", SyntaxWarning)
+        return parse_expr(normalize_math_text(text), local_dict=local_names, transformations=transformations)
+
+
+def _main_variable(expr):
+    import sympy as sp
+
+    if isinstance(expr, sp.Limit):
+        return expr.args[1]
+    if isinstance(expr, (sp.Derivative, sp.Integral)):
+        return expr.args[1][0]
+    names = {s.name: s for s in expr.free_symbols}
+    for name in ("x", "t", "y", "z"):
+        if name in names:
+            return names[name]
+    return sorted(expr.free_symbols, key=lambda s: s.name)[0] if expr.free_symbols else None
+
+
+def _depends(expr, var):
+    return (var is not None and expr.has(var)) or any(
+        s.name in FUNCTION_PLACEHOLDERS for s in getattr(expr, "free_symbols", ())
+    )
+
+
+def _skeleton(expr, var, level=CONCRETE, subterms=None):
+    """Operator tree with constants as c and the main variable as x
+
+    GENERAL also writes every constant exponent as n, so x²-5x+6 and
+    (x+2)⁷ meet ax²+bx+c and (a+b)ⁿ. ABSTRACT further reduces every function
+    of x to F, so sin(x)/x and u/v (the quotient rule) share Mul(F,Pow(F,-1)).
+    """
+    import sympy as sp
+
+    if not _depends(expr, var):
+        return "c"
+    if expr == var or (isinstance(expr, sp.Symbol) and expr.name in FUNCTION_PLACEHOLDERS):
+        return "F" if level == ABSTRACT else "x"
+
+    def inner(arg):
+        return _skeleton(arg, var, level, subterms)
+
+    if isinstance(expr, (sp.Derivative, sp.Integral, sp.Limit)):
+        shape = f"{type(expr).__name__}({inner(expr.args[0])})"
+    elif isinstance(expr, (sp.Add, sp.Mul)):
+        parts = [inner(arg) for arg in expr.args]
+        if isinstance(expr, sp.Mul):
+            parts = [p for p in parts if p != "c"]
+        elif level == ABSTRACT:
+            parts = list(set(parts))
+        shape = parts[0] if len(parts) == 1 else f"{type(expr).__name__}({','.join(sorted(parts))})"
+    elif isinstance(expr, sp.Pow):
+        base, exponent = expr.args
+        negative = exponent.is_number and exponent < 0
+        if _depends(exponent, var):
+            shape = "F" if level == ABSTRACT else f"Pow({inner(base)},{inner(exponent)})"
+        elif level == ABSTRACT:
+            shape = "Pow(F,-1)" if negative else "Pow(F,n)"
+        else:
+            power = str(exponent) if exponent.is_number and level == CONCRETE else "-1" if negative else "n"
+            shape = f"Pow({inner(base)},{power})"
+    elif isinstance(expr, sp.Function) and level == ABSTRACT:
+        shape = "F" if all(arg == var for arg in expr.args) else "F(F)"
+    else:
+        shape = f"{type(expr).__name__}({','.join(inner(arg) for arg in expr.args)})"
+
+    if subterms is not None and shape not in ("c", "x", "F"):
+        subterms.add(shape)
+    return shape
+
+
+def expression_signature(expr):
+    """Structural signature of a SymPy expression or equation: skeletons, degree, function set
+
+    Equations contribute lhs - rhs. The result is plain JSON, so it can be
+    computed in the sandbox worker and matched in the app process without SymPy.
+    """
+    import sympy as sp
+
+    if isinstance(expr, sp.Equality):
+        expr = expr.lhs - expr.rhs
+    var = _main_variable(expr)
+    subterms = set()
+    skeleton = _skeleton(expr, var, CONCRETE, subterms)
+    degree = None
+    if var is not None and not expr.atoms(sp.Function, sp.Derivative, sp.Integral, sp.Limit):
+        try:
+            degree = int(sp.degree(expr, var)) if expr.is_polynomial(var) else None
+        except (sp.PolynomialError, TypeError, ValueError):
+            degree = None
+    functions = {type(f).__name__ for f in expr.atoms(sp.Function) if not isinstance(f, sp.core.function.AppliedUndef)}
+    functions |= {type(e).__name__ for e in expr.atoms(sp.Derivative, sp.Integral, sp.Limit)}
+    if any(isinstance(p, sp.Pow) and p.exp == sp.Rational(1, 2) for p in expr.atoms(sp.Pow)):
+        functions.add("sqrt")
+    return {
+        "skeleton": skeleton,
+        "general": _skeleton(expr, var, GENERAL),
+        "abstract": _skeleton(expr, var, ABSTRACT),
+        "degree": degree,
+        "functions": sorted(functions),
+        "subterms": sorted(subterms - {skeleton})
+    }
+
+
+def formula_signatures(text):
+    """Signatures of every formula fragment in a line of text; prose and unparsable parts are skipped"""
+    signatures = []
+    for fragment in PROSE.split(text):
+        # Each side on its own: "ax² + bx + c = 0" is found by its left side, "d/dx(sin x) = cos x" by either
+        for side in fragment.split("="):
+            if not side.strip():
+                continue
+            try:
+                signature = expression_signature(_parse(side))
+            except Exception:
+                continue
+            # A lone symbol or constant ("x = ...", "= 0") says nothing about structure
+            if signature["skeleton"] not in ("c", "x"):
+                signatures.append(signature)
+    return signatures
+
+
+def result_signatures(result, problem_text):
+    """Signatures for the expression a symbolic solver worked on, else for the math in the problem text"""
+    import sympy as sp
+
+    try:
+        method = result.get("method")
+        if result.get("success") and result.get("expression"):
+            expr = sp.sympify(result["expression"])
+            var = sp.Symbol(result.get("variable") or "x")
+            wrapper = {"derivative": sp.Derivative, "integral": sp.Integral,
+                       "definite_integral": sp.Integral}.get(method)
+            if wrapper is not None:
+                expr = wrapper(expr, var)
+            elif method == "limit":
+                expr = sp.Limit(expr, var, 0)
+            return [expression_signature(expr)]
+        if result.get("success") and result.get("equations"):
+            return [expression_signature(sp.sympify(eq)) for eq in result["equations"]]
+    except (sp.SympifyError, TypeError, ValueError):
+        pass
+    return formula_signatures(problem_text)
+
+
+def _features(signature):
+    features = {f"s:{signature['skeleton']}", f"g:{signature['general']}", f"a:{signature['abstract']}"}
+    if signature.get("degree") is not None:
+        features.add(f"deg:{signature['degree']}")
+    features.update(f"fn:{name}" for name in signature.get("functions", ()))
+    features.update(f"t:{term}" for term in signature.get("subterms", ()))
+    return features
+
+
+def _kind(feature):
+    return feature.split(":", 1)[0]
+
+
+class FormulaIndex:
+    """Knowledge-base formulas keyed by structural signature
+
+    Each indexed line keeps the signatures of the formulas in it. A query
+    signature (from the expression the solver extracted) is matched through
+    an inverted index over signature features, so lookups are dictionary
+    hits with no SymPy involved; only building the index needs SymPy.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self.postings = {}
+        for entry_id, entry in enumerate(self.entries):
+            for signature_id, signature in enumerate(entry["signatures"]):
+                for feature in _features(signature):
+                    self.postings.setdefault(feature, []).append((entry_id, signature_id))
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, knowledge_base_path="rag/knowledge_base"):
+        """Parse every formula line of the knowledge-base .txt files"""
+        entries = []
+        for name in sorted(os.listdir(knowledge_base_path)):
+            if not name.endswith(".txt"):
+                continue
+            with open(os.path.join(knowledge_base_path, name), 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            heading = None
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.endswith(":"):
+                    heading = line
+                    continue
+                content = f"{heading} {line.lstrip('- ')}" if line.startswith("-") and heading else line
+                signatures = formula_signatures(line.lstrip("- "))
+                if signatures:
+                    entries.append({"source": name, "content": content, "signatures": signatures})
+        return cls(entries)
+
+    def search(self, signatures, k=2, min_score=0.5):
+        """[{"content", "source", "match", "skeleton"}] for the best-matching lines, best first
+
+        A line must share at least the abstract shape with a query signature;
+        degree, functions and subterms in common then rank lines of one shape.
+        """
+        best = {}
+        for query in signatures or ():
+            features = _features(query)
+            details = sum(DETAIL_WEIGHTS.get(_kind(feature), 0.0) for feature in features)
+            levels, matched = {}, {}
+            for feature in features:
+                kind = _kind(feature)
+                for key in self.postings.get(feature, ()):
+                    if kind in LEVEL_SCORES:
+                        levels[key] = max(levels.get(key, 0.0), LEVEL_SCORES[kind])
+                    else:
+                        matched[key] = matched.get(key, 0.0) + DETAIL_WEIGHTS[kind]
+            for key, level in levels.items():
+                detail = matched.get(key, 0.0) / details if details else 1.0
+                score = (1 - DETAIL_SHARE) * level + DETAIL_SHARE * detail
+                if score > best.get(key[0], (0.0, None))[0]:
+                    best[key[0]] = (score, key[1])
+
+        ranked = sorted(best.items(), key=lambda item: -item[1][0])
+        return [
+            {
+                "content": self.entries[entry_id]["content"],
+                "source": self.entries[entry_id]["source"],
+                "match": round(score, 3),
+                "skeleton": self.entries[entry_id]["signatures"][signature_id]["skeleton"]
+            }
+            for entry_id, (score, signature_id) in ranked[:k] if score >= min_score
+        ]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)["entries"])
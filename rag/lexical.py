@@ -0,0 +1,112 @@
+import json
+import math
+import os
+import re
+
+# Filler words that say nothing about which formula is wanted
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "find", "for", "from", "how", "if", "in", "is",
+    "it", "of", "on", "or", "the", "to", "what", "when", "with"
+}
+# Queries with more content words than this are questions, not keyword lookups
+MAX_KEYWORD_TERMS = 4
+
+
+def tokenize(text):
+    """Lowercase word tokens with a light plural strip ("Permutations" -> "permutation", "nCr" -> "ncr")"""
+    tokens = []
+    # "2×2" and "2 x 2" are both written "2x2" in queries
+    text = re.sub(r"(\d)\s*[×x]\s*(\d)", r"\1x\2", text.lower())
+    for token in re.findall(r"\w+", text):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def rrf_fuse(rankings, k=60, limit=None):
+    """Reciprocal rank fusion of ranked lists of keys; returns [(key, score)], best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda item: -item[1])
+    return fused[:limit] if limit else fused
+
+
+class BM25Index:
+    """In-process BM25 inverted index over the knowledge-base chunks
+
+    Built from the same chunks as the FAISS store and saved next to it as
+    JSON, texts included, so keyword lookups can be answered without loading
+    the embedding model or the vector store.
+    """
+
+    def __init__(self, texts=(), k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.texts = list(texts)
+        self.lengths = []
+        self.postings = {}
+        for doc, text in enumerate(self.texts):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                self.postings.setdefault(token, []).append((doc, tf))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def __len__(self):
+        return len(self.texts)
+
+    def idf(self, term):
+        n = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.texts) - n + 0.5) / (n + 0.5))
+
+    def search(self, query, k=3):
+        """[{"doc", "content", "bm25", "matched"}] for the top k chunks, best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores, matched = {}, {}
+        for term in terms:
+            idf = self.idf(term)
+            for doc, tf in self.postings.get(term, ()):
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc] / (self.avg_length or 1))
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / norm
+                matched[doc] = matched.get(doc, 0) + 1
+        ranked = sorted(scores, key=lambda doc: -scores[doc])[:k]
+        return [
+            {"doc": doc, "content": self.texts[doc], "bm25": scores[doc], "matched": matched[doc] / len(terms)}
+            for doc in ranked
+        ]
+
+    def confident(self, query, hits, margin=1.5):
+        """True when the query is a short keyword lookup whose best chunk clearly stands out"""
+        terms = set(tokenize(query))
+        if not hits or not terms or len(terms) > MAX_KEYWORD_TERMS:
+            return False
+        if hits[0]["matched"] < 1.0:
+            return False
+        return len(hits) == 1 or hits[0]["bm25"] >= margin * hits[1]["bm25"]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "k1": self.k1, "b": self.b, "texts": self.texts, "lengths": self.lengths,
+                "postings": self.postings
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.texts, index.lengths = data["texts"], data["lengths"]
+        index.postings = {term: [tuple(p) for p in postings] for term, postings in data["postings"].items()}
+        index.avg_length = sum(index.lengths) / len(index.lengths) if index.lengths else 0.0
+        return index
@@ -1,41 +1,78 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_core.documents import Document
+from utils.tracing import span, tracer
+from rag.lexical import BM25Index, rrf_fuse
+from rag.formulas import FormulaIndex
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Define embedding model name as constant
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # Smaller, faster model
+# BM25 index over the same chunks, saved next to the FAISS files
+LEXICAL_INDEX_PATH = "rag/vectorstore/lexical.json"
+# Knowledge-base formulas keyed by SymPy structural signature
+FORMULA_INDEX_PATH = "rag/vectorstore/formulas.json"
+# A keyword-only answer keeps the chunks scoring at least this fraction of the best one
+LEXICAL_KEEP_RATIO = 0.5
+
+
+def score_label(result):
+    """Display form of a hit's score; keyword and formula hits have none to show"""
+    if result.get("score") is not None:
+        return f"{result['score']:.3f}"
+    return {"lexical": "keyword match", "formula": "formula match"}.get(result.get("source"), "unscored")
 
-# Custom TextLoader with UTF-8 encoding
-class UTF8TextLoader(TextLoader):
-    def __init__(self, file_path: str):
-        super().__init__(file_path, encoding='utf-8')
 
 class RAGPipeline:
-    def __init__(self, knowledge_base_path="rag/knowledge_base"):
+    """Knowledge-base retrieval: FAISS dense search plus a BM25 lexical index
+
+    retrieval_mode "hybrid" runs BM25 first and answers confident keyword
+    queries ("Bayes theorem", "nCr") from it alone; anything else is fused
+    with the dense results by reciprocal rank fusion. "dense" and "lexical"
+    use one index only. retrieve_formulas matches the symbolic solver's
+    expression against the formulas by structure (see rag/formulas.py).
+    """
+
+    def __init__(self, knowledge_base_path="rag/knowledge_base", retrieval_mode="hybrid"):
         self.knowledge_base_path = knowledge_base_path
-        # Use consistent embedding model
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        self.retrieval_mode = retrieval_mode
+        self.lexical = None
+        self._formulas = None
+        self._formulas_lock = threading.Lock()
+        # sentence-transformers/torch and langchain_community load on first use
+        self._embeddings = None
+        self._embeddings_lock = threading.Lock()
         self.vectorstore = None
+    
+    @property
+    def embeddings(self):
+        """The embedding model, loaded on first use"""
+        with self._embeddings_lock:
+            if self._embeddings is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+                # Use consistent embedding model
+                self._embeddings = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL,
+                    model_kwargs={'device': 'cpu'},
+                    encode_kwargs={'normalize_embeddings': True}
+                )
+            return self._embeddings
         
     def build_vectorstore(self):
         """Load documents and create vector store"""
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain_community.document_loaders import DirectoryLoader, TextLoader
+        from langchain_community.vectorstores import FAISS
+
         print("📚 Loading knowledge base...")
         
         # Load all text files with UTF-8 encoding
         loader = DirectoryLoader(
             self.knowledge_base_path,
             glob="**/*.txt",
-            loader_cls=UTF8TextLoader,
+            loader_cls=TextLoader,
+            loader_kwargs={"encoding": "utf-8"},
             show_progress=True
         )
         
@@ -69,9 +106,69 @@ class RAGPipeline:
         print(f"✅ Vector store created with {len(chunks)} chunks!")
         print(f"💾 Saved to: rag/vectorstore")
         print(f"📐 Using embedding model: {EMBEDDING_MODEL}")
+        self._build_lexical()
+        with self._formulas_lock:
+            self._formulas = FormulaIndex.build(self.knowledge_base_path)
+            self._formulas.save(FORMULA_INDEX_PATH)
+        print(f"🧮 Formula index built with {len(self._formulas)} formulas")
+
+    def _build_lexical(self):
+        """BM25 index over the chunks in the FAISS docstore, saved alongside it"""
+        docstore = self.vectorstore.docstore
+        texts = [docstore.search(doc_id).page_content for doc_id in self.vectorstore.index_to_docstore_id.values()]
+        self.lexical = BM25Index(texts)
+        self.lexical.save(LEXICAL_INDEX_PATH)
+        print(f"🔤 Lexical index built with {len(texts)} chunks")
+
+    @property
+    def formulas(self):
+        """The structural formula index, loaded (or built with SymPy and saved) on first use"""
+        with self._formulas_lock:
+            if self._formulas is None:
+                try:
+                    self._formulas = FormulaIndex.load(FORMULA_INDEX_PATH)
+                except (OSError, ValueError, KeyError):
+                    print("🔄 Building formula index from the knowledge base...")
+                    self._formulas = FormulaIndex.build(self.knowledge_base_path)
+                    os.makedirs(os.path.dirname(FORMULA_INDEX_PATH), exist_ok=True)
+                    self._formulas.save(FORMULA_INDEX_PATH)
+                    print(f"✅ Formula index built with {len(self._formulas)} formulas")
+            return self._formulas
+
+    def retrieve_formulas(self, signatures, k=2):
+        """Knowledge-base lines whose formulas match the problem's expression structure
+
+        `signatures` come from the symbolic solver (sympy_result["signatures"]).
+        Results have score None and source "formula", like keyword-only hits.
+        """
+        if not signatures:
+            return []
+        try:
+            with span("retrieval.formulas"):
+                hits = self.formulas.search(signatures, k=k)
+            return [{"content": h["content"], "score": None, "match": h["match"], "source": "formula"} for h in hits]
+        except Exception as e:
+            print(f"⚠️ Error during formula retrieval: {e}")
+            return []
+
+    def load_lexical(self):
+        """Load the BM25 index, building the vector store (and with it the index) if it is missing"""
+        if os.path.exists(LEXICAL_INDEX_PATH):
+            try:
+                self.lexical = BM25Index.load(LEXICAL_INDEX_PATH)
+                return self.lexical
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Error loading lexical index: {e}")
+        if not self.vectorstore:
+            self.load_vectorstore()
+        if self.lexical is None and self.vectorstore:
+            self._build_lexical()
+        return self.lexical
         
     def load_vectorstore(self):
         """Load existing vector store"""
+        from langchain_community.vectorstores import FAISS
+
         if os.path.exists("rag/vectorstore/index.faiss"):
             try:
                 print("📂 Loading existing vector store...")
@@ -81,6 +178,9 @@ class RAGPipeline:
                     allow_dangerous_deserialization=True
                 )
                 print("✅ Vector store loaded successfully!")
+                if not os.path.exists(LEXICAL_INDEX_PATH):
+                    print("🔄 Lexical index not found, rebuilding from the vector store...")
+                    self._build_lexical()
             except Exception as e:
                 print(f"⚠️ Error loading vector store: {e}")
                 print("🔄 Rebuilding vector store...")
@@ -89,16 +189,47 @@ class RAGPipeline:
             print("⚠️ Vector store not found, building new one...")
             self.build_vectorstore()
     
-    def retrieve_context(self, query, k=3):
-        """Retrieve relevant context for a query"""
-        if not self.vectorstore:
-            self.load_vectorstore()
-        
+    def retrieve_context(self, query, k=3, mode=None):
+        """Retrieve relevant context for a query
+
+        Dense results carry their FAISS L2 distance as "score"; chunks found
+        only by BM25 have score None (ContextAssembler always keeps those).
+        "source" says which index found each chunk.
+        """
+        mode = mode or self.retrieval_mode
         try:
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
-            context = [{"content": doc.page_content, "score": float(score)} 
-                       for doc, score in results]
-            return context
+            lexical = []
+            if mode != "dense":
+                if self.lexical is None:
+                    self.load_lexical()
+                if self.lexical is not None:
+                    with span("retrieval.lexical"):
+                        hits = self.lexical.search(query, k=k)
+                    lexical = [{"content": h["content"], "score": None, "bm25": h["bm25"], "source": "lexical"}
+                               for h in hits]
+                    if mode == "lexical" or self.lexical.confident(query, hits):
+                        tracer.count("retrieval.lexical_only")
+                        return [r for r in lexical if r["bm25"] >= LEXICAL_KEEP_RATIO * lexical[0]["bm25"]]
+
+            if not self.vectorstore:
+                self.load_vectorstore()
+            with span("retrieval.embed"):
+                embedding = self.embeddings.embed_query(query)
+            with span("retrieval.search"):
+                results = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k)
+            dense = [{"content": doc.page_content, "score": float(score), "source": "dense"}
+                     for doc, score in results]
+            if not lexical:
+                return dense
+
+            tracer.count("retrieval.fused")
+            by_content = {r["content"]: r for r in lexical}
+            for r in dense:
+                if r["content"] in by_content:
+                    r.update(bm25=by_content[r["content"]]["bm25"], source="hybrid")
+                by_content[r["content"]] = r
+            fused = rrf_fuse([[r["content"] for r in dense], [r["content"] for r in lexical]], limit=k)
+            return [dict(by_content[content], rrf=score) for content, score in fused]
         except Exception as e:
             print(f"⚠️ Error during retrieval: {e}")
             return []
@@ -118,7 +249,7 @@ if __name__ == "__main__":
         print(f"\n📝 Query: '{test_query}'")
         print("📊 Top results:")
         for i, result in enumerate(results, 1):
-            print(f"\n{i}. Score: {result['score']:.3f}")
+            print(f"\n{i}. Score: {score_label(result)}")
             print(f"   Content: {result['content'][:100]}...")
     else:
         print("⚠️ No results found")
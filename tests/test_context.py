@@ -0,0 +1,26 @@
+from rag.context import ContextAssembler
+
+
+def chunk(words, score, source="dense"):
+    return {"content": " ".join(f"{words}{i}" for i in range(120)), "score": score, "source": source}
+
+
+def test_formula_hit_survives_a_full_budget():
+    formula = {"content": "Quadratic Formula: x = (-b ± √(b²-4ac)) / 2a", "score": None, "source": "formula"}
+    dense = [chunk("alpha", 0.40), chunk("beta", 0.45), chunk("gamma", 0.50)]
+
+    # The solver puts formula matches ahead of the text search results
+    context_text, selected, stats = ContextAssembler(token_budget=400).assemble([formula] + dense)
+
+    assert stats["truncated"]
+    assert selected[0] is formula
+    assert context_text.startswith("Quadratic Formula")
+
+
+def test_selection_keeps_retrieval_order():
+    # Rank-fused order, not L2 order: a keyword hit ranked between two dense hits
+    results = [chunk("a", 0.9), {"content": "keyword hit", "score": None, "source": "lexical"}, chunk("b", 0.5)]
+
+    kept, _, _ = ContextAssembler(max_score_gap=1.0).select(results)
+
+    assert kept == results
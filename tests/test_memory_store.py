@@ -0,0 +1,126 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+from memory.store import MemoryStore
+
+
+def interaction(topic="algebra", problem="Solve x + 1 = 2"):
+    return {
+        "original_input": problem,
+        "input_type": "text",
+        "parsed_problem": {"topic": topic, "problem_text": problem},
+        "verification": {"is_correct": True},
+        "feedback": "correct"
+    }
+
+
+def open_store(tmp_path, **kwargs):
+    kwargs.setdefault("commit_interval", 0.05)
+    kwargs.setdefault("hot_max_age_days", None)
+    kwargs.setdefault("hot_max_bytes", None)
+    # Retention runs only where a test calls it, not from the writer thread
+    kwargs.setdefault("retention_interval", float("inf"))
+    return MemoryStore(str(tmp_path / "storage.jsonl"), **kwargs)
+
+
+def lines(tmp_path):
+    return (tmp_path / "storage.jsonl").read_text(encoding="utf-8").splitlines()
+
+
+def test_stores_in_one_commit_are_durable_after_flush(tmp_path):
+    store = open_store(tmp_path)
+    ids = [store.store_interaction(interaction()) for _ in range(5)]
+
+    assert store.flush(timeout=5)
+    assert [json.loads(line)["id"] for line in lines(tmp_path)] == ids
+    assert store.stats()["total"] == 5
+    store.close()
+
+
+def test_other_processes_see_new_memories_by_tailing_the_log(tmp_path):
+    writer, reader = open_store(tmp_path), open_store(tmp_path)
+    memory_id = writer.store_interaction(interaction())
+    writer.flush(timeout=5)
+
+    assert [m["id"] for m in reader.load_memories()] == [memory_id]
+    writer.close()
+    reader.close()
+
+
+def test_concurrent_writers_never_interleave_lines(tmp_path):
+    stores = [open_store(tmp_path, commit_interval=0.0) for _ in range(3)]
+
+    def write(store):
+        for _ in range(20):
+            store.store_interaction(interaction())
+
+    threads = [threading.Thread(target=write, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for store in stores:
+        store.flush(timeout=5)
+
+    assert len({json.loads(line)["id"] for line in lines(tmp_path)}) == 60
+    assert stores[0].stats()["total"] == 60
+    for store in stores:
+        store.close()
+
+
+def test_retention_moves_old_memories_to_the_archive(tmp_path):
+    store = open_store(tmp_path, hot_max_count=None)
+    ids = [store.store_interaction(interaction(topic=f"t{i}")) for i in range(10)]
+    store.flush(timeout=5)
+    store.hot_max_count = 4
+
+    result = store.enforce_retention()
+
+    assert result["archived"] == 10 - int(4 * 0.8)
+    assert len(lines(tmp_path)) == result["hot"]
+    assert store.get_memory(ids[0])["id"] == ids[0]
+    assert [m["id"] for m in store.iter_memories()] == ids
+    assert store.stats()["total"] == 10
+    store.close()
+
+
+def test_pruned_archive_segments_leave_the_stats(tmp_path):
+    store = open_store(tmp_path, hot_max_count=None, hot_max_age_days=30, archive_max_age_days=60)
+    store.store_interaction(interaction(topic="old"))
+    store.store_interaction(interaction(topic="new"))
+    store.flush(timeout=5)
+
+    store.enforce_retention(now=datetime.now() + timedelta(days=40))
+    assert store.stats()["by_topic"] == {"old": 1, "new": 1}
+    result = store.enforce_retention(now=datetime.now() + timedelta(days=100))
+
+    stats = store.stats()
+    assert result["pruned"] == 2
+    assert stats["total"] == 0
+    assert stats["by_topic"] == {}
+    assert stats["archive"]["count"] == 0
+    store.close()
+
+
+def test_clear_drops_a_batch_the_writer_already_took(tmp_path):
+    store = open_store(tmp_path)
+    memory = {"id": "late", "timestamp": datetime.now().isoformat()}
+    with store._cond:
+        generation = store._generation
+
+    store.clear_memories()
+    store._commit([memory], generation)
+
+    assert lines(tmp_path) == []
+    assert store.stats()["total"] == 0
+    store.close()
+
+
+def test_stores_after_close_are_still_written(tmp_path):
+    store = open_store(tmp_path)
+    store.close()
+
+    memory_id = store.store_interaction(interaction())
+
+    assert [json.loads(line)["id"] for line in lines(tmp_path)] == [memory_id]
@@ -0,0 +1,80 @@
+import pytest
+
+from agents.symbolic_solvers import solve_symbolically
+
+
+@pytest.mark.parametrize("problem", [
+    "Solve x^2-5x+6 > 0, x = 1",
+    "Solve x ≤ 3, x = 1",
+    "Solve x^2 = 4 where x ≠ 2",
+    "Solve x = 1 = y",
+])
+def test_relations_the_solver_cannot_honour_fall_back_to_the_llm(problem):
+    assert not solve_symbolically("algebra", problem)["success"]
+
+
+def test_equation_systems_still_solve():
+    result = solve_symbolically("algebra", "Solve x+y=3, x-y=1")
+    assert result["roots"] == [{"x": "2", "y": "1"}]
+
+
+@pytest.mark.parametrize("problem", [
+    "Find the eigenvectors of [[2,0],[0,3]]",
+    "Find the determinant of the inverse of [[1,2],[3,4]]",
+    "Find the determinant of A^2 where A=[[1,2],[3,4]]",
+    "Find the eigenvalues of A^2 where A=[[1,2],[3,4]]",
+    "Find det(A^T) where A = [[1,2],[3,4]]",
+    "Find det(2A) for A=[[1,2],[3,4]]",
+])
+def test_matrix_requests_the_solvers_would_misread_fall_back_to_the_llm(problem):
+    assert not solve_symbolically("linear_algebra", problem)["success"]
+
+
+def test_plain_matrix_requests_still_solve():
+    assert solve_symbolically("linear_algebra", "Find the determinant of A = [[1,2],[3,4]]")["solution"] == "-2"
+    assert solve_symbolically("linear_algebra", "Find A^-1 for A = [[1,2],[3,4]]")["method"] == "inverse"
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("Find P(B).", "13/25"),
+    ("Find P(A'|B).", "7/13"),
+    ("Find P(A|B).", "6/13"),
+])
+def test_bayes_answers_the_probability_asked_for(question, answer):
+    result = solve_symbolically("probability", f"P(A)=0.3, P(B|A)=0.8, P(B|A')=0.4. {question}")
+    assert result["solution"] == answer
+
+
+def test_bayes_without_a_clear_target_falls_back_to_the_llm():
+    assert not solve_symbolically("probability", "P(A)=0.3, P(B|A)=0.8, P(B|A')=0.4. What is the chance?")["success"]
+
+
+@pytest.mark.parametrize("problem", [
+    "A die is rolled 10 times. Find the probability of getting exactly 3 even numbers.",
+    "A die is rolled 10 times. Find the probability of exactly 3 numbers greater than 4.",
+    "Two dice are rolled 10 times. Find the probability that the sum is 8 exactly 2 times.",
+    "A coin is tossed 5 times. Find the probability of exactly 7 heads.",
+])
+def test_binomial_without_a_single_fair_outcome_falls_back_to_the_llm(problem):
+    assert not solve_symbolically("probability", problem)["success"]
+
+
+def test_binomial_infers_p_for_one_named_face():
+    result = solve_symbolically("probability", "A die is rolled 6 times. Find the probability of at least 1 six.")
+    assert (result["p"], result["solution"]) == ("1/6", "31031/46656")
+
+
+@pytest.mark.parametrize("topic, problem", [
+    ("calculus", "lim x->0 1/x"),
+    ("calculus", "lim x->oo sin(x)"),
+    ("algebra", "Solve sin(x) = 0"),
+    ("algebra", "Solve x^2 = 4 for positive x"),
+])
+def test_limits_and_equations_without_a_single_answer_fall_back_to_the_llm(topic, problem):
+    assert not solve_symbolically(topic, problem)["success"]
+
+
+def test_one_sided_limits_and_real_domains_are_honoured():
+    assert solve_symbolically("calculus", "lim x->0+ 1/x")["solution"] == "oo"
+    assert solve_symbolically("algebra", "Solve x^2+1=0 over the reals")["roots"] == []
+    assert solve_symbolically("algebra", "Solve x^2+1=0")["roots"] == [{"x": "-I"}, {"x": "I"}]
@@ -0,0 +1,33 @@
+from multimodal.worksheet import split_problems
+
+
+def detection(text, top, left=10, height=20):
+    """readtext (box, text, confidence) for one word box"""
+    right = left + 10 * len(text)
+    box = [[left, top], [right, top], [right, top + height], [left, top + height]]
+    return box, text, 0.9
+
+
+def test_multiple_choice_options_stay_with_their_question():
+    page = [
+        detection("Worksheet 3", 0),
+        detection("1. Solve 2x + 3 = 7", 40),
+        detection("(1) x = 1", 70),
+        detection("(2) x = 2", 100),
+        detection("3) x = 3", 130),
+        detection("Q2 Find the derivative of x^2", 180),
+        detection("1) 2x", 210),
+        detection("2) x", 240),
+    ]
+
+    problems = split_problems(page, source="mcq.png", page=1)
+
+    assert [p["number"] for p in problems] == ["1", "2"]
+    assert problems[0]["text"] == "Solve 2x + 3 = 7 (1) x = 1 (2) x = 2 3) x = 3"
+    assert problems[1]["text"] == "Find the derivative of x^2 1) 2x 2) x"
+
+
+def test_unnumbered_problems_split_at_gaps():
+    page = [detection("Solve x + 1 = 2", 0), detection("Integrate x^2", 100)]
+
+    assert [p["text"] for p in split_problems(page)] == ["Solve x + 1 = 2", "Integrate x^2"]
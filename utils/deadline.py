@@ -0,0 +1,62 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Named latency budgets in seconds; None means no deadline
+BUDGETS = {"fast": 8.0, "thorough": None}
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The current request's latency budget ran out"""
+
+
+def resolve_budget(budget):
+    """Seconds for a budget given as a number, a BUDGETS name or None"""
+    if budget is None or isinstance(budget, (int, float)):
+        return budget
+    if budget not in BUDGETS:
+        raise ValueError(f"Unknown latency budget '{budget}', expected seconds or one of {', '.join(BUDGETS)}")
+    return BUDGETS[budget]
+
+
+@contextmanager
+def deadline(seconds):
+    """Run the block under a deadline `seconds` from now (never later than an enclosing one)"""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def stage_deadline(share):
+    """Deadline for one stage: `share` of whatever budget is left"""
+    left = remaining()
+    return deadline(None if left is None or share is None else left * share)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None when there is none"""
+    at = _deadline.get()
+    return None if at is None else max(0.0, at - time.monotonic())
+
+
+def timeout_for(default=None):
+    """A timeout that respects the current deadline: min(default, remaining)"""
+    left = remaining()
+    if left is None:
+        return default
+    return left if default is None else min(default, left)
+
+
+def check():
+    """Raise DeadlineExceeded if the current deadline has passed"""
+    if remaining() == 0.0:
+        raise DeadlineExceeded("Latency budget exhausted")
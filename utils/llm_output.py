@@ -0,0 +1,16 @@
+import json
+
+
+def extract_json(content):
+    """Parse a JSON object out of an LLM reply, tolerating markdown fences"""
+    content = content.strip()
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    else:
+        # Drop any chatter around the outermost object
+        start, end = content.find("{"), content.rfind("}")
+        if start != -1 and end > start:
+            content = content[start:end + 1]
+    return json.loads(content.strip())
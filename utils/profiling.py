@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from utils.tracing import _running_task, tracer
+
+# tracemalloc and its peak are process-wide, so one profiled run at a time measures memory
+_memory_lock = threading.Lock()
+_memory_busy = False
+_memory_started = False
+
+
+def _start_memory():
+    """Claim memory measurement; False while another profiled run holds it"""
+    global _memory_busy, _memory_started
+    with _memory_lock:
+        if _memory_busy:
+            return False
+        _memory_busy = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory_started = True
+        tracemalloc.reset_peak()
+        return True
+
+
+def _stop_memory():
+    global _memory_busy, _memory_started
+    with _memory_lock:
+        _memory_busy = False
+        if _memory_started:
+            tracemalloc.stop()
+            _memory_started = False
+
+
+class Profiler:
+    """Opt-in sampling profiler for individual pipeline runs
+
+    A profiled run gets a sampler thread that reads sys._current_frames()
+    every `interval` seconds. Each sample of the run's thread, and of any
+    thread inside one of the run's spans, is tagged with the span path it
+    was taken in ("pipeline;solve;retrieval;retrieval.embed"), so the
+    collapsed-stack file splits time by stage before splitting it by
+    function. tracemalloc records the allocation peak per stage; it sees the
+    whole process, so only one profiled run at a time measures memory and
+    its figures include whatever else the process allocated meanwhile.
+
+    Runs that are not picked cost one random() call; the tracer only tracks
+    threads while a profile is running.
+    """
+
+    def __init__(self, directory="profiles", percent=100.0, interval=0.005, memory=True, top_allocations=10):
+        self.directory = directory
+        self.percent = percent
+        self.interval = interval
+        self.memory = memory
+        self.top_allocations = top_allocations
+        os.makedirs(directory, exist_ok=True)
+
+    def sampled(self):
+        """Whether to profile the next run (`percent` of runs are picked at random)"""
+        return self.percent >= 100 or random.random() * 100 < self.percent
+
+    @contextmanager
+    def profile(self, request_id, trace_id=None, label="run", **attributes):
+        """Sample the calling thread, and every thread working on trace_id, until the block exits
+
+        Yields the ProfileSession; its `paths` are set once the files are written.
+        """
+        session = ProfileSession(self, request_id, trace_id, label, attributes)
+        session.start()
+        try:
+            yield session
+        finally:
+            session.stop()
+            session.write()
+
+
+class ProfileSession:
+    """Samples collected for one profiled block"""
+
+    def __init__(self, profiler, request_id, trace_id, label, attributes):
+        self.profiler = profiler
+        self.request_id = request_id
+        self.trace_id = trace_id
+        self.label = label
+        self.attributes = attributes
+        self.stacks = {}
+        self.stage_samples = {}
+        self.stage_memory = {}
+        self.samples = 0
+        self.sampler_seconds = 0.0
+        self.paths = None
+        self._names = {}
+        # Event loop -> the thread running it, found once per loop
+        self._loop_threads = {}
+        self._done = threading.Event()
+
+    def start(self):
+        self.thread_ident = threading.get_ident()
+        self.task = _running_task()
+        if self.task is not None:
+            self._loop_threads[self.task.get_loop()] = self.thread_ident
+        # The span the block was opened in; the calling thread is in it until a stage starts
+        root = tracer.current_span()
+        self.root_path = root.path() if root is not None else self.label
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.measures_memory = self.profiler.memory and _start_memory()
+        self._watch = tracer.watch_threads()
+        self._watch.__enter__()
+        self._sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.request_id}", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._done.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._start
+        self._watch.__exit__(None, None, None)
+        self.memory = None
+        if self.profiler.memory and not self.measures_memory:
+            self.memory = {"skipped": "another profiled run was measuring memory"}
+        elif self.measures_memory:
+            self.memory = {
+                "peak_bytes": tracemalloc.get_traced_memory()[1],
+                "stage_peak_bytes": self.stage_memory,
+                "top_allocations": self._top_allocations()
+            }
+            _stop_memory()
+
+    def _sample_loop(self):
+        while not self._done.wait(self.profiler.interval):
+            start = time.perf_counter()
+            self._sample()
+            self.sampler_seconds += time.perf_counter() - start
+
+    def _sample(self):
+        frames = sys._current_frames()
+        spans = tracer.thread_spans()
+        running = self._running_tasks(frames, spans)
+        caller_stage = None
+        for ident, frame in frames.items():
+            task = running.get(ident)
+            span = spans.get(task if task is not None else ident)
+            if self._owns(span):
+                stage = span.path()
+            elif ident == self.thread_ident and (task is None or task is self.task):
+                # Between stages, or an idle event loop while this run awaits the network
+                own = spans.get(self.task if self.task is not None else ident)
+                stage = own.path() if self._owns(own) else self.root_path
+            else:
+                # Another run's work (every async run shares the event loop thread)
+                continue
+            if ident == self.thread_ident:
+                caller_stage = stage
+            key = f"{stage};{self._collapse(frame)}"
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.stage_samples[stage] = self.stage_samples.get(stage, 0) + 1
+        self.samples += 1
+
+        if self.measures_memory and caller_stage is not None:
+            current = tracemalloc.get_traced_memory()[0]
+            if current > self.stage_memory.get(caller_stage, 0):
+                self.stage_memory[caller_stage] = current
+
+    def _running_tasks(self, frames, spans):
+        """{thread ident: task} for the task each traced event loop is running right now
+
+        A loop waiting on I/O runs no task. A loop's thread is the one whose
+        stack holds its running task's coroutine.
+        """
+        loops = {key.get_loop() for key in spans if isinstance(key, asyncio.Task)}
+        loops.update(self._loop_threads)
+        running = {}
+        for loop in loops:
+            task = asyncio.current_task(loop)
+            if task is None:
+                continue
+            ident = self._loop_threads.get(loop)
+            if ident is None:
+                ident = self._thread_of(frames, getattr(task.get_coro(), "cr_frame", None))
+                if ident is None:
+                    continue
+                self._loop_threads[loop] = ident
+            running[ident] = task
+        return running
+
+    @staticmethod
+    def _thread_of(frames, target):
+        if target is None:
+            return None
+        for ident, frame in frames.items():
+            while frame is not None:
+                if frame is target:
+                    return ident
+                frame = frame.f_back
+        return None
+
+    def _owns(self, span):
+        return span is not None and self.trace_id is not None and span.trace_id == self.trace_id
+
+    def _collapse(self, frame):
+        """Root-first "func (file.py);func (file.py)" for one thread's stack"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = self._names.get(code)
+            if name is None:
+                name = f"{code.co_qualname} ({os.path.basename(code.co_filename)})"
+                self._names[code] = name
+            names.append(name)
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _top_allocations(self):
+        limit = self.profiler.top_allocations
+        if not limit:
+            return []
+        try:
+            stats = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+        except RuntimeError:
+            return []
+        return [
+            {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size, "count": stat.count}
+            for stat in stats
+        ]
+
+    def write(self):
+        """<directory>/<time>-<request id>-<label>.collapsed (flamegraph.pl / speedscope input) and .json"""
+        stem = os.path.join(
+            self.profiler.directory,
+            f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}-{self.request_id}-{self.label}"
+        )
+        summary = {
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            "label": self.label,
+            "attributes": self.attributes,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "interval": self.profiler.interval,
+            "samples": self.samples,
+            "sampler_seconds": self.sampler_seconds,
+            "stages": dict(sorted(self.stage_samples.items(), key=lambda item: -item[1])),
+            "memory": self.memory
+        }
+        try:
+            with open(f"{stem}.collapsed", "w", encoding="utf-8") as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            with open(f"{stem}.json", "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2, default=str)
+            self.paths = {"collapsed": f"{stem}.collapsed", "summary": f"{stem}.json"}
+        except OSError as e:
+            print(f"⚠️ Could not write profile: {e}")
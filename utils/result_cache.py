@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import time
+
+from utils.tracing import tracer
+
+
+class ResultCache:
+    """Completed pipeline results on disk, shared by every process on the host
+
+    One JSON file per problem key (<directory>/<key[:2]>/<key>.json), written
+    with write-then-rename so readers never see half a file and no lock is
+    needed. Entries older than `ttl` seconds count as missing. warm_cache.py
+    fills it ahead of peak traffic; MathPipeline reads and fills it per run.
+    """
+
+    def __init__(self, directory, ttl=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def age(self, key):
+        """Seconds since the entry was stored, or None when there is none"""
+        try:
+            return max(0.0, time.time() - os.path.getmtime(self._path(key)))
+        except OSError:
+            return None
+
+    def contains(self, key, max_age=None):
+        """True when a fresh entry exists (younger than max_age and the cache ttl)"""
+        age = self.age(key)
+        limits = [limit for limit in (max_age, self.ttl) if limit is not None]
+        return age is not None and (not limits or age <= min(limits))
+
+    def get(self, key):
+        """The cached result, or None on a miss or an expired entry"""
+        result = None
+        if self.contains(key):
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    result = json.load(f)["result"]
+            except (OSError, ValueError, KeyError):
+                result = None
+        self._count("hits" if result is not None else "misses")
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"cached_at": time.time(), "result": result}, f, ensure_ascii=False, default=str)
+            os.replace(tmp, path)
+            self._count("stores")
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ Could not cache result: {e}")
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    os.remove(os.path.join(root, name))
+
+    def _count(self, event):
+        with self._lock:
+            self.stats[event] += 1
+        tracer.count(f"result_cache.{event}")
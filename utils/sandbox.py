@@ -0,0 +1,207 @@
+import atexit
+import json
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows - no per-process memory limits
+    resource = None
+
+# Functions a worker is allowed to run, resolved by name inside the worker so
+# callers never send code across the pipe
+TASKS = {
+    "solve_symbolically": ("agents.symbolic_solvers", "solve_symbolically"),
+    "verify_symbolically": ("agents.symbolic_verifier", "verify_symbolically"),
+}
+
+
+def _worker_main(conn, memory_limit_mb):
+    """Worker loop: run whitelisted SymPy tasks until the pipe closes"""
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+
+    import importlib
+    functions = {}
+    for name, (module_name, attr) in TASKS.items():
+        functions[name] = getattr(importlib.import_module(module_name), attr)
+
+    while True:
+        try:
+            task_id, name, args = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            result = functions[name](*args)
+            conn.send((task_id, True, result))
+        except MemoryError:
+            conn.send((task_id, False, MEMORY_LIMIT_ERROR))
+        except Exception as e:
+            conn.send((task_id, False, str(e)))
+
+
+# Sent by a worker whose task ran out of memory; depends on the load, so never memoized
+MEMORY_LIMIT_ERROR = "Memory limit exceeded"
+
+
+def canonical_key(name, args):
+    """Memoization key: whitespace-insensitive, normalized notation"""
+    from agents.math_text import normalize_math_text
+
+    canonical = []
+    for arg in args:
+        if isinstance(arg, str):
+            canonical.append(" ".join(normalize_math_text(arg).split()))
+        elif isinstance(arg, (list, tuple)):
+            canonical.append(tuple(arg))
+        elif isinstance(arg, dict):
+            canonical.append(json.dumps(arg, sort_keys=True, default=str))
+        else:
+            canonical.append(arg)
+    return (name, tuple(canonical))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit_mb):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+
+class SympySandbox:
+    """Pre-forked process pool for symbolic work with per-task deadlines
+
+    Each task runs in a worker process with an address-space limit. A task
+    that overruns its wall-clock timeout gets its worker killed and replaced,
+    so a pathological `sp.solve` can never stall the calling thread for longer
+    than the timeout. Results (including timeouts) are memoized on the
+    canonical form of the arguments.
+    """
+
+    def __init__(self, workers=2, timeout=5.0, memory_limit_mb=512, cache_size=256,
+                 start_method="spawn"):
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.cache_size = cache_size
+        self._context = multiprocessing.get_context(start_method)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._closed = False
+        self.stats = {"tasks": 0, "cache_hits": 0, "timeouts": 0, "respawns": 0}
+
+        for _ in range(workers):
+            self._idle.put(_Worker(self._context, memory_limit_mb))
+
+        atexit.register(self.shutdown)
+
+    def run(self, name, *args, timeout=None):
+        """Run a whitelisted task, returning its result or a failure dict"""
+        if name not in TASKS:
+            raise ValueError(f"Unknown sandbox task: {name}")
+
+        key = canonical_key(name, args)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self._cache[key]
+
+        result = self._execute(name, args, self.timeout if timeout is None else timeout)
+        if isinstance(result, dict) and result.get("transient"):
+            return result
+
+        with self._cache_lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _execute(self, name, args, timeout):
+        if timeout <= 0:
+            return {"success": False, "error": "No time left for symbolic work", "timeout": True, "transient": True}
+        queued = time.monotonic()
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            return {"success": False, "error": "Sandbox busy: no free worker", "timeout": True, "transient": True}
+
+        # The task's clock starts once it has a worker; only a caller's shorter
+        # deadline (timeout below the sandbox's own) still counts the queue wait
+        waited = time.monotonic() - queued
+        task_timeout = timeout if timeout >= self.timeout else timeout - waited
+        if task_timeout <= 0:
+            self._idle.put(worker)
+            return {"success": False, "error": "No time left for symbolic work", "timeout": True, "transient": True}
+
+        self._count("tasks")
+        task_id = uuid.uuid4().hex
+        try:
+            worker.conn.send((task_id, name, args))
+            if not worker.conn.poll(task_timeout):
+                self._count("timeouts")
+                worker = self._respawn(worker)
+                # A timeout cut short by a caller's deadline says nothing about the problem - don't memoize it
+                return {"success": False, "error": f"Timed out after {task_timeout:.1f}s", "timeout": True,
+                        "transient": task_timeout < self.timeout}
+
+            reply_id, ok, payload = worker.conn.recv()
+            if reply_id != task_id:
+                # The worker's pipe is out of step with ours - replace it, and retry the problem next time
+                worker = self._respawn(worker)
+                return {"success": False, "error": "Mismatched reply", "transient": True}
+            if not ok:
+                return {"success": False, "error": payload, "transient": payload == MEMORY_LIMIT_ERROR}
+            return payload
+        except (EOFError, OSError, BrokenPipeError):
+            # Worker died mid-task (usually the memory limit) - replace it
+            worker = self._respawn(worker)
+            return {"success": False, "error": "Worker crashed (memory limit?)", "transient": True}
+        finally:
+            if self._closed:
+                worker.kill()
+            else:
+                self._idle.put(worker)
+
+    def _count(self, stat):
+        # Callers run on many threads; the cache lock also guards the counters
+        with self._cache_lock:
+            self.stats[stat] += 1
+
+    def _respawn(self, worker):
+        worker.kill()
+        self._count("respawns")
+        return _Worker(self._context, self.memory_limit_mb)
+
+    def shutdown(self):
+        """Stop all workers"""
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
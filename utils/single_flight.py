@@ -0,0 +1,191 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows - process-local deduplication only
+    fcntl = None
+
+from utils.tracing import tracer
+
+
+def problem_key(text, *parts):
+    """Dedup key: whitespace-insensitive, normalized notation, plus any mode flags"""
+    from agents.math_text import normalize_math_text
+
+    canonical = " ".join(normalize_math_text(text or "").split())
+    # "x^2 - 4 = 0" and "x**2-4=0" are the same problem
+    canonical = re.sub(r"\s*([^\w\s])\s*", r"\1", canonical)
+    payload = json.dumps([canonical] + [str(p) for p in parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one execution
+
+    Within a process, the first caller for a key runs the function and every
+    caller that arrives while it is running blocks and receives a copy of the
+    same result (or exception). With `lock_dir`, processes on the same host
+    also coordinate: the leader holds an flock on <lock_dir>/<key>.lock and
+    publishes its result as <key>.json, which waiting processes pick up
+    instead of recomputing. Results must be JSON-serializable for that.
+    """
+
+    def __init__(self, lock_dir=None, wait_timeout=120.0, result_ttl=300.0):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"executions": 0, "suppressed": 0, "cross_process_suppressed": 0}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, func):
+        """(result, shared): run func() once per key among concurrent callers"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._count("suppressed")
+            if not call.done.wait(self.wait_timeout):
+                # The leader is stuck - don't let it take this caller down with it
+                return func(), False
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result, shared = self._run_leader(key, func)
+            return call.result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, coro_factory):
+        """Async do(): coro_factory() is awaited once per key on this event loop"""
+        future = self._async_calls.get(key)
+        if future is not None:
+            self._count("suppressed")
+            return copy.deepcopy(await asyncio.shield(future)), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        self._count("executions")
+        try:
+            result = await coro_factory()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't warn at shutdown
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
+
+    def _run_leader(self, key, func):
+        if not self.lock_dir:
+            self._count("executions")
+            return func(), False
+
+        lock_path = os.path.join(self.lock_dir, f"{key}.lock")
+        result_path = os.path.join(self.lock_dir, f"{key}.json")
+        started = time.time()
+        with open(lock_path, "a+") as lock_file:
+            if not self._try_lock(lock_file):
+                # Another process is solving this right now - wait for it, then reuse its result
+                if self._wait_lock(lock_file):
+                    try:
+                        shared = self._read_result(result_path, started)
+                        if shared is not None:
+                            self._count("cross_process_suppressed")
+                            return shared, True
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._count("executions")
+                return func(), False
+
+            try:
+                self._count("executions")
+                result = func()
+                self._write_result(result_path, result)
+                return result, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._cleanup()
+
+    def _try_lock(self, lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _wait_lock(self, lock_file):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            if self._try_lock(lock_file):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _read_result(self, path, not_before):
+        """A result published after `not_before`, or None"""
+        try:
+            if os.path.getmtime(path) < not_before:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, path, result):
+        try:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, default=str)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"⚠️ Could not publish shared result: {e}")
+
+    def _cleanup(self):
+        """Drop published results older than the TTL"""
+        cutoff = time.time() - self.result_ttl
+        try:
+            for name in os.listdir(self.lock_dir):
+                if name.endswith(".json"):
+                    path = os.path.join(self.lock_dir, name)
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+        except OSError:
+            pass
+
+    def _count(self, event):
+        with self._lock:
+            self.stats[event] += 1
+        tracer.count(f"singleflight.{event}")
@@ -0,0 +1,64 @@
+import contextvars
+import re
+from contextlib import contextmanager
+from utils.tracing import tracer
+
+_usage = contextvars.ContextVar("token_usage", default=None)
+
+
+def usage_from_response(response):
+    """Prompt/completion token counts from a chat model response"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        return {
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "completion_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0)
+        }
+
+    metadata = getattr(response, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0)
+    }
+
+
+def record_usage(stage, response):
+    """Add a response's token usage to the active track_usage() block, if any"""
+    usage = usage_from_response(response)
+    tracer.add_tokens(stage, usage["prompt_tokens"], usage["completion_tokens"])
+    totals = _usage.get()
+    if totals is not None:
+        stage_totals = totals.setdefault(stage, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0})
+        for key, value in usage.items():
+            stage_totals[key] += value or 0
+        stage_totals["calls"] += 1
+    return usage
+
+
+@contextmanager
+def track_usage():
+    """Collect per-stage token usage for the LLM calls made inside the block"""
+    totals = {}
+    token = _usage.set(totals)
+    try:
+        yield totals
+    finally:
+        _usage.reset(token)
+
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """Approximate LLM token count without a tokenizer dependency
+
+    Punctuation and short words are one token each; longer words are
+    charged one token per ~4 characters, which tracks BPE vocabularies
+    closely enough for budgeting.
+    """
+    if not text:
+        return 0
+    return sum(1 if len(piece) <= 4 else (len(piece) + 3) // 4 for piece in TOKEN_PATTERN.findall(text))
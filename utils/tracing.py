@@ -0,0 +1,291 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _running_task():
+    """The asyncio task running on this thread, or None outside an event loop"""
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+class Histogram:
+    """Latency histogram: cumulative buckets plus a sliding sample for quantiles"""
+
+    def __init__(self, window=2048):
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+class Span:
+    def __init__(self, name, trace_id, parent, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def path(self):
+        """Span names from the root down to this one, e.g. pipeline;solve;retrieval"""
+        names = []
+        span = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return ";".join(reversed(names))
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class Tracer:
+    """In-process spans, per-stage histograms and a JSON-lines trace exporter
+
+    Spans nest through contextvars, so the agents only need `with span(...)`
+    around their work. Every finished span feeds the histogram for its name;
+    a finished trace is appended to the export file when one is configured.
+    """
+
+    def __init__(self, export_path=None):
+        self.export_path = export_path
+        self.histograms = {}
+        self.tokens = {}
+        self.counters = {}
+        # thread ident (or asyncio task) -> innermost open span, kept only while a profiler is watching
+        self._thread_spans = {}
+        self._watchers = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Start a new trace (one pipeline run) and its root span"""
+        spans = []
+        token = _current_trace.set((uuid.uuid4().hex, spans))
+        try:
+            with self.span(name, **attributes) as root:
+                yield root
+        finally:
+            _current_trace.reset(token)
+            self._export(spans)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time a block as a child of the current span"""
+        trace = _current_trace.get()
+        trace_id = trace[0] if trace else None
+        parent = _current_span.get()
+        span = Span(name, trace_id, parent, attributes)
+        token = _current_span.set(span)
+        watched = self._watchers > 0
+        if watched:
+            where = _running_task() or threading.get_ident()
+            outer = self._thread_spans.get(where)
+            self._thread_spans[where] = span
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current_span.reset(token)
+            if watched and self._watchers:
+                if outer is None:
+                    self._thread_spans.pop(where, None)
+                else:
+                    self._thread_spans[where] = outer
+            self.observe(name, span.duration)
+            if trace:
+                trace[1].append(span)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    def add_tokens(self, stage, prompt_tokens, completion_tokens):
+        """Count LLM tokens against a stage and annotate the current span"""
+        span = _current_span.get()
+        if span is not None:
+            span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        with self._lock:
+            totals = self.tokens.setdefault(stage, {"prompt": 0, "completion": 0})
+            totals["prompt"] += prompt_tokens or 0
+            totals["completion"] += completion_tokens or 0
+
+    def count(self, event, n=1):
+        """Bump a named event counter (cache hits, suppressed duplicates, ...)"""
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+
+    def current_trace_id(self):
+        trace = _current_trace.get()
+        return trace[0] if trace else None
+
+    def current_span(self):
+        return _current_span.get()
+
+    @contextmanager
+    def watch_threads(self):
+        """Track which span each thread is in while the block runs (see thread_spans)"""
+        with self._lock:
+            self._watchers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watchers -= 1
+                if not self._watchers:
+                    self._thread_spans.clear()
+
+    def thread_spans(self):
+        """{thread ident or asyncio task: innermost open span} - only filled inside watch_threads()"""
+        return dict(self._thread_spans)
+
+    def estimate(self, name, q=0.5, default=None):
+        """Recent q-quantile latency of a span name, or `default` before any samples"""
+        with self._lock:
+            hist = self.histograms.get(name)
+            return hist.quantile(q) if hist and hist.samples else default
+
+    def snapshot(self):
+        """{stage: {count, mean, p50, p95, p99}} for every recorded span name"""
+        with self._lock:
+            return {name: hist.summary() for name, hist in sorted(self.histograms.items())}
+
+    def counts(self):
+        with self._lock:
+            return dict(sorted(self.counters.items()))
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.tokens.clear()
+            self.counters.clear()
+
+    def _export(self, spans):
+        if not self.export_path or not spans:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.export_path) or ".", exist_ok=True)
+            with self._lock, open(self.export_path, "a", encoding="utf-8") as f:
+                for span in spans:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+        except Exception as e:
+            print(f"⚠️ Error exporting trace: {e}")
+
+    def render_prometheus(self):
+        """Prometheus text exposition of the stage histograms and token counters"""
+        lines = [
+            "# HELP math_mentor_stage_latency_seconds Latency of pipeline stages",
+            "# TYPE math_mentor_stage_latency_seconds histogram"
+        ]
+        with self._lock:
+            for name, hist in sorted(self.histograms.items()):
+                for bound, count in zip(BUCKETS, hist.buckets):
+                    lines.append(f'math_mentor_stage_latency_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'math_mentor_stage_latency_seconds_bucket{{stage="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'math_mentor_stage_latency_seconds_sum{{stage="{name}"}} {hist.total}')
+                lines.append(f'math_mentor_stage_latency_seconds_count{{stage="{name}"}} {hist.count}')
+
+            lines.append("# HELP math_mentor_llm_tokens_total LLM tokens by stage")
+            lines.append("# TYPE math_mentor_llm_tokens_total counter")
+            for stage, totals in sorted(self.tokens.items()):
+                for kind, value in totals.items():
+                    lines.append(f'math_mentor_llm_tokens_total{{stage="{stage}",kind="{kind}"}} {value}')
+
+            lines.append("# HELP math_mentor_events_total Counted pipeline events")
+            lines.append("# TYPE math_mentor_events_total counter")
+            for event, value in sorted(self.counters.items()):
+                lines.append(f'math_mentor_events_total{{event="{event}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer(export_path=os.getenv("MATH_MENTOR_TRACE_FILE"))
+span = tracer.span
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serve tracer.render_prometheus() on http://host:port/metrics (once per process)"""
+    global _metrics_server
+    if _metrics_server is not None:
+        return _metrics_server
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _metrics_server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics at http://{host}:{port}/metrics")
+    return _metrics_server
@@ -0,0 +1,223 @@
+"""
+Pre-solve a problem bank into the result cache before peak traffic
+
+Runs every problem (JSONL or CSV, as for batch_solve.py) through the full
+parse -> solve -> verify -> explain pipeline at a controlled rate and stores
+each complete result in the on-disk result cache that the app and API read
+(MATH_MENTOR_RESULT_CACHE_DIR). A later request for the same problem, with
+any whitespace or notation differences, is then answered from the cache.
+
+The cache is the checkpoint: problems that already have a fresh entry are
+skipped, so an interrupted or time-boxed run resumes where it stopped.
+Results that are not cacheable (an LLM call failed, a stage was skipped)
+are retried on the next run. Coverage is printed before and after.
+
+Schedule it off-peak, e.g. with cron, bounded by --max-minutes:
+    0 2 * * * cd /srv/math-mentor && python warm_cache.py bank.jsonl --rate 20 --max-minutes 240
+
+Usage:
+    python warm_cache.py benchmarks/fixtures/problems.jsonl
+    python warm_cache.py bank.csv --modes staged fused --rate 30 --concurrency 4
+    python warm_cache.py bank.jsonl --refresh-hours 168      # re-solve entries older than a week
+    python warm_cache.py bank.jsonl --report                 # coverage only, no solving
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from batch_solve import read_problems
+from utils.rate_limit import TokenBucket
+from utils.result_cache import ResultCache
+
+DEFAULT_CACHE_DIR = "cache/results"
+
+
+def coverage(cache, problems, modes):
+    """{mode: (warm, total)} - problems with a fresh cached result per pipeline mode"""
+    from agents.pipeline import cache_key
+
+    report = {}
+    for mode in modes:
+        warm = sum(cache.contains(cache_key(text, mode)) for _, text in problems)
+        report[mode] = (warm, len(problems))
+    return report
+
+
+def print_coverage(report, label):
+    for mode, (warm, total) in report.items():
+        print(f"{label} {mode}: {warm}/{total} warm ({warm / total if total else 0:.0%})")
+
+
+class CacheWarmer:
+    """Solves (id, problem, mode) jobs through a MathPipeline at a bounded rate
+
+    Each finished run lands in the pipeline's result cache on its own; this
+    class only paces the work and tallies what actually got cached.
+    """
+
+    def __init__(self, pipeline, cache, concurrency=2, rate_per_minute=None, stop_at=None):
+        self.pipeline = pipeline
+        self.cache = cache
+        self.concurrency = concurrency
+        self.limiter = TokenBucket.per_minute(rate_per_minute) if rate_per_minute else None
+        self.stop_at = stop_at
+        self.warmed = 0
+        self.uncacheable = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _out_of_time(self):
+        return self._stop.is_set() or (self.stop_at is not None and time.time() >= self.stop_at)
+
+    def warm_one(self, problem_id, problem, mode):
+        from agents.pipeline import cache_key
+
+        if self.limiter is not None:
+            while not self.limiter.acquire(timeout=0.5):
+                if self._out_of_time():
+                    return None
+        if self._out_of_time():
+            return None
+
+        start = time.perf_counter()
+        try:
+            self.pipeline.run(problem, mode=mode)
+        except Exception as e:
+            return {"id": problem_id, "mode": mode, "error": f"{type(e).__name__}: {e}"}
+        return {
+            "id": problem_id, "mode": mode, "latency": time.perf_counter() - start,
+            "cached": self.cache.contains(cache_key(problem, mode))
+        }
+
+    def run(self, jobs):
+        """Warm every job until done or out of time; returns seconds taken"""
+        total = len(jobs)
+        start = time.perf_counter()
+        pending = iter(jobs)
+        in_flight = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            try:
+                while True:
+                    while len(in_flight) < self.concurrency * 2 and not self._out_of_time():
+                        item = next(pending, None)
+                        if item is None:
+                            break
+                        in_flight.add(pool.submit(self.warm_one, *item))
+                    if not in_flight:
+                        break
+
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self._report(future.result(), total, start)
+            except KeyboardInterrupt:
+                self._stop.set()
+                for future in in_flight:
+                    future.cancel()
+                print("\n⏸️ Interrupted - waiting for running problems to finish, rerun to resume")
+                raise
+            finally:
+                self._stop.set()
+
+        if self.stop_at is not None and time.time() >= self.stop_at:
+            print("⏰ Time window over - rerun to continue where this run stopped")
+        return time.perf_counter() - start
+
+    def _report(self, record, total, start):
+        if record is None:
+            return
+        with self._lock:
+            if record.get("error"):
+                self.failed += 1
+                status = f"❌ {record['error']}"
+            elif record["cached"]:
+                self.warmed += 1
+                status = f"🔥 cached, {record['latency']:.1f}s"
+            else:
+                self.uncacheable += 1
+                status = f"⚠️ not cached (a stage failed or was skipped), {record['latency']:.1f}s"
+            done = self.warmed + self.uncacheable + self.failed
+        rate = done / max(time.perf_counter() - start, 1e-9) * 60
+        print(f"[{done}/{total}] {record['id']} ({record['mode']}): {status} ({rate:.1f} problems/min)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV problem bank")
+    parser.add_argument("--column", default="problem", help="Field holding the problem text")
+    parser.add_argument("--modes", nargs="+", default=["staged"], choices=["staged", "fused"],
+                        help="Pipeline modes to warm (the app's fused toggle uses its own entries)")
+    parser.add_argument("--cache-dir", default=os.getenv("MATH_MENTOR_RESULT_CACHE_DIR", DEFAULT_CACHE_DIR))
+    parser.add_argument("--concurrency", type=int, default=2, help="Problems solved at once")
+    parser.add_argument("--rate", type=float, default=10, help="Max problems started per minute (0 = unlimited)")
+    parser.add_argument("--refresh-hours", type=float, default=None,
+                        help="Re-solve cached results older than this (default: keep them)")
+    parser.add_argument("--max-minutes", type=float, default=None,
+                        help="Stop starting new problems after this long (for scheduled windows)")
+    parser.add_argument("--report", action="store_true", help="Print coverage and exit")
+    parser.add_argument("--report-json", help="Also write the final coverage as JSON")
+    args = parser.parse_args()
+
+    problems = read_problems(args.input, args.column)
+    ttl_hours = os.getenv("MATH_MENTOR_RESULT_CACHE_TTL_HOURS")
+    limits = [float(hours) * 3600 for hours in (ttl_hours, args.refresh_hours) if hours]
+    # Entries past the refresh age count as missing, so the pipeline re-solves them instead of reading them back
+    cache = ResultCache(args.cache_dir, ttl=min(limits) if limits else None)
+
+    before = coverage(cache, problems, args.modes)
+    print(f"📦 {len(problems)} problems, cache at {args.cache_dir}")
+    print_coverage(before, "📊 Before:")
+    if args.report:
+        return
+
+    from agents.pipeline import MathPipeline, build_components, cache_key
+
+    jobs = [
+        (problem_id, text, mode)
+        for mode in args.modes
+        for problem_id, text in problems
+        if not cache.contains(cache_key(text, mode))
+    ]
+    if not jobs:
+        print("✅ Everything is warm")
+        return
+
+    print("🔧 Loading models...")
+    components = build_components(include_multimodal=False)
+    # Warm the cache this command was pointed at, whatever the environment says
+    components["result_cache"] = cache
+    pipeline = MathPipeline(components)
+    stop_at = time.time() + args.max_minutes * 60 if args.max_minutes else None
+    warmer = CacheWarmer(pipeline, cache, args.concurrency, args.rate or None, stop_at)
+
+    print(f"🚀 Warming {len(jobs)} runs (concurrency {args.concurrency}"
+          f"{f', {args.rate:g}/min' if args.rate else ''}"
+          f"{f', {args.max_minutes:g} min window' if args.max_minutes else ''})")
+    try:
+        seconds = warmer.run(jobs)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    after = coverage(cache, problems, args.modes)
+    print(f"\n🏁 {warmer.warmed} cached, {warmer.uncacheable} not cacheable, {warmer.failed} failed in {seconds:.1f}s")
+    print_coverage(after, "📊 After:")
+    if args.report_json:
+        with open(args.report_json, "w", encoding="utf-8") as f:
+            json.dump({
+                "problems": len(problems),
+                "coverage": {mode: {"warm": warm, "total": total} for mode, (warm, total) in after.items()},
+                "warmed": warmer.warmed, "uncacheable": warmer.uncacheable, "failed": warmer.failed,
+                "seconds": seconds
+            }, f, indent=2)
+    if warmer.uncacheable or warmer.failed:
+        print("ℹ️ Rerun the same command to retry problems that did not get cached")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()